@@ -1,3 +1,5 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -5,12 +7,28 @@ from flask_mail import Mail
 from flask_cors import CORS
 
 from config import Config
+from app.utils.catalog_cache import CatalogCache
+from app.utils.user_cache import UserCache
+from app.utils.page_cache import PageCache
+from app.utils.assets import StaticAssets
+from app.utils.template_cache import TemplateCache
+from app.utils.metrics import Metrics
+from app.utils.db_routing import ReplicaRouter, RoutingSession
+from app.utils import prefork
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+db_router = ReplicaRouter()
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
 mail = Mail()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.signin'
+catalog_cache = CatalogCache()
+user_cache = UserCache()
+page_cache = PageCache()
+static_assets = StaticAssets()
+template_cache = TemplateCache()
+metrics = Metrics()
 
 
 def create_app():
@@ -19,18 +37,25 @@ def create_app():
     # Load all config from config.py
     app.config.from_object(Config)
 
-    print("Loaded DB URI:", app.config.get("SQLALCHEMY_DATABASE_URI"))
-
-    # Initialize Flask extensions
+    # Initialize Flask extensions (pool options and the replica bind first: db.init_app reads them)
+    db_router.init_app(app)
     db.init_app(app)
+    if not app.config.get('SERVER_MODE'):
+        init_migrations(app)
+        init_cli(app)
     mail.init_app(app)
     login_manager.init_app(app)
-
-    from app.models import User
+    catalog_cache.init_app(app)
+    user_cache.init_app(app)
+    page_cache.init_app(app)
+    static_assets.init_app(app)
+    template_cache.init_app(app)
+    metrics.init_app(app)
+    prefork.init_app(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.load(int(user_id))
     CORS(app)
 
     # Register routes
@@ -46,8 +71,40 @@ def create_app():
     app.register_blueprint(form_routes.bp)
     app.register_blueprint(user_routes.bp)
 
+    # orjson-backed JSON provider when orjson is installed
+    from app.utils import serializers
+    serializers.init_app(app)
+
     # Custom Jinja helpers
     from app.utils.helpers import generate_stars
     app.jinja_env.globals.update(generate_stars=generate_stars)
 
+    # ETag / Last-Modified validators and Cache-Control policies
+    from app.utils import http_cache
+    http_cache.init_app(app)
+
+    # Optional in-process email delivery workers
+    from app.utils import outbox
+    outbox.init_app(app)
+
     return app
+
+
+def init_cli(app):
+    """The `flask` command groups. A serving worker never runs them, so it skips importing their modules."""
+    from app.utils.assets import assets_cli
+    from app.utils.campaign import campaign_cli
+    from app.utils.catalog_import import catalog_cli
+    from app.utils.outbox import outbox_cli
+    from app.utils.template_cache import templates_cli
+
+    for group in (assets_cli, templates_cli, outbox_cli, campaign_cli, catalog_cli):
+        app.cli.add_command(group)
+
+
+def init_migrations(app):
+    """Flask-Migrate, for `flask db` and the scripts. It imports Alembic, which a serving worker never uses."""
+    from flask_migrate import Migrate
+
+    # SQLite cannot ALTER most things in place; batch mode rebuilds the table instead
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
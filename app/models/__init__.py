@@ -4,6 +4,9 @@ from .cart_item import CartItem
 from .wishlist import Wishlist
 from .lead import Lead
 from .newsletter import Newsletter
+from .catalog_version import CatalogVersion
+from .email_outbox import OutboxMessage
+from .campaign import NewsletterCampaign
 
 # Optional: Define __all__ for explicit imports
 __all__ = [
@@ -13,4 +16,7 @@ __all__ = [
     "Wishlist",
     "Lead",
     "Newsletter",
+    "CatalogVersion",
+    "OutboxMessage",
+    "NewsletterCampaign",
 ]
@@ -0,0 +1,33 @@
+from app import db
+from datetime import datetime
+
+
+class NewsletterCampaign(db.Model):
+    __tablename__ = 'newsletter_campaigns'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    subject = db.Column(db.String(500), nullable=False)
+    template = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    # Highest Newsletter.id whose chunk has been fully sent; a resumed run starts after it
+    last_subscriber_id = db.Column(db.Integer, nullable=False, default=0)
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'subject': self.subject,
+            'template': self.template,
+            'status': self.status,
+            'last_subscriber_id': self.last_subscriber_id,
+            'sent_count': self.sent_count,
+            'failed_count': self.failed_count,
+            'created_at': self.created_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
@@ -2,6 +2,11 @@ from app import db
 from datetime import datetime
 
 
+def size_key(size_column):
+    """Expression that treats a missing size as '' so NULL sizes still collide in unique indexes"""
+    return db.func.coalesce(size_column, db.literal_column("''"))
+
+
 class CartItem(db.Model):
     __tablename__ = 'cart_items'
 
@@ -16,6 +21,18 @@ class CartItem(db.Model):
     product = db.relationship('Product', backref='cart_items')
     user = db.relationship('User', backref='cart_items')
 
+    # One line per (owner, product, size), for user carts and guest session carts alike
+    __table_args__ = (
+        db.Index(
+            'uq_cart_items_user_line', user_id, product_id, size_key(size), unique=True,
+            sqlite_where=user_id.isnot(None), postgresql_where=user_id.isnot(None)
+        ),
+        db.Index(
+            'uq_cart_items_session_line', session_id, product_id, size_key(size), unique=True,
+            sqlite_where=session_id.isnot(None), postgresql_where=session_id.isnot(None)
+        ),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
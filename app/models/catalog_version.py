@@ -0,0 +1,16 @@
+from app import db
+from datetime import datetime
+
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'updated_at': self.updated_at.isoformat()
+        }
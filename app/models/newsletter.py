@@ -10,6 +10,8 @@ class Newsletter(db.Model):
     subscribed_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (db.Index('ix_newsletter_email_lower', db.func.lower(email)),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -6,6 +6,7 @@ class Product(db.Model):
     __tablename__ = 'products'
 
     id = db.Column(db.Integer, primary_key=True)
+    sku = db.Column(db.String(64), unique=True, index=True, nullable=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
     price = db.Column(db.Float, nullable=False)
@@ -25,9 +26,21 @@ class Product(db.Model):
     size_options = db.Column(db.Text, nullable=True)
     tags = db.Column(db.Text, nullable=True)
 
+    # Category and badge listings filter on these; paged listings walk (sort column, id) in keyset order
+    __table_args__ = (
+        db.Index('ix_products_category', 'category'),
+        db.Index('ix_products_is_bestseller', 'is_bestseller'),
+        db.Index('ix_products_is_new', 'is_new'),
+        db.Index('ix_products_price_id', 'price', 'id'),
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        db.Index('ix_products_rating_id', 'rating', 'id'),
+        db.Index('ix_products_name_id', 'name', 'id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
+            'sku': self.sku,
             'name': self.name,
             'description': self.description,
             'short_description': self.short_description,
@@ -3,6 +3,11 @@ from app import db
 from datetime import datetime
 
 
+def email_equals(column, email):
+    """Case-insensitive email comparison that the ``lower(email)`` indexes can answer"""
+    return db.func.lower(column) == (email or '').lower()
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
 
@@ -18,6 +23,8 @@ class User(UserMixin, db.Model):
     reset_token = db.Column(db.String(255), nullable=True)
     reset_token_expiry = db.Column(db.DateTime, nullable=True)
 
+    __table_args__ = (db.Index('ix_users_email_lower', db.func.lower(email)),)
+
     def to_dict(self):
         return {
             'id': self.id,
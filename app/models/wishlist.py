@@ -13,7 +13,11 @@ class Wishlist(db.Model):
     product = db.relationship('Product', backref='wishlist_items')
     user = db.relationship('User', backref='wishlist_items')
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_user_product_wishlist'),)
+    # The unique constraint also serves lookups by user; product_id needs its own index
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='unique_user_product_wishlist'),
+        db.Index('ix_wishlists_product_id', 'product_id'),
+    )
 
     def to_dict(self):
         return {
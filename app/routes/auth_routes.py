@@ -1,12 +1,14 @@
-from flask import Blueprint, render_template, jsonify, request, redirect, url_for, flash
+from flask import Blueprint, render_template, jsonify, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models import User
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.models.user import email_equals
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField
 from wtforms.validators import DataRequired, Email, EqualTo
 from app.utils.helpers import send_email, generate_token, confirm_token
+from app.utils.cart import merge_guest_cart
+from app.utils.passwords import HashingBusy, hash_password, verify_password, needs_rehash
 from datetime import datetime, timedelta
 
 bp = Blueprint('auth', __name__)
@@ -22,6 +24,23 @@ class SignupForm(FlaskForm):
     subscribe_newsletter = BooleanField('Subscribe to Newsletter')
 
 
+def merge_session_cart(user):
+    """Carry the guest cart of this browser session over to the signed-in user"""
+    session_id = session.pop('cart_session_id', None)
+    if session_id:
+        merge_guest_cart(user.id, session_id)
+        db.session.commit()
+
+
+@bp.errorhandler(HashingBusy)
+def hashing_busy(error):
+    """Shed sign-in load instead of queueing behind the password hash pool"""
+    if request.is_json:
+        return jsonify({'error': 'Too many sign-in attempts right now, please retry shortly'}), 503, {'Retry-After': '1'}
+    flash('We are handling a lot of sign-ins right now. Please try again in a moment.', 'error')
+    return redirect(request.url)
+
+
 @bp.route('/signin', methods=['GET', 'POST'])
 def signin():
     """User sign in"""
@@ -34,10 +53,14 @@ def signin():
             email = request.form.get('email')
             password = request.form.get('password')
 
-        user = User.query.filter_by(email=email).first()
+        user = User.query.filter(email_equals(User.email, email)).first()
 
-        if user and check_password_hash(user.password_hash, password):
+        if user and verify_password(user.password_hash, password):
+            if needs_rehash(user.password_hash):
+                user.password_hash = hash_password(password)
+                db.session.commit()
             login_user(user)
+            merge_session_cart(user)
             if request.is_json:
                 return jsonify({'success': True, 'user': user.to_dict()})
             else:
@@ -66,7 +89,7 @@ def signup():
             last_name = form.last_name.data
             subscribe_newsletter = form.subscribe_newsletter.data
 
-            if User.query.filter_by(email=email).first():
+            if User.query.filter(email_equals(User.email, email)).first():
                 if request.is_json:
                     return jsonify({'error': 'Email already exists'}), 400
                 flash('Email already registered', 'error')
@@ -74,7 +97,7 @@ def signup():
 
             user = User(
                 email=email,
-                password_hash=generate_password_hash(password),
+                password_hash=hash_password(password),
                 first_name=first_name,
                 last_name=last_name,
                 is_subscribed=subscribe_newsletter
@@ -90,6 +113,7 @@ def signup():
             send_email('Confirm Your Email', [user.email], html)
 
             login_user(user)
+            merge_session_cart(user)
 
             if request.is_json:
                 return jsonify({'success': True, 'user': user.to_dict()})
@@ -125,7 +149,7 @@ def confirm_email(token):
     if not email:
         flash('The confirmation link is invalid or has expired.', 'error')
         return redirect(url_for('auth.signin'))
-    user = User.query.filter_by(email=email).first_or_404()
+    user = User.query.filter(email_equals(User.email, email)).first_or_404()
     if user.is_confirmed:
         flash('Account already confirmed. Please login.', 'info')
     else:
@@ -153,7 +177,7 @@ def resend_confirmation():
 def request_reset():
     if request.method == 'POST':
         email = request.form.get('email')
-        user = User.query.filter_by(email=email).first()
+        user = User.query.filter(email_equals(User.email, email)).first()
         if user:
             token = generate_token(user.email, RESET_SALT)
             reset_url = url_for('auth.reset_with_token', token=token, _external=True)
@@ -170,10 +194,10 @@ def reset_with_token(token):
     if not email:
         flash('The reset link is invalid or has expired.', 'error')
         return redirect(url_for('auth.request_reset'))
-    user = User.query.filter_by(email=email).first_or_404()
+    user = User.query.filter(email_equals(User.email, email)).first_or_404()
     if request.method == 'POST':
         password = request.form.get('password')
-        user.password_hash = generate_password_hash(password)
+        user.password_hash = hash_password(password)
         db.session.commit()
         flash('Your password has been updated!', 'success')
         return redirect(url_for('auth.signin'))
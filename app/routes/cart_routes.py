@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request, session
 from app import db
 from app.models import CartItem, Product
 from flask_login import current_user
+from app.utils.cart import add_line, apply_batch, cart_owner, load_cart_items
 import uuid
 
 bp = Blueprint('cart', __name__, url_prefix='/api/cart')
@@ -10,15 +11,8 @@ bp = Blueprint('cart', __name__, url_prefix='/api/cart')
 @bp.route('/', methods=['GET'])
 def get_cart():
     """Get cart items for current user or session"""
-    if current_user.is_authenticated:
-        cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    else:
-        session_id = session.get('cart_session_id')
-        if not session_id:
-            return jsonify([])
-        cart_items = CartItem.query.filter_by(session_id=session_id).all()
-
-    return jsonify([item.to_dict() for item in cart_items])
+    lines, _ = load_cart_items(cart_owner())
+    return jsonify([item for item, _ in lines])
 
 
 @bp.route('/add', methods=['POST'])
@@ -37,43 +31,11 @@ def add_to_cart():
         return jsonify({'error': 'Product not found'}), 404
 
     if current_user.is_authenticated:
-        existing_item = CartItem.query.filter_by(
-            user_id=current_user.id,
-            product_id=product_id,
-            size=size
-        ).first()
-
-        if existing_item:
-            existing_item.quantity += quantity
-        else:
-            cart_item = CartItem(
-                user_id=current_user.id,
-                product_id=product_id,
-                quantity=quantity,
-                size=size
-            )
-            db.session.add(cart_item)
+        add_line(product_id, quantity, size, user_id=current_user.id)
     else:
         if 'cart_session_id' not in session:
             session['cart_session_id'] = str(uuid.uuid4())
-
-        session_id = session['cart_session_id']
-        existing_item = CartItem.query.filter_by(
-            session_id=session_id,
-            product_id=product_id,
-            size=size
-        ).first()
-
-        if existing_item:
-            existing_item.quantity += quantity
-        else:
-            cart_item = CartItem(
-                session_id=session_id,
-                product_id=product_id,
-                quantity=quantity,
-                size=size
-            )
-            db.session.add(cart_item)
+        add_line(product_id, quantity, size, session_id=session['cart_session_id'])
 
     db.session.commit()
     return jsonify({'success': True, 'message': 'Item added to cart'})
@@ -116,4 +78,35 @@ def update_cart_item(item_id):
 
     cart_item.quantity = quantity
     db.session.commit()
-    return jsonify({'success': True, 'message': 'Cart updated'})
\ No newline at end of file
+    return jsonify({'success': True, 'message': 'Cart updated'})
+
+
+@bp.route('/batch', methods=['POST'])
+def batch_update_cart():
+    """Apply several add/update/remove operations in one transaction"""
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list):
+        return jsonify({'error': 'operations must be a list'}), 400
+
+    if current_user.is_authenticated:
+        owner_ids = {'user_id': current_user.id}
+    else:
+        if any(isinstance(op, dict) and op.get('op') == 'add' for op in operations) \
+                and 'cart_session_id' not in session:
+            session['cart_session_id'] = str(uuid.uuid4())
+        owner_ids = {'session_id': session.get('cart_session_id')}
+
+    try:
+        apply_batch(operations, cart_owner(), **owner_ids)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+
+    lines, cart_total = load_cart_items(cart_owner())
+    items = []
+    for item_data, line_total in lines:
+        item_data['line_total'] = line_total
+        items.append(item_data)
+    return jsonify({'success': True, 'items': items, 'cart_total': cart_total})
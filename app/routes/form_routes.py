@@ -1,7 +1,10 @@
-from flask import Blueprint, jsonify, request, redirect, url_for, flash
-from app import db, mail
+from flask import Blueprint, jsonify, request, redirect, render_template, url_for, flash, current_app
+from app import db
 from app.models import Lead, Newsletter, User
-from flask_mail import Message
+from app.models.user import email_equals
+from app.utils.outbox import queue_email
+from app.utils.helpers import unsubscribe_serializer
+from itsdangerous import BadSignature
 
 bp = Blueprint('forms', __name__)
 
@@ -32,13 +35,13 @@ def submit_contact():
     )
 
     db.session.add(lead)
-    db.session.commit()
 
-    try:
-        msg = Message(
+    # Notify the shop inbox, if one is configured
+    inbox = current_app.config.get('MAIL_USERNAME') or current_app.config.get('MAIL_DEFAULT_SENDER')
+    if inbox:
+        queue_email(
             subject=f'New Contact Form Submission: {subject}',
-            sender=app.config['MAIL_USERNAME'],
-            recipients=[app.config['MAIL_USERNAME']],
+            recipients=[inbox],
             body=f'''
             New contact form submission:
 
@@ -49,11 +52,10 @@ def submit_contact():
 
             Message:
             {message}
-            '''
+            ''',
+            commit=False
         )
-        mail.send(msg)
-    except Exception as e:
-        app.logger.error(f'Failed to send email: {e}')
+    db.session.commit()
 
     if request.is_json:
         return jsonify({'success': True, 'message': 'Thank you for your message!'})
@@ -78,7 +80,7 @@ def subscribe_newsletter():
             flash('Email is required', 'error')
             return redirect(url_for('static.home'))
 
-    existing = Newsletter.query.filter_by(email=email).first()
+    existing = Newsletter.query.filter(email_equals(Newsletter.email, email)).first()
     if existing:
         if request.is_json:
             return jsonify({'message': 'Already subscribed!'})
@@ -89,18 +91,14 @@ def subscribe_newsletter():
     newsletter = Newsletter(email=email)
     db.session.add(newsletter)
 
-    user = User.query.filter_by(email=email).first()
+    user = User.query.filter(email_equals(User.email, email)).first()
     if user:
         user.is_subscribed = True
 
-    db.session.commit()
-
-    try:
-        msg = Message(
-            subject='Welcome to AEVI Newsletter!',
-            sender=app.config['MAIL_USERNAME'],
-            recipients=[email],
-            body='''
+    queue_email(
+        subject='Welcome to AEVI Newsletter!',
+        recipients=[email],
+        body='''
             Welcome to AEVI!
 
             Thank you for subscribing to our newsletter. 
@@ -110,11 +108,10 @@ def subscribe_newsletter():
 
             Best regards,
             The AEVI Team
-            '''
-        )
-        mail.send(msg)
-    except Exception as e:
-        app.logger.error(f'Failed to send welcome email: {e}')
+            ''',
+        commit=False
+    )
+    db.session.commit()
 
     if request.is_json:
         return jsonify({'success': True, 'message': 'Successfully subscribed!'})
@@ -132,14 +129,49 @@ def unsubscribe_newsletter():
     if not email:
         return jsonify({'error': 'Email is required'}), 400
 
-    newsletter = Newsletter.query.filter_by(email=email).first()
+    newsletter = Newsletter.query.filter(email_equals(Newsletter.email, email)).first()
     if newsletter:
         newsletter.is_active = False
         db.session.commit()
 
-    user = User.query.filter_by(email=email).first()
+    user = User.query.filter(email_equals(User.email, email)).first()
     if user:
         user.is_subscribed = False
         db.session.commit()
 
-    return jsonify({'success': True, 'message': 'Successfully unsubscribed from newsletter'})
\ No newline at end of file
+    return jsonify({'success': True, 'message': 'Successfully unsubscribed from newsletter'})
+
+
+@bp.route('/newsletter/unsubscribe/<token>', methods=['GET', 'POST'])
+def unsubscribe_link(token):
+    """Unsubscribe via the signed link in campaign emails.
+
+    GET only asks for confirmation, since link scanners and prefetchers
+    follow links in email. The POST unsubscribes, from the confirmation
+    form or as a one-click unsubscribe from the mail client (RFC 8058).
+    """
+    one_click = request.form.get('List-Unsubscribe') == 'One-Click'
+    try:
+        email = unsubscribe_serializer().loads(token)
+    except BadSignature:
+        if one_click:
+            return 'Invalid unsubscribe link', 400
+        flash('This unsubscribe link is invalid.', 'error')
+        return redirect(url_for('static.home'))
+
+    if request.method == 'GET':
+        return render_template('unsubscribe.html', email=email)
+
+    newsletter = Newsletter.query.filter(email_equals(Newsletter.email, email)).first()
+    if newsletter:
+        newsletter.is_active = False
+
+    user = User.query.filter(email_equals(User.email, email)).first()
+    if user:
+        user.is_subscribed = False
+
+    db.session.commit()
+    if one_click:
+        return 'Unsubscribed', 200
+    flash('You have been unsubscribed from our newsletter.', 'info')
+    return redirect(url_for('static.home'))
@@ -1,67 +1,218 @@
-from flask import Blueprint, jsonify, request
-from app import db
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import String, literal, select
+from app import db, catalog_cache
 from app.models import Product
+from app.utils import search
+from app.utils.facets import CursorNotInIndex, facet_engine
+from app.utils.http_cache import catalog_conditional
+from app.utils.serializers import PRODUCT
+from app.utils.streaming import json_array_response, wants_stream
+from app.utils.suggest import suggest_index
+from app.utils.pagination import (
+    InvalidCursor, encode_cursor, keyset_filter, keyset_order, parse_page_size
+)
 
 bp = Blueprint('products', __name__, url_prefix='/api/products')
 
+# sort parameter -> (column, descending)
+SORT_OPTIONS = {
+    'price-low': (Product.price, False),
+    'price-high': (Product.price, True),
+    'rating': (Product.rating, True),
+    'newest': (Product.created_at, True),
+    'name': (Product.name, False),
+}
+
+PRODUCT_FIELDS = [column.name for column in Product.__table__.columns]
+
+
+def _requested_fields():
+    """Parse the ``fields`` parameter into column names, or None for every field"""
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def _is_paged():
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def _product_listing(query, sort_by):
+    """Run a product query honouring ``fields``, ``limit`` and ``cursor``.
+
+    Without ``limit``/``cursor`` the response is a plain list as before,
+    streamed from a ``yield_per`` query when ``wants_stream()``; with them
+    it is ``{"items": [...], "next_cursor": ...}``.
+    """
+    try:
+        fields = _requested_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if sort_by not in SORT_OPTIONS:
+        sort_by = 'name'
+    sort_column, descending = SORT_OPTIONS[sort_by]
+    query = query.order_by(*keyset_order(sort_column, Product.id, descending))
+
+    serializer = PRODUCT.only(fields) if fields else PRODUCT
+    if not _is_paged():
+        rows = serializer.query(query)
+        if wants_stream():
+            rows = rows.yield_per(current_app.config.get('CATALOG_STREAM_BATCH', 500))
+            return json_array_response(rows, serializer)
+        return jsonify([serializer(row) for row in rows])
+
+    limit = parse_page_size(request.args.get('limit', type=int))
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query = query.filter(keyset_filter(
+                sort_column, Product.id, cursor, descending,
+                nulls_low=db.engine.dialect.name != 'postgresql', sort=sort_by
+            ))
+        except InvalidCursor:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    rows = query.with_entities(*serializer.columns, sort_column.label('sort_key')).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(rows[-1].sort_key, rows[-1].id, sort_by)
+    return jsonify({
+        'items': [serializer(row) for row in rows],
+        'next_cursor': next_cursor
+    })
+
 
 @bp.route('/')
+@catalog_conditional
 def get_products():
     """Get all products"""
-    products = Product.query.all()
-    return jsonify([product.to_dict() for product in products])
+    if _is_paged() or 'fields' in request.args or wants_stream():
+        return _product_listing(Product.query, request.args.get('sort', 'name'))
+    return catalog_cache.response('all', lambda: PRODUCT.all(Product.query))
 
 
 @bp.route('/bestsellers')
+@catalog_conditional
 def get_bestsellers():
     """Get bestseller products"""
-    products = Product.query.filter_by(is_bestseller=True).all()
-    return jsonify([product.to_dict() for product in products])
+    return catalog_cache.response(
+        'bestsellers', lambda: PRODUCT.all(Product.query.filter_by(is_bestseller=True))
+    )
 
 
 @bp.route('/new')
+@catalog_conditional
 def get_new_products():
     """Get new products"""
-    products = Product.query.filter_by(is_new=True).all()
-    return jsonify([product.to_dict() for product in products])
+    return catalog_cache.response(
+        'new', lambda: PRODUCT.all(Product.query.filter_by(is_new=True))
+    )
 
 
 @bp.route('/category/<category>')
+@catalog_conditional
 def get_products_by_category(category):
     """Get products by category"""
-    products = Product.query.filter_by(category=category).all()
-    return jsonify([product.to_dict() for product in products])
+    return catalog_cache.response(
+        ('category', category), lambda: PRODUCT.all(Product.query.filter_by(category=category))
+    )
 
 
 @bp.route('/search')
+@catalog_conditional
 def search_products():
-    """Search products by name, description, or tags"""
+    """Search products by name, tags or description, best match first"""
+    query = request.args.get('q', '').strip()
+    paged = _is_paged()
+    if not query:
+        return jsonify({'items': [], 'next_cursor': None} if paged else [])
+
+    limit = parse_page_size(request.args.get('limit', type=int), default=20)
+    try:
+        result = search.ranked_ids(db.session, query, limit, request.args.get('cursor'))
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    if result is None:
+        # No full-text index on this database yet
+        items = PRODUCT.all(_ilike_search(query).limit(limit))
+        next_cursor = None
+    else:
+        ids, next_cursor = result
+        by_id = {item['id']: item for item in PRODUCT.all(Product.query.filter(Product.id.in_(ids)))}
+        items = [by_id[product_id] for product_id in ids if product_id in by_id]
+
+    if paged:
+        return jsonify({'items': items, 'next_cursor': next_cursor})
+    return jsonify(items)
+
+
+@bp.route('/suggest')
+@catalog_conditional
+def suggest_products():
+    """Typeahead suggestions from product names and tags"""
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify([])
+    limit = min(request.args.get('limit', 8, type=int), 20)
+
+    version = catalog_cache.version
+    if version is None or version != suggest_index.version:
+        rows = db.session.query(Product.id, Product.name, Product.tags).all()
+        suggest_index.sync(rows, version)
+
+    return jsonify(suggest_index.suggest(query, limit))
 
+
+def _ilike_search(query):
     search_term = f'%{query}%'
-    products = Product.query.filter(
+    return Product.query.filter(
         db.or_(
             Product.name.ilike(search_term),
             Product.description.ilike(search_term),
             Product.short_description.ilike(search_term),
             Product.tags.ilike(search_term)
         )
-    ).limit(20).all()
-
-    return jsonify([product.to_dict() for product in products])
+    )
 
 
 @bp.route('/filter')
+@catalog_conditional
 def filter_products():
     """Filter products with enhanced options"""
     category = request.args.get('category')
     sort_by = request.args.get('sort', 'name')
+    if sort_by not in SORT_OPTIONS:
+        sort_by = 'name'
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
     in_stock = request.args.get('in_stock', type=bool)
 
+    # The facet index holds the whole catalog in memory; streamed listings go to the database
+    if current_app.config.get('FACET_ENGINE_ENABLED', True) and (_is_paged() or not wants_stream()):
+        version = catalog_cache.version
+        if version is not None:
+            filters = {
+                'category': category,
+                'min_price': min_price,
+                'max_price': max_price,
+                'in_stock': in_stock,
+            }
+            response = _facet_listing(version, filters, sort_by)
+            if response is not None:
+                return response
+
     query = Product.query
 
     if category and category != 'all':
@@ -82,16 +233,71 @@ def filter_products():
     if in_stock is not None:
         query = query.filter_by(in_stock=in_stock)
 
-    if sort_by == 'price-low':
-        query = query.order_by(Product.price.asc())
-    elif sort_by == 'price-high':
-        query = query.order_by(Product.price.desc())
-    elif sort_by == 'rating':
-        query = query.order_by(Product.rating.desc())
-    elif sort_by == 'newest':
-        query = query.order_by(Product.created_at.desc())
-    else:
-        query = query.order_by(Product.name.asc())
+    return _product_listing(query, sort_by)
+
+
+def _facet_listing(version, filters, sort_by):
+    """Answer filter_products from the in-memory facet index.
+
+    Paged responses also carry facet counts when ``facets`` lists the
+    category slugs to count, e.g. ``facets=serums-oils,body``. Returns
+    None for a name cursor the index cannot place; the database answers.
+    """
+    try:
+        fields = _requested_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Loaded in the database's name order, so the name sort follows its collation
+    index = facet_engine.index(
+        version,
+        lambda: PRODUCT.query(Product.query.order_by(Product.name, Product.id)).all(),
+        nulls_first=db.engine.dialect.name != 'postgresql',
+        serialize=PRODUCT,
+        name_collated=True,
+        match_categories=_matching_categories
+    )
+
+    paged = _is_paged()
+    facet_categories = None
+    if paged and 'facets' in request.args:
+        facet_categories = [slug for slug in request.args['facets'].split(',') if slug]
+
+    try:
+        positions, has_more, facets = index.query(
+            sort_by=sort_by,
+            cursor=request.args.get('cursor') if paged else None,
+            limit=parse_page_size(request.args.get('limit', type=int)) if paged else None,
+            facet_categories=facet_categories,
+            **filters
+        )
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    except CursorNotInIndex:
+        return None
+
+    items = [index.items[position] for position in positions]
+    if fields is not None or paged:
+        fields = fields or PRODUCT_FIELDS
+        items = [{name: item[name] for name in fields} for item in items]
+    if not paged:
+        return jsonify(items)
+
+    next_cursor = None
+    if has_more:
+        last = positions[-1]
+        next_cursor = encode_cursor(index.sort_value(sort_by, last), index.values['id'][last], sort_by)
+    body = {'items': items, 'next_cursor': next_cursor}
+    if facets is not None:
+        body['facets'] = facets
+    return jsonify(body)
+
 
-    products = query.all()
-    return jsonify([product.to_dict() for product in products])
\ No newline at end of file
+def _matching_categories(pattern, categories):
+    """The category values the database's ILIKE matches ``pattern`` against, for the facet index"""
+    if not categories:
+        return []
+    matches = db.session.execute(
+        select(*[literal(category, String).ilike(pattern) for category in categories])
+    ).one()
+    return [category for category, matched in zip(categories, matches) if matched]
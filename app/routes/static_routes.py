@@ -1,48 +1,56 @@
-from flask import Blueprint, render_template
-from app.models import CartItem, Product
-from flask_login import current_user
-from flask import session
+from flask import Blueprint, abort, render_template
+from app import page_cache
+from app.models import Product
+from app.utils.cart import cart_owner, load_cart
+from app.utils.http_cache import page_conditional
 
 bp = Blueprint('static', __name__)
 
 
 @bp.route('/')
+@page_conditional()
 def home():
     """Serve the homepage unchanged"""
     return render_template('index.html')
 
 
 @bp.route('/about')
+@page_conditional()
 def about():
     """About page route"""
     return render_template('about.html')
 
 
 @bp.route('/shop')
+@page_conditional()
 def shop():
     """Shop page route"""
     return render_template('shop.html')
 
 
 @bp.route('/contact')
+@page_conditional()
 def contact():
     """Contact page route"""
     return render_template('contact.html')
 
 
 @bp.route('/blog')
+@page_conditional()
 def blog():
     """Blog/Journal page route"""
     return render_template('blog.html')
 
 
 @bp.route('/single-post')
+@page_conditional()
 def single_post():
     """Single post page route"""
     return render_template('single-post.html')
 
 
 @bp.route('/thank-you')
+@page_conditional()
 def thank_you():
     """Thank you page route"""
     return render_template('thank-you.html')
@@ -51,44 +59,42 @@ def thank_you():
 @bp.route('/cart')
 def cart():
     """Shopping cart page"""
-    cart_items = []
-    cart_total = 0
-
-    if current_user.is_authenticated:
-        cart_items_db = CartItem.query.filter_by(user_id=current_user.id).all()
-    else:
-        session_id = session.get('cart_session_id')
-        if session_id:
-            cart_items_db = CartItem.query.filter_by(session_id=session_id).all()
-        else:
-            cart_items_db = []
-
-    for item in cart_items_db:
-        item_total = item.product.price * item.quantity
-        cart_total += item_total
-        cart_items.append({
-            'item': item,
-            'product': item.product,
-            'item_total': item_total
-        })
+    lines, cart_total = load_cart(cart_owner())
+    cart_items = [
+        {'item': item, 'product': item.product, 'item_total': item_total}
+        for item, item_total in lines
+        if item.product is not None
+    ]
 
     return render_template('cart.html', cart_items=cart_items, cart_total=cart_total)
 
 
 @bp.route('/product/<int:product_id>')
+@page_conditional(catalog=True)
 def product_detail(product_id):
-    """Dynamic product detail page"""
-    product = Product.query.get_or_404(product_id)
-    related_products = Product.query.filter(
-        Product.category == product.category,
-        Product.id != product.id
-    ).limit(4).all()
-
-    return render_template('product-detail.html', product=product, related_products=related_products)
+    """Dynamic product detail page, served from the page cache"""
+    def render():
+        product = Product.query.get(product_id)
+        if product is None:
+            return None
+        related_products = Product.query.filter(
+            Product.category == product.category,
+            Product.id != product.id
+        ).limit(4).all()
+        return render_template('product-detail.html', product=product, related_products=related_products)
+
+    html = page_cache.page(f'product:{product_id}', render)
+    if html is None:
+        abort(404)
+    return html
 
 
 @bp.route('/category/<category_name>')
+@page_conditional(catalog=True)
 def category_products(category_name):
-    """Products by category"""
-    products = Product.query.filter_by(category=category_name).all()
-    return render_template('category.html', products=products, category=category_name)
\ No newline at end of file
+    """Products by category, served from the page cache"""
+    def render():
+        products = Product.query.filter_by(category=category_name).all()
+        return render_template('category.html', products=products, category=category_name)
+
+    return page_cache.page(f'category:{category_name}', render)
@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from app import db
 from app.models import Wishlist, Product
 from flask_login import login_required, current_user
+from app.utils.serializers import WISHLIST
 
 bp = Blueprint('wishlist', __name__, url_prefix='/api/wishlist')
 
@@ -10,8 +11,7 @@ bp = Blueprint('wishlist', __name__, url_prefix='/api/wishlist')
 @login_required
 def get_wishlist():
     """Get user's wishlist"""
-    wishlist_items = Wishlist.query.filter_by(user_id=current_user.id).all()
-    return jsonify([item.to_dict() for item in wishlist_items])
+    return jsonify(WISHLIST.all(Wishlist.query.filter_by(user_id=current_user.id)))
 
 
 @bp.route('/add', methods=['POST'])
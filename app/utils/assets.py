@@ -0,0 +1,258 @@
+"""
+Fingerprinted, precompressed static assets.
+
+``flask assets build`` copies every file under ``app/static`` to
+``app/static/dist`` under a content-hashed name (``style.3f2a9c1be0d4.css``).
+Compressible files also get ``.gz`` and, when the ``brotli`` package is
+installed, ``.br`` siblings. Relative ``url()`` references inside CSS are
+rewritten to the hashed names. ``dist/manifest.json`` maps each source
+path to its hashed copy and lists the encodings written for it.
+
+Templates keep calling ``url_for('static', filename=...)``. The Jinja
+``url_for`` is replaced with ``asset_url_for``, which resolves the static
+endpoint to the hashed copy whenever the manifest has it and behaves
+exactly like ``url_for`` otherwise. Without a build, or with
+``ASSETS_FINGERPRINT_ENABLED`` off, pages link the plain files as before.
+
+Hashed copies are served by the ``assets`` endpoint. It picks the ``.br``
+or ``.gz`` variant the client accepts and marks the response
+``public, max-age=31536000, immutable``: a hashed name never changes
+content, so browsers and CDNs never need to revalidate it.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import abort, current_app, request, send_file, url_for
+from flask.cli import AppGroup, with_appcontext
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # .br siblings are only written when brotli is installed
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.ttf', '.eot', '.ico', '.map', '.html', '.xml'}
+# A variant that saves less than this fraction of the original is not worth a second copy
+MIN_SAVING = 0.05
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+
+class StaticAssets:
+    """Manifest lookups and the handler for fingerprinted static files"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_age = 31536000
+        self._dist = None
+        self._files = {}
+        self._encoded = {}
+        self._mtime = None
+        self.digest = ''
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ASSETS_FINGERPRINT_ENABLED', True)
+        self.max_age = app.config.get('ASSETS_MAX_AGE', self.max_age)
+        self._dist = os.path.join(app.static_folder, DIST_DIR)
+        self._debug = app.debug
+        self.load()
+        app.extensions['static_assets'] = self
+        app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['url_for'] = asset_url_for
+
+    def load(self):
+        """(Re)read the manifest; a missing manifest means no fingerprinting"""
+        path = os.path.join(self._dist, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime == self._mtime:
+                return
+            with open(path, 'rb') as f:
+                raw = f.read()
+            manifest = json.loads(raw)
+        except (OSError, ValueError):
+            self._files, self._encoded, self._mtime, self.digest = {}, {}, None, ''
+            return
+        self._files = manifest.get('files', {})
+        self._encoded = manifest.get('encoded', {})
+        self._mtime = mtime
+        self.digest = hashlib.sha1(raw).hexdigest()[:12]
+
+    def lookup(self, filename):
+        """Hashed name for a static ``filename``, or None"""
+        if not self.enabled:
+            return None
+        if self._debug:
+            self.load()
+        return self._files.get(filename)
+
+    def serve(self, filename):
+        encodings = self._encoded.get(filename)
+        if encodings is None:
+            abort(404)
+        path = safe_join(self._dist, filename)
+        if path is None:
+            abort(404)
+
+        content_encoding = None
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and accepted[encoding]:
+                path += suffix
+                content_encoding = encoding
+                break
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        etag = filename.rsplit('/', 1)[-1] + (f'.{content_encoding}' if content_encoding else '')
+        response = send_file(path, mimetype=mimetype, etag=etag, max_age=self.max_age, conditional=True)
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = f'public, max-age={self.max_age}, immutable'
+        return response
+
+
+def asset_url_for(endpoint, **values):
+    """``url_for`` that sends ``static`` files to their fingerprinted copies when built"""
+    if endpoint == 'static' and 'filename' in values:
+        assets = current_app.extensions.get('static_assets')
+        hashed = assets.lookup(values['filename']) if assets is not None else None
+        if hashed is not None:
+            values['filename'] = hashed
+            return url_for('assets', **values)
+    return url_for(endpoint, **values)
+
+
+def build(static_folder, clean=False, progress=None):
+    """Write hashed copies, compressed siblings and the manifest; return the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    sources = []
+    for root, dirs, names in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder) and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        dirs.sort()
+        for name in sorted(names):
+            sources.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+
+    files, encoded = {}, {}
+    # CSS last, so the files it references already have their hashed names
+    for source in sorted(sources, key=lambda s: (s.endswith('.css'), s)):
+        with open(os.path.join(static_folder, source), 'rb') as f:
+            content = f.read()
+        if source.endswith('.css'):
+            content = _rewrite_css(source, content, files)
+
+        stem, ext = posixpath.splitext(source)
+        hashed = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+        target = os.path.join(dist, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write(target, content)
+
+        encoded[hashed] = []
+        if ext.lower() in COMPRESSIBLE:
+            for encoding, suffix, compressed in _compress(content):
+                if len(compressed) <= len(content) * (1 - MIN_SAVING):
+                    _write(target + suffix, compressed)
+                    encoded[hashed].append(encoding)
+        files[source] = hashed
+        if progress:
+            progress(source, hashed, len(content), encoded[hashed])
+
+    manifest = {'files': files, 'encoded': encoded}
+    if clean:
+        _remove_unlisted(dist, encoded)
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def _rewrite_css(source, content, files):
+    base = posixpath.dirname(source)
+    text = content.decode('utf-8')
+
+    def replace(match):
+        quote, url = match.group(1), match.group(2).strip()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        # Keep any query or fragment: '?#iefix' and '#icomoon' still mean something to browsers
+        path, tail = re.match(r'([^?#]*)(.*)', url).groups()
+        hashed = files.get(posixpath.normpath(posixpath.join(base, path)))
+        if hashed is None:
+            return match.group(0)
+        return f'url({quote}{posixpath.relpath(hashed, base or ".")}{tail}{quote})'
+
+    return CSS_URL_PATTERN.sub(replace, text).encode('utf-8')
+
+
+def _compress(content):
+    yield 'gzip', '.gz', gzip.compress(content, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield 'br', '.br', brotli.compress(content, quality=11)
+
+
+def _write(path, content):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _remove_unlisted(dist, encoded):
+    keep = {MANIFEST_NAME}
+    for hashed, encodings in encoded.items():
+        keep.add(hashed)
+        keep.update(hashed + suffix for encoding, suffix in ENCODINGS if encoding in encodings)
+    for root, dirs, names in os.walk(dist, topdown=False):
+        for name in names:
+            if os.path.relpath(os.path.join(root, name), dist).replace(os.sep, '/') not in keep:
+                os.remove(os.path.join(root, name))
+        if root != dist and not os.listdir(root):
+            os.rmdir(root)
+
+
+@assets_cli.command('build')
+@click.option('--clean', is_flag=True, help='Remove hashed files from earlier builds.')
+@with_appcontext
+def build_command(clean):
+    """Write hashed, precompressed copies of app/static and the manifest."""
+    static_folder = current_app.static_folder
+    totals = {'files': 0, 'raw': 0, 'gzip': 0, 'br': 0}
+    dist = os.path.join(static_folder, DIST_DIR)
+
+    def progress(source, hashed, size, encodings):
+        totals['files'] += 1
+        totals['raw'] += size
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings:
+                totals[encoding] += os.path.getsize(os.path.join(dist, hashed + suffix))
+
+    if brotli is None:
+        click.echo('⚠️  brotli is not installed; writing .gz siblings only')
+    build(static_folder, clean=clean, progress=progress)
+    click.echo(f"✅ {totals['files']} files ({totals['raw'] / 1024:.0f} KB) -> {dist}")
+    click.echo(f"   gzip siblings: {totals['gzip'] / 1024:.0f} KB"
+               + (f", brotli siblings: {totals['br'] / 1024:.0f} KB" if brotli is not None else ''))
+
+
+@assets_cli.command('clean')
+@with_appcontext
+def clean_command():
+    """Remove the build output."""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    click.echo(f'🧹 Removed {dist}')
@@ -0,0 +1,372 @@
+"""
+Newsletter campaigns.
+
+``send_campaign`` streams active ``Newsletter`` subscribers in keyset
+order (``id > last_subscriber_id``), one chunk at a time, and fans each
+chunk out to a small pool of sender threads that each hold one SMTP
+connection open for the whole run. After a chunk is delivered, the
+campaign's watermark and counters are committed. An interrupted run drops
+the jobs no sender has picked up, lets the sends in flight finish and
+moves the watermark past the subscribers that were handled (threads take
+jobs in order, so those are a prefix of the chunk); a resumed run starts
+at the first one that was not.
+
+The template is rendered once per campaign with placeholder slots for the
+per-recipient values (email, unsubscribe link). Per recipient, only those
+slots are filled and the pre-built MIME headers and parts are joined,
+which avoids building a full ``email.message`` for every subscriber.
+Recipients that still fail after a reconnect are handed to the email
+outbox, which retries them with backoff. Addresses that cannot go into a
+``To:`` header unchanged (line breaks, display names, several addresses)
+are skipped.
+"""
+
+import base64
+import queue
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.header import Header
+from email.utils import formataddr, formatdate, make_msgid, parseaddr
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from markupsafe import escape
+from sqlalchemy import select
+
+from app import db, mail
+from app.models import Newsletter, NewsletterCampaign
+from app.utils.helpers import unsubscribe_serializer
+from app.utils.outbox import queue_email
+
+SLOT = '\x00{}\x00'
+SLOT_PATTERN = re.compile('\x00(\\w+)\x00')
+RECIPIENT_FIELDS = ('email', 'unsubscribe_url')
+
+
+class InvalidRecipient(ValueError):
+    """A subscriber address that is not a single bare address"""
+
+
+def recipient_address(email):
+    """``email`` as a ``To:`` header value; raises InvalidRecipient rather than inject headers"""
+    if not email or any(char in email for char in '\r\n\x00') or parseaddr(email) != ('', email):
+        raise InvalidRecipient(f'not a single address: {email!r}')
+    return formataddr(('', email))
+
+
+class CampaignTemplate:
+    """A campaign email rendered once, with slots for per-recipient values"""
+
+    def __init__(self, subject, html_template, text_template=None, sender=None, base_url=''):
+        env = current_app.jinja_env
+        slots = {field: SLOT.format(field) for field in RECIPIENT_FIELDS}
+
+        self.html_parts = SLOT_PATTERN.split(env.get_template(html_template).render(**slots))
+        self.text_parts = None
+        if text_template:
+            self.text_parts = SLOT_PATTERN.split(env.get_template(text_template).render(**slots))
+
+        self.envelope_from = parseaddr(sender)[1]
+        self.base_url = base_url.rstrip('/')
+        self.serializer = unsubscribe_serializer()
+        self.domain = self.envelope_from.rpartition('@')[2] or 'localhost'
+
+        boundary = f'=={uuid.uuid4().hex}=='
+        self.headers = (
+            f'From: {formataddr(parseaddr(sender))}\r\n'
+            f'Subject: {Header(subject, "utf-8").encode()}\r\n'
+            f'Date: {formatdate(localtime=True)}\r\n'
+            'MIME-Version: 1.0\r\n'
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+        ).encode('utf-8')
+        self.part_header = (
+            f'--{boundary}\r\n'
+            'Content-Type: text/{}; charset="utf-8"\r\n'
+            'Content-Transfer-Encoding: base64\r\n\r\n'
+        )
+        self.closing = f'--{boundary}--\r\n'.encode('ascii')
+
+    def fill(self, parts, values, escaped):
+        filled = list(parts)
+        for i in range(1, len(filled), 2):
+            value = values[filled[i]]
+            filled[i] = str(escape(value)) if escaped else value
+        return ''.join(filled)
+
+    def render(self, email):
+        """Return ``(values, html, text)`` for one recipient"""
+        token = self.serializer.dumps(email)
+        values = {'email': email, 'unsubscribe_url': f'{self.base_url}/newsletter/unsubscribe/{token}'}
+        html = self.fill(self.html_parts, values, escaped=True)
+        text = self.fill(self.text_parts, values, escaped=False) if self.text_parts else None
+        return values, html, text
+
+    def message_bytes(self, values, html, text):
+        """The complete RFC 5322 message for one recipient"""
+        recipient_headers = (
+            f'To: {recipient_address(values["email"])}\r\n'
+            f'Message-ID: {make_msgid(domain=self.domain)}\r\n'
+            f'List-Unsubscribe: <{values["unsubscribe_url"]}>\r\n'
+            'List-Unsubscribe-Post: List-Unsubscribe=One-Click\r\n\r\n'
+        ).encode('utf-8')
+        chunks = [self.headers, recipient_headers]
+        for subtype, content in (('plain', text), ('html', html)):
+            if content is None:
+                continue
+            chunks.append(self.part_header.format(subtype).encode('ascii'))
+            chunks.append(base64.encodebytes(content.encode('utf-8')).replace(b'\n', b'\r\n'))
+        chunks.append(self.closing)
+        return b''.join(chunks)
+
+
+class RateLimiter:
+    """Spaces sends evenly so that at most ``rate`` go out per second (0 means no limit)"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SenderPool:
+    """Sender threads, each keeping one SMTP connection open across chunks"""
+
+    def __init__(self, app, template, connections, rate):
+        self.app = app
+        self.template = template
+        self.limiter = RateLimiter(rate)
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.run, daemon=True, name=f'campaign-{i}')
+                        for i in range(connections)]
+        self.results = {}
+        self.stopped = False
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def send_chunk(self, rows):
+        """Deliver one chunk of ``(subscriber_id, email)``.
+
+        Returns ``{subscriber_id: (email, html, text, error)}``; error is None when sent.
+        """
+        self.results = {}
+        for row in rows:
+            self.jobs.put(tuple(row))
+        self.jobs.join()
+        return self.results
+
+    def cancel(self):
+        """Drop the jobs no thread has picked up yet"""
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            self.jobs.task_done()
+
+    def stop(self):
+        """Stop the threads once the sends in flight finish"""
+        if self.stopped:
+            return
+        self.stopped = True
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def run(self):
+        with self.app.app_context():
+            connection = None
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    self.jobs.task_done()
+                    break
+                subscriber_id, email = job
+                values, html, text = self.template.render(email)
+                try:
+                    raw = self.template.message_bytes(values, html, text)
+                except InvalidRecipient as e:
+                    with self.lock:
+                        self.results[subscriber_id] = (email, html, text, e)
+                    self.jobs.task_done()
+                    continue
+                error = None
+                for attempt in range(2):
+                    self.limiter.wait()
+                    try:
+                        if connection is None:
+                            connection = mail.connect().__enter__()
+                        if connection.host is not None:
+                            connection.host.sendmail(self.template.envelope_from, [email], raw)
+                        error = None
+                        break
+                    except Exception as e:
+                        error = e
+                        connection = self.close(connection)
+                with self.lock:
+                    self.results[subscriber_id] = (email, html, text, error)
+                self.jobs.task_done()
+            self.close(connection)
+
+    @staticmethod
+    def close(connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass
+        return None
+
+
+def send_campaign(campaign, chunk_size=500, connections=4, rate=0, text_template=None,
+                  base_url='', progress=None):
+    """Send ``campaign`` to every active subscriber it has not reached yet.
+
+    ``progress`` is called with the campaign after each committed chunk.
+    An interrupted run (including KeyboardInterrupt) leaves the campaign
+    'paused' after the last subscriber handled in order; calling this
+    again resumes it.
+    """
+    config = current_app.config
+    sender = config.get('MAIL_DEFAULT_SENDER') or config.get('MAIL_USERNAME')
+    if not sender:
+        raise ValueError('Set MAIL_DEFAULT_SENDER or MAIL_USERNAME to send campaigns')
+    template = CampaignTemplate(campaign.subject, campaign.template, text_template, sender, base_url)
+
+    campaign.status = 'running'
+    campaign.started_at = campaign.started_at or datetime.utcnow()
+    db.session.commit()
+
+    def record(rows, results):
+        # Only the leading handled rows: the watermark cannot skip over one that was not
+        sent = failed = 0
+        for row in rows:
+            if row.id <= campaign.last_subscriber_id:
+                continue
+            if row.id not in results:
+                break
+            email, html, text, error = results[row.id]
+            if error is None:
+                sent += 1
+            elif isinstance(error, InvalidRecipient):
+                current_app.logger.warning(f'Campaign {campaign.name}: skipped subscriber {row.id}: {error}')
+            else:
+                current_app.logger.warning(f'Campaign {campaign.name}: {email} handed to outbox: {error}')
+                queue_email(campaign.subject, [email], html=html, body=text, sender=sender, commit=False)
+                failed += 1
+            campaign.last_subscriber_id = row.id
+        campaign.sent_count += sent
+        campaign.failed_count += failed
+
+    pool = SenderPool(current_app._get_current_object(), template, connections, rate).start()
+    rows = []
+    try:
+        while True:
+            rows = db.session.execute(
+                select(Newsletter.id, Newsletter.email)
+                .where(Newsletter.is_active.is_(True), Newsletter.id > campaign.last_subscriber_id)
+                .order_by(Newsletter.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            record(rows, pool.send_chunk(rows))
+            db.session.commit()
+            if progress:
+                progress(campaign)
+
+        campaign.status = 'completed'
+        campaign.completed_at = datetime.utcnow()
+        db.session.commit()
+    except BaseException:
+        # Send nothing more, wait for the sends in flight, then keep what went out
+        pool.cancel()
+        pool.stop()
+        db.session.rollback()
+        record(rows, pool.results)
+        campaign.status = 'paused'
+        db.session.commit()
+        raise
+    finally:
+        pool.stop()
+    return campaign
+
+
+campaign_cli = AppGroup('campaign', help='Newsletter campaigns')
+
+
+@campaign_cli.command('send')
+@click.argument('name')
+@click.option('--subject', help='Subject line (required for a new campaign)')
+@click.option('--template', default='newsletter_email.html', show_default=True, help='HTML template')
+@click.option('--text-template', help='Optional plain-text template')
+@click.option('--chunk-size', type=int, help='Subscribers per chunk [NEWSLETTER_CHUNK_SIZE]')
+@click.option('--connections', type=int, help='Persistent SMTP connections [NEWSLETTER_CONNECTIONS]')
+@click.option('--rate', type=float, help='Max messages per second, 0 for none [NEWSLETTER_RATE_LIMIT]')
+def send(name, subject, template, text_template, chunk_size, connections, rate):
+    """Send (or resume) the campaign NAME to active subscribers"""
+    config = current_app.config
+    campaign = NewsletterCampaign.query.filter_by(name=name).first()
+    if campaign is None:
+        if not subject:
+            raise click.UsageError('--subject is required for a new campaign')
+        campaign = NewsletterCampaign(name=name, subject=subject, template=template)
+        db.session.add(campaign)
+        db.session.commit()
+    elif campaign.status == 'completed':
+        click.echo(f'Campaign {name} already completed ({campaign.sent_count} sent)')
+        return
+    else:
+        click.echo(f'Resuming {name} after subscriber {campaign.last_subscriber_id}')
+
+    start, start_sent = time.perf_counter(), campaign.sent_count
+
+    def report(campaign):
+        elapsed = time.perf_counter() - start
+        rate_now = (campaign.sent_count - start_sent) / elapsed if elapsed else 0
+        click.echo(f'  {campaign.sent_count} sent, {campaign.failed_count} to outbox, '
+                   f'up to subscriber {campaign.last_subscriber_id} ({rate_now:.0f} msgs/sec)')
+
+    try:
+        send_campaign(
+            campaign,
+            chunk_size=chunk_size or config['NEWSLETTER_CHUNK_SIZE'],
+            connections=connections or config['NEWSLETTER_CONNECTIONS'],
+            rate=config['NEWSLETTER_RATE_LIMIT'] if rate is None else rate,
+            text_template=text_template,
+            base_url=config['NEWSLETTER_BASE_URL'],
+            progress=report,
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        click.echo(f'Paused {name}; run the same command again to resume')
+        return
+    click.echo(f'📨 Campaign {name} completed')
+
+
+@campaign_cli.command('status')
+def status():
+    """List campaigns and their progress"""
+    for campaign in NewsletterCampaign.query.order_by(NewsletterCampaign.id):
+        click.echo(f'{campaign.name:<24} {campaign.status:<10} {campaign.sent_count} sent, '
+                   f'{campaign.failed_count} to outbox, up to subscriber {campaign.last_subscriber_id}')
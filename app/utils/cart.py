@@ -0,0 +1,226 @@
+"""
+Cart data access shared by the cart API and the cart page.
+"""
+
+from datetime import datetime
+
+from flask import session
+from flask_login import current_user
+from sqlalchemy import and_, case, delete, exists, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import contains_eager
+
+from app import db
+from app.models import CartItem, Product
+from app.models.cart_item import size_key
+from app.utils.serializers import CART_ITEM
+
+
+def cart_owner():
+    """Filter criterion for the current user's or guest session's cart, or None if there is none"""
+    if current_user.is_authenticated:
+        return CartItem.user_id == current_user.id
+    session_id = session.get('cart_session_id')
+    if not session_id:
+        return None
+    return CartItem.session_id == session_id
+
+
+def load_cart(owner):
+    """Load cart lines with their products, line totals and the cart total in one statement.
+
+    Returns ``(lines, cart_total)`` where ``lines`` is a list of
+    ``(cart_item, line_total)`` with ``cart_item.product`` already loaded.
+    """
+    if owner is None:
+        return [], 0
+
+    line_total = Product.price * CartItem.quantity
+    rows = (
+        db.session.query(
+            CartItem,
+            line_total.label('line_total'),
+            func.sum(line_total).over().label('cart_total'),
+        )
+        .outerjoin(CartItem.product)
+        .options(contains_eager(CartItem.product))
+        .filter(owner)
+        .order_by(CartItem.id)
+        .all()
+    )
+
+    lines = [(row.CartItem, row.line_total or 0) for row in rows]
+    cart_total = (rows[0].cart_total or 0) if rows else 0
+    return lines, cart_total
+
+
+def load_cart_items(owner):
+    """``load_cart`` for the JSON API: cart lines as ``CartItem.to_dict()`` dicts, without ORM objects.
+
+    Returns ``(lines, cart_total)`` where ``lines`` is a list of
+    ``(item_dict, line_total)``.
+    """
+    if owner is None:
+        return [], 0
+
+    line_total = Product.price * CartItem.quantity
+    rows = (
+        CART_ITEM.query()
+        .add_columns(line_total.label('line_total'), func.sum(line_total).over().label('cart_total'))
+        .filter(owner)
+        .order_by(CartItem.id)
+        .all()
+    )
+
+    lines = [(CART_ITEM(row), row.line_total or 0) for row in rows]
+    cart_total = (rows[0].cart_total or 0) if rows else 0
+    return lines, cart_total
+
+
+def add_line(product_id, quantity=1, size=None, user_id=None, session_id=None):
+    """Add ``quantity`` to a cart line in one atomic INSERT ... ON CONFLICT DO UPDATE.
+
+    Exactly one of ``user_id`` and ``session_id`` identifies the cart.
+    Concurrent adds of the same line are summed by the database, so none
+    are lost and no duplicate line is created.
+    """
+    add_lines([(product_id, size, quantity)], user_id=user_id, session_id=session_id)
+
+
+def add_lines(lines, user_id=None, session_id=None):
+    """Upsert several ``(product_id, size, quantity)`` lines in a single statement"""
+    # One row per line: ON CONFLICT may not touch the same row twice in a statement
+    totals = {}
+    for product_id, size, quantity in lines:
+        totals[(product_id, size)] = totals.get((product_id, size), 0) + quantity
+    if not totals:
+        return
+
+    table = CartItem.__table__
+    if user_id is not None:
+        owner_column, owner_value = table.c.user_id, user_id
+    else:
+        owner_column, owner_value = table.c.session_id, session_id
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            owner_column.name: owner_value,
+            'product_id': product_id,
+            'quantity': quantity,
+            'size': size,
+            'created_at': now,
+        }
+        for (product_id, size), quantity in totals.items()
+    ]
+    statement = _dialect_insert()(table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[owner_column, table.c.product_id, size_key(table.c.size)],
+        index_where=owner_column.isnot(None),
+        set_={'quantity': table.c.quantity + statement.excluded.quantity},
+    )
+    db.session.execute(statement)
+
+
+def apply_batch(operations, owner, user_id=None, session_id=None):
+    """Apply add/update/remove operations to one cart with set-based statements.
+
+    Removes run first, then quantity updates, then adds; each kind is a
+    single statement whatever the number of operations. Raises ValueError
+    for malformed operations or unknown products. The caller commits.
+    """
+    removes, updates, adds = [], {}, []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError('Each operation must be an object')
+        op = operation.get('op')
+        if op == 'remove':
+            removes.append(_as_int(operation.get('id'), 'id'))
+        elif op == 'update':
+            quantity = _as_int(operation.get('quantity'), 'quantity')
+            if quantity < 1:
+                raise ValueError('Quantity must be at least 1')
+            updates[_as_int(operation.get('id'), 'id')] = quantity
+        elif op == 'add':
+            quantity = _as_int(operation.get('quantity', 1), 'quantity')
+            if quantity < 1:
+                raise ValueError('Quantity must be at least 1')
+            adds.append((_as_int(operation.get('product_id'), 'product_id'), operation.get('size'), quantity))
+        else:
+            raise ValueError(f'Unknown operation: {op}')
+
+    if adds:
+        wanted = {product_id for product_id, _, _ in adds}
+        found = set(db.session.scalars(select(Product.id).where(Product.id.in_(wanted))))
+        if wanted - found:
+            raise ValueError(f'Product not found: {min(wanted - found)}')
+
+    table = CartItem.__table__
+    if removes and owner is not None:
+        db.session.execute(delete(table).where(table.c.id.in_(removes), owner))
+        for item_id in removes:
+            updates.pop(item_id, None)
+    if updates and owner is not None:
+        db.session.execute(
+            update(table)
+            .where(table.c.id.in_(list(updates)), owner)
+            .values(quantity=case(updates, value=table.c.id))
+        )
+    if adds:
+        add_lines(adds, user_id=user_id, session_id=session_id)
+
+
+def merge_guest_cart(user_id, session_id):
+    """Move a guest session's cart into a user's cart with a fixed number of statements.
+
+    Lines the user already has get the guest quantity added, those guest
+    lines are deleted, and the remaining guest lines are re-keyed to the
+    user. The guest rows are locked first (FOR UPDATE on PostgreSQL; SQLite
+    serialises writers), so a second concurrent sign-in with the same
+    session finds nothing left to merge. The caller commits.
+    """
+    table = CartItem.__table__
+    guest = table.alias('guest')
+    same_line = and_(
+        guest.c.session_id == session_id,
+        guest.c.product_id == table.c.product_id,
+        size_key(guest.c.size) == size_key(table.c.size),
+    )
+
+    db.session.execute(
+        select(table.c.id).where(table.c.session_id == session_id).with_for_update()
+    )
+    db.session.execute(
+        update(table)
+        .where(table.c.user_id == user_id, exists().where(same_line))
+        .values(quantity=table.c.quantity + select(guest.c.quantity).where(same_line).scalar_subquery())
+    )
+
+    owned = table.alias('owned')
+    db.session.execute(
+        delete(table).where(
+            table.c.session_id == session_id,
+            exists().where(
+                owned.c.user_id == user_id,
+                owned.c.product_id == table.c.product_id,
+                size_key(owned.c.size) == size_key(table.c.size),
+            )
+        )
+    )
+    db.session.execute(
+        update(table)
+        .where(table.c.session_id == session_id)
+        .values(user_id=user_id, session_id=None)
+    )
+
+
+def _as_int(value, name):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f'{name} must be an integer')
+    return value
+
+
+def _dialect_insert():
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert
+    return sqlite.insert
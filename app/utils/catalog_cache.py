@@ -0,0 +1,235 @@
+"""
+Per-worker cache for the product catalog.
+
+Serialized products and list responses are cached against the catalog
+version stored in the ``catalog_version`` table. Every ORM insert, update
+or delete of a ``Product`` (including bulk ``query.update()`` and
+``query.delete()``) bumps that version in the same transaction, so changes
+made by other workers or by the scripts in ``scripts/`` are picked up the
+next time a worker re-reads the version.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+_DIRTY_KEY = 'catalog_dirty'
+_listening = False
+
+
+class CatalogCache:
+    """Bounded, version-keyed cache for catalog reads"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._lists = OrderedDict()
+        self._list_bytes = 0
+        self._products = {}
+        self._version = None
+        self._updated_at = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        self.max_entries = 256
+        self.max_bytes = 8 * 1024 * 1024
+        self.max_products = 50000
+        self.check_interval = 2.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CATALOG_CACHE_ENABLED', True)
+        self.max_entries = app.config.get('CATALOG_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('CATALOG_CACHE_MAX_BYTES', self.max_bytes)
+        self.max_products = app.config.get('CATALOG_CACHE_MAX_PRODUCTS', self.max_products)
+        self.check_interval = app.config.get('CATALOG_CACHE_CHECK_INTERVAL', self.check_interval)
+        app.extensions['catalog_cache'] = self
+        _listen(self)
+
+    @property
+    def version(self):
+        """Current catalog version, re-read from the database at most every check_interval seconds"""
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.check_interval:
+            return self._version
+
+        version, updated_at = _read_version()
+        with self._lock:
+            if version != self._version:
+                self._clear_locked()
+                self._version = version
+            self._updated_at = updated_at
+            self._checked_at = now
+        return version
+
+    @property
+    def last_modified(self):
+        """When the catalog last changed (the version row's ``updated_at``), or None"""
+        if self.version is None:
+            return None
+        return self._updated_at
+
+    def invalidate(self):
+        """Force the next lookup to re-read the catalog version"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def mark_changed(self, session):
+        """Bump the catalog version in ``session``'s transaction, for Core writes the ORM events do not see"""
+        _bump_version(session)
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
+            self._version = None
+            self._checked_at = 0.0
+
+    def serialize(self, product, version=None):
+        """Return the cached ``to_dict()`` of a product, building it on first use"""
+        if version is None:
+            version = self.version
+        data = self._products.get(product.id)
+        if data is None:
+            data = product.to_dict()
+            if version is not None:
+                with self._lock:
+                    if version == self._version and len(self._products) < self.max_products:
+                        self._products[product.id] = data
+        return data
+
+    def get_json(self, key, loader):
+        """Return the JSON body for ``key``, calling ``loader`` for the data on a miss.
+
+        ``loader`` returns either a list of ``Product`` rows, which are
+        serialized through the per-product cache, or any JSON-serializable value.
+        """
+        version = self.version if self.enabled else None
+        if version is not None:
+            with self._lock:
+                body = self._lists.get(key)
+                if body is not None:
+                    self._lists.move_to_end(key)
+                    self.hits += 1
+                    return body
+                self.misses += 1
+
+        data = loader()
+        if isinstance(data, list):
+            data = [self.serialize(item, version) if hasattr(item, 'to_dict') else item
+                    for item in data]
+        body = current_app.json.dumps(data).encode('utf-8')
+
+        if version is not None:
+            with self._lock:
+                if version == self._version:
+                    self._store_locked(key, body)
+        return body
+
+    def response(self, key, loader):
+        """Build a JSON response served from the cache"""
+        body = self.get_json(key, loader)
+        return current_app.response_class(body, mimetype='application/json')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._lists),
+                'bytes': self._list_bytes,
+                'products': len(self._products),
+            }
+
+    def _store_locked(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        previous = self._lists.pop(key, None)
+        if previous is not None:
+            self._list_bytes -= len(previous)
+        self._lists[key] = body
+        self._list_bytes += len(body)
+        while self._lists and (len(self._lists) > self.max_entries or self._list_bytes > self.max_bytes):
+            _, evicted = self._lists.popitem(last=False)
+            self._list_bytes -= len(evicted)
+
+    def _clear_locked(self):
+        self._lists.clear()
+        self._list_bytes = 0
+        self._products.clear()
+
+
+def _read_version():
+    """Read the catalog version and its timestamp on their own connection so request transactions are untouched"""
+    from app import db
+    from app.models import CatalogVersion
+
+    try:
+        with db.engine.connect() as conn:
+            row = conn.execute(select(CatalogVersion.version, CatalogVersion.updated_at)).first()
+    except SQLAlchemyError:
+        # Table not created yet: behave as an uncached catalog
+        return None, None
+    if row is None:
+        return 0, None
+    return row.version or 0, row.updated_at
+
+
+def _bump_version(session):
+    from app.models import CatalogVersion
+
+    conn = session.connection()
+    table = CatalogVersion.__table__
+    now = datetime.utcnow()
+    result = conn.execute(
+        update(table).values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(table).values(id=1, version=1, updated_at=now))
+    session.info[_DIRTY_KEY] = True
+
+
+def _touches_catalog(objects):
+    from app.models import Product
+
+    return any(isinstance(obj, Product) for obj in objects)
+
+
+def _listen(cache):
+    global _listening
+    if _listening:
+        return
+    _listening = True
+
+    @event.listens_for(Session, 'after_flush')
+    def _after_flush(session, flush_context):
+        if (_touches_catalog(session.new) or _touches_catalog(session.dirty)
+                or _touches_catalog(session.deleted)):
+            _bump_version(session)
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _do_orm_execute(orm_execute_state):
+        from app.models import Product
+
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete
+                or orm_execute_state.is_insert):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is Product:
+            _bump_version(orm_execute_state.session)
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        if session.info.pop(_DIRTY_KEY, False):
+            cache.invalidate()
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def _after_soft_rollback(session, previous_transaction):
+        session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,317 @@
+"""
+Bulk catalog import: ``flask catalog import products.csv``.
+
+Reads CSV (header row) or JSON Lines a chunk at a time and upserts each
+chunk by ``sku`` in one transaction:
+
+- PostgreSQL: the chunk is ``COPY``-ed into a temporary staging table,
+  then merged with one ``INSERT ... SELECT ... ON CONFLICT (sku) DO UPDATE``.
+- SQLite: one batched ``INSERT ... ON CONFLICT (sku) DO UPDATE``
+  executemany.
+
+The ``DO UPDATE`` only fires when a column actually differs
+(``IS DISTINCT FROM``), so unchanged rows are not rewritten and their
+search-index triggers do not run. Only columns present in the file are
+written; anything else on an existing product is left alone. Every chunk
+commits on its own, and re-running an import, whole or after an
+interruption, converges on the same catalog.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, Integer, MetaData, Table, bindparam, func, or_, select, text, update
+)
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import catalog_cache, db
+from app.models import Product
+
+TRUE_VALUES = {'true', '1', 'yes', 'y', 't'}
+FALSE_VALUES = {'false', '0', 'no', 'n', 'f', ''}
+# Never taken from the file: ids are the database's, sku is the conflict key
+IMPORTABLE = [column.name for column in Product.__table__.columns if column.name != 'id']
+
+
+class InvalidRow(ValueError):
+    """Raised for a row that cannot be imported; carries its line number"""
+
+    def __init__(self, line, message):
+        super().__init__(f'line {line}: {message}')
+        self.line = line
+
+
+def read_rows(path, fmt=None):
+    """Yield ``(line_number, dict)`` from a CSV or JSONL file without loading it whole"""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+    with open(path, newline='' if fmt == 'csv' else None, encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            unknown = set(reader.fieldnames or []) - set(IMPORTABLE)
+            if unknown:
+                raise click.ClickException(f"Unknown columns: {', '.join(sorted(unknown))}")
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    raise InvalidRow(line_number, f'invalid JSON ({e})')
+                if not isinstance(row, dict):
+                    raise InvalidRow(line_number, 'expected a JSON object')
+                unknown = set(row) - set(IMPORTABLE)
+                if unknown:
+                    raise InvalidRow(line_number, f"unknown fields: {', '.join(sorted(unknown))}")
+                yield line_number, row
+
+
+def coerce(line, row):
+    """Convert raw CSV/JSON values to column types; empty cells become NULL"""
+    columns = Product.__table__.c
+    values = {}
+    for name, value in row.items():
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '' and name != 'sku':
+                value = None
+        if value is not None:
+            try:
+                value = _convert(columns[name].type, value)
+            except (TypeError, ValueError):
+                raise InvalidRow(line, f'{name}: cannot convert {value!r}')
+        values[name] = value
+    if not values.get('sku'):
+        raise InvalidRow(line, 'sku is required')
+    values['sku'] = str(values['sku'])
+    return values
+
+
+def _convert(column_type, value):
+    if isinstance(column_type, Boolean):
+        if isinstance(value, bool):
+            return value
+        text_value = str(value).lower()
+        if text_value in TRUE_VALUES:
+            return True
+        if text_value in FALSE_VALUES:
+            return False
+        raise ValueError(value)
+    if isinstance(column_type, Integer):
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    if isinstance(column_type, Float):
+        return float(value)
+    if isinstance(column_type, DateTime):
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    return str(value)
+
+
+class CatalogImporter:
+    """Upserts chunks of coerced product dicts and keeps running totals"""
+
+    def __init__(self, session, adopt_by_name=False):
+        self.session = session
+        self.adopt_by_name = adopt_by_name
+        self.dialect = session.get_bind().dialect.name
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    @property
+    def total(self):
+        return self.inserted + self.updated + self.unchanged
+
+    def import_chunk(self, rows):
+        """Upsert one chunk in the caller's transaction; later rows win over earlier ones with the same sku"""
+        by_sku = {}
+        for row in rows:
+            by_sku[row['sku']] = row
+        table = Product.__table__
+        existing = set(self.session.scalars(select(table.c.sku).where(table.c.sku.in_(list(by_sku)))))
+        if self.adopt_by_name:
+            existing |= self._adopt(by_sku, existing)
+
+        # executemany needs one parameter set per statement, so rows are grouped by their columns
+        groups = {}
+        for row in by_sku.values():
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        written = 0
+        for columns, group in groups.items():
+            if self.dialect == 'postgresql':
+                written += self._copy_merge(columns, group)
+            else:
+                written += self._upsert(columns, group)
+
+        new = len(by_sku.keys() - existing)
+        self.inserted += new
+        self.updated += written - new
+        self.unchanged += len(by_sku) - written
+        if written:
+            catalog_cache.mark_changed(self.session)
+        return written
+
+    def _adopt(self, by_sku, existing):
+        """Give products created before SKUs existed the sku of the imported row with the same name"""
+        table = Product.__table__
+        candidates = [{'new_sku': sku, 'match_name': row['name']} for sku, row in by_sku.items()
+                      if sku not in existing and row.get('name')]
+        if not candidates:
+            return set()
+        names = {candidate['match_name'] for candidate in candidates}
+        orphans = set(self.session.scalars(
+            select(table.c.name).where(table.c.sku.is_(None), table.c.name.in_(names))
+        ))
+        adopted = [candidate for candidate in candidates if candidate['match_name'] in orphans]
+        if not adopted:
+            return set()
+        orphan = table.alias('orphan')
+        first = select(func.min(orphan.c.id)).where(
+            orphan.c.sku.is_(None), orphan.c.name == bindparam('match_name')
+        ).scalar_subquery()
+        self.session.connection().execute(
+            update(table).where(table.c.id == first).values(sku=bindparam('new_sku')), adopted
+        )
+        # Two SKUs can name the same single orphan; only the first one gets it. None of these
+        # SKUs existed before, so the ones present now are exactly those that were assigned.
+        new_skus = [candidate['new_sku'] for candidate in adopted]
+        return set(self.session.scalars(select(table.c.sku).where(table.c.sku.in_(new_skus))))
+
+    def _conflict_update(self, statement, columns):
+        excluded = statement.excluded
+        table = Product.__table__
+        changing = [name for name in columns if name not in ('sku', 'created_at')]
+        if not changing:
+            return statement.on_conflict_do_nothing(index_elements=[table.c.sku])
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.sku],
+            set_={name: excluded[name] for name in changing},
+            # Skip rows whose values are all the same: no write, no trigger, no version bump
+            where=or_(*[table.c[name].is_distinct_from(excluded[name]) for name in changing]),
+        )
+
+    def _upsert(self, columns, rows):
+        table = Product.__table__
+        statement = self._conflict_update(sqlite.insert(table), columns)
+        result = self.session.connection().execute(statement, _with_defaults(columns, rows))
+        return result.rowcount
+
+    def _copy_merge(self, columns, rows):
+        table = Product.__table__
+        rows = _with_defaults(columns, rows)
+        # Staged and inserted with the defaults; only the file's own columns are updated on conflict
+        staged = list(rows[0])
+        conn = self.session.connection()
+        staging = Table(
+            'product_import', MetaData(),
+            *[Column(name, table.c[name].type) for name in staged],
+            prefixes=['TEMPORARY'], postgresql_on_commit='DROP'
+        )
+        # One staging table per column set; it disappears with the transaction anyway
+        conn.execute(text('DROP TABLE IF EXISTS product_import'))
+        staging.create(conn)
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(_copy_field(row[name]) for name in staged))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY product_import ({', '.join(staged)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+        statement = postgresql.insert(table).from_select(staged, select(*staging.c))
+        return conn.execute(self._conflict_update(statement, columns)).rowcount
+
+
+def _copy_field(value):
+    # In COPY's CSV format only an unquoted empty field is NULL; every value is quoted,
+    # so no text (not even '' or '\N') can be read back as NULL
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _with_defaults(columns, rows):
+    """Fill the model's Python-side defaults for columns the file leaves out.
+
+    They only matter for new products: the conflict update writes the
+    file's own columns. INSERT ... SELECT from the staging table would not
+    apply them otherwise.
+    """
+    defaults = {}
+    for column in Product.__table__.columns:
+        default = column.default
+        if column.name in columns or default is None:
+            continue
+        defaults[column.name] = default.arg(None) if default.is_callable else default.arg
+    if not defaults:
+        return rows
+    return [dict(defaults, **row) for row in rows]
+
+
+def import_catalog(path, fmt=None, chunk_size=1000, adopt_by_name=False, progress=None):
+    """Import ``path`` in chunks of ``chunk_size`` rows, committing each; returns the importer"""
+    importer = CatalogImporter(db.session, adopt_by_name=adopt_by_name)
+    chunk = []
+    try:
+        for line, raw in read_rows(path, fmt):
+            chunk.append(coerce(line, raw))
+            if len(chunk) >= chunk_size:
+                importer.import_chunk(chunk)
+                db.session.commit()
+                chunk = []
+                if progress:
+                    progress(importer)
+        if chunk:
+            importer.import_chunk(chunk)
+            db.session.commit()
+            if progress:
+                progress(importer)
+    except Exception:
+        db.session.rollback()
+        raise
+    return importer
+
+
+catalog_cli = AppGroup('catalog', help='Product catalog maintenance')
+
+
+@catalog_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+@click.option('--chunk-size', type=int, help='Rows per transaction [CATALOG_IMPORT_CHUNK_SIZE]')
+@click.option('--adopt-by-name', is_flag=True,
+              help='Assign SKUs to existing products without one that have the same name.')
+def import_command(path, fmt, chunk_size, adopt_by_name):
+    """Upsert products from a CSV or JSONL file by SKU"""
+    chunk_size = chunk_size or current_app.config['CATALOG_IMPORT_CHUNK_SIZE']
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+
+    def report(importer):
+        elapsed = time.perf_counter() - start
+        click.echo(f'  {importer.total} rows: {importer.inserted} new, {importer.updated} updated, '
+                   f'{importer.unchanged} unchanged ({importer.total / elapsed if elapsed else 0:,.0f} rows/sec)')
+
+    click.echo(f'📦 Importing {path} ({size / 1048576:.1f} MB) in chunks of {chunk_size}')
+    try:
+        importer = import_catalog(path, fmt, chunk_size, adopt_by_name, progress=report)
+    except InvalidRow as e:
+        raise click.ClickException(f'{e}; chunks before it were committed, fix the file and re-run')
+    elapsed = time.perf_counter() - start
+    click.echo(f'✅ {importer.total} rows in {elapsed:.1f}s: {importer.inserted} new, '
+               f'{importer.updated} updated, {importer.unchanged} unchanged')
@@ -0,0 +1,249 @@
+"""
+Connection-pool settings and read-replica routing.
+
+Every engine gets the ``DB_POOL_*`` settings: a bounded pool, connections
+recycled after ``DB_POOL_RECYCLE`` seconds and tested on checkout
+(``pool_pre_ping``), so a restarted database or a proxy that drops idle
+connections costs a reconnect instead of a failed request. Size the pool so
+that ``workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)`` stays under the
+server's connection limit.
+
+With ``DATABASE_REPLICA_URL`` set, the app gets a ``replica`` bind and
+``RoutingSession`` sends catalog reads to it: statements that only read
+``REPLICA_TABLES`` (or raw SQL, which the catalog routes only use for
+search) during a GET or HEAD request for an endpoint in
+``DB_REPLICA_ENDPOINTS``. Everything else uses the primary:
+
+- flushes, bulk writes and every statement after the session has written,
+  so a request always reads its own writes;
+- users, carts, wishlists, the outbox and the catalog version, which other
+  requests expect to be current (a new account can sign in straight away);
+- requests that arrive while the replica is behind. The replica's catalog
+  version is compared with the primary's, the one the catalog caches are
+  keyed on, so a lagging replica never serves an older catalog, nor gets
+  it cached under a newer version;
+- requests in the ``DB_REPLICA_RETRY_AFTER`` seconds after the replica
+  failed its version check or dropped a connection.
+
+The choice is made once per request, on its first catalog read, so one
+request never mixes catalog rows from both databases. A statement that
+fails on the replica is not retried; the error surfaces and the following
+requests go to the primary.
+
+To try it locally, point ``DATABASE_REPLICA_URL`` at a copy of the
+primary's SQLite file; ``scripts/check_replica_routing.py`` does that and
+checks the routing.
+"""
+
+import threading
+import time
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.sql import util as sql_util
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+REPLICA_TABLES = frozenset({'products', 'products_fts'})
+_ROUTE_KEY = 'db_route'
+_WROTE_KEY = 'db_wrote'
+
+
+def engine_options(url, config):
+    """``create_engine`` pool arguments for ``url`` from the ``DB_POOL_*`` settings"""
+    if not url:
+        return {}
+    options = {
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+    }
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and (url.database in (None, '', ':memory:')
+                                              or url.query.get('mode') == 'memory'):
+        # Flask-SQLAlchemy gives in-memory SQLite a StaticPool, which has no size
+        return options
+    options.update(
+        pool_size=config.get('DB_POOL_SIZE', 5),
+        max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+        pool_timeout=config.get('DB_POOL_TIMEOUT', 10),
+    )
+    return options
+
+
+def endpoint_matches(endpoint, patterns):
+    """True if ``endpoint`` is listed in ``patterns`` by name or as ``'<blueprint>.*'``"""
+    if not endpoint:
+        return False
+    return endpoint in patterns or f"{endpoint.rsplit('.', 1)[0]}.*" in patterns
+
+
+class ReplicaRouter:
+    """Decides per request whether catalog reads may use the replica"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._replica_version = None
+        self._checked_at = 0.0
+        self._down_until = 0.0
+        self.enabled = False
+        self.endpoints = ()
+        self.check_interval = 2.0
+        self.retry_after = 30.0
+        self.fallbacks = {'lagging': 0, 'unavailable': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Set the engine options and binds; call before ``db.init_app``, which reads them"""
+        config = app.config
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **engine_options(config.get('SQLALCHEMY_DATABASE_URI'), config),
+            **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+        }
+        replica_url = config.get('DATABASE_REPLICA_URL')
+        self.enabled = bool(replica_url)
+        if self.enabled:
+            app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA] = {
+                'url': replica_url, **engine_options(replica_url, config)
+            }
+        self.endpoints = frozenset(config.get('DB_REPLICA_ENDPOINTS', ()))
+        self.check_interval = config.get('DB_REPLICA_CHECK_INTERVAL', self.check_interval)
+        self.retry_after = config.get('DB_REPLICA_RETRY_AFTER', self.retry_after)
+        app.extensions['db_router'] = self
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app import db
+
+            engine = db.engines[REPLICA]
+            event.listen(engine, 'handle_error', self._replica_error)
+            self._engine = engine
+        return self._engine
+
+    def choose(self):
+        """``REPLICA`` if this request's catalog reads can use the replica, else ``PRIMARY``"""
+        if not (self.enabled and has_request_context() and request.method in ('GET', 'HEAD')
+                and endpoint_matches(request.endpoint, self.endpoints)):
+            return PRIMARY
+        if time.monotonic() < self._down_until:
+            return self._fallback('unavailable')
+
+        from app import catalog_cache
+
+        wanted = catalog_cache.version
+        if wanted is None:
+            # No catalog version table yet, so there is nothing to compare against
+            return PRIMARY
+        version = self.replica_version(wanted)
+        if version is None:
+            return self._fallback('unavailable')
+        if version < wanted:
+            return self._fallback('lagging')
+        return REPLICA
+
+    def replica_version(self, wanted=None):
+        """The replica's catalog version, re-read at most every check_interval seconds.
+
+        Versions only go up, so once the replica has reached ``wanted`` it
+        is not asked again until the primary moves on.
+        """
+        now = time.monotonic()
+        version = self._replica_version
+        if version is not None and (wanted is not None and version >= wanted
+                                    or now - self._checked_at < self.check_interval):
+            return version
+
+        from app.models import CatalogVersion
+
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(select(CatalogVersion.version)).first()
+        except SQLAlchemyError:
+            self.mark_down()
+            return None
+        version = (row.version or 0) if row is not None else 0
+        with self._lock:
+            self._replica_version = version
+            self._checked_at = now
+        return version
+
+    def invalidate(self):
+        """Force the next catalog request to re-read the replica's version"""
+        with self._lock:
+            self._replica_version = None
+            self._checked_at = 0.0
+
+    def mark_down(self):
+        """Keep requests off the replica for retry_after seconds"""
+        now = time.monotonic()
+        with self._lock:
+            was_down = now < self._down_until
+            self._down_until = now + self.retry_after
+            self._replica_version = None
+        if not was_down:
+            current_app.logger.warning(f'Read replica unavailable; using the primary for {self.retry_after:.0f}s')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'replica_version': self._replica_version,
+                'down': time.monotonic() < self._down_until,
+                **{f'fallback_{reason}': count for reason, count in self.fallbacks.items()},
+            }
+
+    def _fallback(self, reason):
+        from app import metrics
+
+        with self._lock:
+            self.fallbacks[reason] += 1
+        metrics.inc('db_replica_fallbacks_total', (('reason', reason),))
+        return PRIMARY
+
+    def _replica_error(self, context):
+        # Lost connections and failed connects; query errors are the statement's own fault
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.mark_down()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends catalog reads to the ``replica`` bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not self._is_catalog_read(mapper, clause):
+            return primary
+        router = current_app.extensions.get('db_router')
+        if router is None or not router.enabled:
+            return primary
+        route = self.info.get(_ROUTE_KEY)
+        if route is None:
+            route = self.info[_ROUTE_KEY] = router.choose()
+        return router.engine if route == REPLICA else primary
+
+    def _is_catalog_read(self, mapper, clause):
+        if self._flushing or self.info.get(_WROTE_KEY):
+            return False
+        if isinstance(clause, UpdateBase):
+            self.info[_WROTE_KEY] = True
+            return False
+        if isinstance(clause, TextClause):
+            return True
+        if clause is not None:
+            names = {table.name for table in sql_util.find_tables(clause)}
+            return bool(names) and names <= REPLICA_TABLES
+        if mapper is not None:
+            return inspect(mapper).local_table.name in REPLICA_TABLES
+        return False
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.info[_WROTE_KEY] = True
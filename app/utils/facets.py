@@ -0,0 +1,311 @@
+"""
+In-memory faceted filtering for the shop.
+
+A ``FacetIndex`` is an immutable snapshot of the catalog at one catalog
+version. Each product gets a dense position; categories and boolean flags
+are stored as bitsets (Python ints) over those positions, and price has a
+sorted array for range lookups. A filter request is a handful of bitwise
+ANDs, and facet counts are popcounts of the same bitsets, so one pass
+answers the product list and every count without touching the database.
+
+Results follow the SQL path in ``product_routes.filter_products`` exactly,
+including its ILIKE category match and ``(sort column, id)`` ordering with
+the database's NULL placement. Text is never compared in Python: products
+are loaded in the database's ``ORDER BY name, id`` order, which is the name
+ranking (whatever the column's collation), and the ILIKE for a category
+slug is evaluated by the database against the snapshot's category values
+(``match_categories``), once per slug and version. A name cursor naming a
+product the snapshot does not have raises ``CursorNotInIndex``, and the
+caller answers that page from the database. ``scripts/check_facet_parity.py``
+compares the two.
+"""
+
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from app.utils.pagination import InvalidCursor, decode_cursor
+
+# sort parameter -> (field, descending); mirrors product_routes.SORT_OPTIONS
+SORTS = {
+    'price-low': ('price', False),
+    'price-high': ('price', True),
+    'rating': ('rating', True),
+    'newest': ('created_at', True),
+    'name': ('name', False),
+}
+
+PRICE_BANDS = [(0, 25), (25, 50), (50, 100), (100, None)]
+
+_FLAGS = ('is_bestseller', 'is_new', 'in_stock')
+# Types a cursor's sort value may have per field; anything else cannot be ordered against the index
+_CURSOR_TYPES = {
+    'price': (int, float),
+    'rating': (int, float),
+    'created_at': (datetime,),
+    'name': (str,),
+}
+_BYTE_BITS = [[bit for bit in range(8) if byte >> bit & 1] for byte in range(256)]
+
+
+def iter_bits(bits):
+    """Positions of the set bits, in ascending order"""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for offset, byte in enumerate(data):
+        if byte:
+            base = offset * 8
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+def like_regex(pattern):
+    """Compile a SQL LIKE pattern to a case-insensitive regex, as ILIKE matches it"""
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.IGNORECASE | re.DOTALL)
+
+
+class CursorNotInIndex(LookupError):
+    """A name-sort cursor whose product the index cannot place without comparing text"""
+
+
+def category_pattern(category):
+    """The ILIKE pattern filter_products uses for a category slug"""
+    return f"%{category.replace('-', ' & ').title()}%"
+
+
+class FacetIndex:
+    """Bitset index over one snapshot of the catalog.
+
+    With ``name_collated``, ``products`` arrive in the database's ``ORDER BY
+    name, id`` order and that order is the name ranking. ``match_categories``
+    takes an ILIKE pattern and the category values and returns those the
+    database matches; without it a regex stands in for ILIKE.
+    """
+
+    def __init__(self, products, version=None, nulls_first=True, serialize=None, name_collated=False,
+                 match_categories=None):
+        self.version = version
+        self.nulls_first = nulls_first
+        self.name_collated = name_collated
+        self.match_categories = match_categories
+        # ``products`` are Product instances, or result rows with a matching ``serialize``
+        if serialize is None:
+            self.items = [product.to_dict() for product in products]
+        else:
+            self.items = [serialize(product) for product in products]
+        self.values = {
+            field: [getattr(product, field) for product in products]
+            for field in ('id', 'price', 'rating', 'created_at', 'name')
+        }
+        count = len(self.items)
+        self.all_bits = (1 << count) - 1
+
+        self.categories = {}
+        self.flags = {flag: {True: 0, False: 0} for flag in _FLAGS}
+        for position, product in enumerate(products):
+            bit = 1 << position
+            if product.category is not None:
+                self.categories[product.category] = self.categories.get(product.category, 0) | bit
+            for flag in _FLAGS:
+                value = getattr(product, flag)
+                if value is not None:
+                    self.flags[flag][bool(value)] |= bit
+
+        # Price is NOT NULL, so a plain sorted array serves range filters
+        self.price_order = sorted(range(count), key=lambda p: self.values['price'][p])
+        self.price_sorted = [self.values['price'][p] for p in self.price_order]
+
+        self.ranks = {}
+        for field, descending in set(SORTS.values()):
+            if field == 'name' and name_collated:
+                self.ranks[(field, descending)] = list(range(count))
+                continue
+            order = sorted(range(count), key=lambda p: self._sort_key(field, p), reverse=descending)
+            rank = [0] * count
+            for position_in_order, position in enumerate(order):
+                rank[position] = position_in_order
+            self.ranks[(field, descending)] = rank
+
+        self.positions = {product_id: position for position, product_id in enumerate(self.values['id'])}
+        self._category_cache = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def _null_key(self, value):
+        # SQLite sorts NULL below every value, PostgreSQL above
+        if value is None:
+            return (0, 0) if self.nulls_first else (1, 0)
+        return (1, value) if self.nulls_first else (0, value)
+
+    def _sort_key(self, field, position):
+        return (self._null_key(self.values[field][position]), self.values['id'][position])
+
+    def category_bits(self, category):
+        if not category or category == 'all':
+            return self.all_bits
+        if category == 'bestsellers':
+            return self.flags['is_bestseller'][True]
+        if category == 'new-in':
+            return self.flags['is_new'][True]
+
+        bits = self._category_cache.get(category)
+        if bits is None:
+            pattern = category_pattern(category)
+            if self.match_categories is not None:
+                matched = self.match_categories(pattern, list(self.categories))
+            else:
+                regex = like_regex(pattern)
+                matched = [value for value in self.categories if regex.fullmatch(value)]
+            bits = 0
+            for value in matched:
+                bits |= self.categories[value]
+            with self._lock:
+                if len(self._category_cache) < 1024:
+                    self._category_cache[category] = bits
+        return bits
+
+    def price_bits(self, min_price=None, max_price=None):
+        if min_price is None and max_price is None:
+            return self.all_bits
+        start = 0 if min_price is None else bisect_left(self.price_sorted, min_price)
+        end = len(self.price_sorted) if max_price is None else bisect_right(self.price_sorted, max_price)
+        if end <= start:
+            return 0
+
+        # Build whichever side of the range is smaller
+        if end - start <= len(self.price_sorted) // 2:
+            bits = 0
+            for position in self.price_order[start:end]:
+                bits |= 1 << position
+            return bits
+        outside = 0
+        for position in self.price_order[:start]:
+            outside |= 1 << position
+        for position in self.price_order[end:]:
+            outside |= 1 << position
+        return self.all_bits & ~outside
+
+    def stock_bits(self, in_stock=None):
+        if in_stock is None:
+            return self.all_bits
+        return self.flags['in_stock'][bool(in_stock)]
+
+    def query(self, category=None, min_price=None, max_price=None, in_stock=None,
+              sort_by='name', cursor=None, limit=None, facet_categories=None):
+        """Filter, sort and optionally page and facet the catalog.
+
+        Returns ``(positions, has_more, facets)``; positions index ``items``.
+        """
+        category_bits = self.category_bits(category)
+        price_bits = self.price_bits(min_price, max_price)
+        stock_bits = self.stock_bits(in_stock)
+        bits = category_bits & price_bits & stock_bits
+
+        if sort_by not in SORTS:
+            sort_by = 'name'
+        field, descending = SORTS[sort_by]
+        rank = self.ranks[(field, descending)]
+        positions = sorted(iter_bits(bits), key=rank.__getitem__)
+
+        if cursor:
+            sort_value, row_id = decode_cursor(cursor, sort_by)
+            if sort_value is not None and not isinstance(sort_value, _CURSOR_TYPES[field]):
+                raise InvalidCursor(cursor)
+
+        if cursor and field == 'name' and self.name_collated:
+            position = self.positions.get(row_id)
+            if position is None or self.values['name'][position] != sort_value:
+                raise CursorNotInIndex(row_id)
+            ranks = [rank[p] for p in positions]
+            positions = positions[bisect_right(ranks, rank[position]):]
+        elif cursor:
+            after = (self._null_key(sort_value), row_id)
+            keys = [self._sort_key(field, p) for p in positions]
+            if descending:
+                # keys run high to low; skip everything at or above the cursor
+                start = len(keys) - bisect_left(keys[::-1], after)
+            else:
+                start = bisect_right(keys, after)
+            positions = positions[start:]
+
+        has_more = False
+        if limit is not None:
+            has_more = len(positions) > limit
+            positions = positions[:limit]
+
+        facets = None
+        if facet_categories is not None:
+            facets = self.facets(category_bits, price_bits, stock_bits, facet_categories)
+        return positions, has_more, facets
+
+    def facets(self, category_bits, price_bits, stock_bits, facet_categories):
+        """Counts per facet value, each computed with every other active filter applied"""
+        without_category = price_bits & stock_bits
+        without_price = category_bits & stock_bits
+        without_stock = category_bits & price_bits
+        matched = category_bits & price_bits & stock_bits
+
+        price_bands = []
+        for low, high in PRICE_BANDS:
+            band = self.price_bits(low, high)
+            if high is not None:
+                # Bands are half-open so a price on a boundary is counted once
+                band &= ~self.price_bits(high, high)
+            price_bands.append({'min': low, 'max': high, 'count': (without_price & band).bit_count()})
+
+        return {
+            'total': matched.bit_count(),
+            'category': {
+                slug: (without_category & self.category_bits(slug)).bit_count()
+                for slug in facet_categories
+            },
+            'price': price_bands,
+            'in_stock': {
+                'true': (without_stock & self.flags['in_stock'][True]).bit_count(),
+                'false': (without_stock & self.flags['in_stock'][False]).bit_count(),
+            },
+            'is_bestseller': (matched & self.flags['is_bestseller'][True]).bit_count(),
+            'is_new': (matched & self.flags['is_new'][True]).bit_count(),
+        }
+
+    def sort_value(self, sort_by, position):
+        field, _ = SORTS.get(sort_by, SORTS['name'])
+        return self.values[field][position]
+
+
+class FacetEngine:
+    """Holds the current FacetIndex for this worker and rebuilds it on catalog changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+
+    def index(self, version, load_products, nulls_first=True, serialize=None, name_collated=False,
+              match_categories=None):
+        """Return an index for ``version``, rebuilding from ``load_products()`` if stale"""
+        index = self._index
+        if index is not None and index.version == version:
+            return index
+        with self._lock:
+            index = self._index
+            if index is None or index.version != version:
+                index = FacetIndex(load_products(), version, nulls_first, serialize, name_collated,
+                                   match_categories)
+                self._index = index
+        return index
+
+    def clear(self):
+        self._index = None
+
+
+facet_engine = FacetEngine()
@@ -1,7 +1,6 @@
-from flask_mail import Message
-from itsdangerous import URLSafeTimedSerializer
+from itsdangerous import URLSafeSerializer, URLSafeTimedSerializer
 from flask import current_app
-from app import mail
+from app.utils.outbox import queue_email
 
 def generate_stars(rating):
     """Generate star rating display"""
@@ -16,8 +15,14 @@ def generate_stars(rating):
     return stars
 
 def send_email(subject, recipients, html_body):
-    msg = Message(subject, recipients=recipients, html=html_body)
-    mail.send(msg)
+    """Queue an email in the outbox; the outbox workers deliver it"""
+    queue_email(subject, recipients, html=html_body)
+
+UNSUBSCRIBE_SALT = 'newsletter-unsubscribe-salt'
+
+def unsubscribe_serializer():
+    """Signs the subscriber email in campaign unsubscribe links; they do not expire"""
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=UNSUBSCRIBE_SALT)
 
 def generate_token(email, salt):
     serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
@@ -0,0 +1,176 @@
+"""
+HTTP validators and Cache-Control policies.
+
+``catalog_conditional`` (JSON catalog endpoints) and ``page_conditional``
+(HTML pages) compute a strong ETag and a Last-Modified date before the
+view runs, and answer a matching ``If-None-Match`` / ``If-Modified-Since``
+with a 304 without rendering or serializing anything.
+
+- Catalog ETags come from the catalog version and the request URL, and
+  their Last-Modified is the time of the last product change.
+- Page ETags also cover a digest of the template sources, the static
+  asset manifest and the signed-in user, since the navbar differs per user. Pages get no
+  Last-Modified, because a date cannot tell a signed-in view from a
+  signed-out one. A stale page the page cache serves while it re-renders
+  gets the ETag of the version it was rendered at.
+
+``apply_cache_policy`` runs after every request. It sets Cache-Control
+from ``HTTP_CACHE_POLICIES``, matched on the endpoint name first and then
+on ``<blueprint>.*``, and only for 200 and 304 responses; other statuses
+are ``private, no-store``. The cart, user, auth and form endpoints are
+always ``private, no-store``, and so is any request that modified the
+session, since its cookie is written after the hook runs. A response built
+from the session (the signed-in user, flashed messages) is only ever
+``private``.
+"""
+
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+
+# Never stored by browsers or shared caches, whatever HTTP_CACHE_POLICIES says
+PRIVATE_BLUEPRINTS = {'cart', 'user', 'auth', 'forms'}
+PRIVATE_ENDPOINTS = {'static.cart'}
+NO_STORE = 'private, no-store'
+# Statuses HTTP_CACHE_POLICIES applies to; errors and redirects are never stored
+POLICY_STATUSES = {200, 304}
+
+_template_digest = None
+
+
+def catalog_conditional(view):
+    """Conditional GET for responses determined by the catalog version and URL"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from app import catalog_cache
+
+        version = catalog_cache.version
+        if version is None:
+            return view(*args, **kwargs)
+        etag = _etag('catalog', version, request.full_path)
+        return _conditional(etag, catalog_cache.last_modified, view, args, kwargs)
+    return wrapper
+
+
+def page_conditional(catalog=False):
+    """Conditional GET for rendered pages; ``catalog`` pages also depend on the catalog version"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from app import catalog_cache, static_assets
+
+            # Asset names change with each `flask assets build`, so they are part of the page
+            parts = ['page', template_digest(), static_assets.digest, request.full_path, _viewer()]
+            if catalog:
+                version = catalog_cache.version
+                if version is None:
+                    return view(*args, **kwargs)
+                parts.append(version)
+            # Flashed messages are rendered once, so the page cannot be revalidated
+            if '_flashes' in session:
+                return view(*args, **kwargs)
+
+            def served_etag(etag):
+                # A stale page served while the page cache re-renders it carries its own version
+                served = g.pop('page_cache_version', version)
+                return etag if served == version else _etag(*parts[:-1], served)
+
+            return _conditional(_etag(*parts), None, view, args, kwargs, served_etag if catalog else None)
+        return wrapper
+    return decorator
+
+
+def template_digest():
+    """Digest of every template source, computed once per process (every request in debug)"""
+    global _template_digest
+    if _template_digest is None or current_app.debug:
+        sha = hashlib.sha1()
+        env = current_app.jinja_env
+        for name in sorted(env.loader.list_templates()):
+            source, _, _ = env.loader.get_source(env, name)
+            sha.update(name.encode('utf-8'))
+            sha.update(source.encode('utf-8'))
+        _template_digest = sha.hexdigest()[:16]
+    return _template_digest
+
+
+def apply_cache_policy(response):
+    """after_request hook: attach the Cache-Control policy for the endpoint"""
+    blueprint, endpoint = request.blueprint, request.endpoint
+    if blueprint in PRIVATE_BLUEPRINTS or endpoint in PRIVATE_ENDPOINTS:
+        response.headers['Cache-Control'] = NO_STORE
+        return response
+
+    # A 304 has no body, so its mimetype is only the default; a page's ETag already read the session
+    html = response.mimetype == 'text/html' and response.status_code != 304
+    # Checked first: loading the user reads the session, and a remember-cookie login writes it
+    signed_in = html and current_user.is_authenticated
+    if html:
+        response.vary.add('Cookie')
+
+    # The session cookie is only added after the after_request hooks, so Set-Cookie is not there yet
+    if session.modified:
+        response.headers['Cache-Control'] = NO_STORE
+        return response
+
+    if 'Cache-Control' not in response.headers:
+        if response.status_code not in POLICY_STATUSES:
+            response.headers['Cache-Control'] = NO_STORE
+            return response
+        policies = current_app.config.get('HTTP_CACHE_POLICIES', {})
+        policy = policies.get(endpoint) or policies.get(f'{blueprint}.*')
+        if policy:
+            response.headers['Cache-Control'] = policy
+
+    if (signed_in or session.accessed) and 'public' in response.headers.get('Cache-Control', ''):
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def init_app(app):
+    app.after_request(apply_cache_policy)
+
+
+def _conditional(etag, last_modified, view, args, kwargs, served_etag=None):
+    if last_modified is not None:
+        last_modified = _as_utc(last_modified).replace(microsecond=0)
+
+    if _not_modified(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return response
+        if served_etag is not None:
+            etag = served_etag(etag)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def _not_modified(etag, last_modified):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def _etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:24]
+
+
+def _viewer():
+    return f'user-{current_user.id}' if current_user.is_authenticated else 'anonymous'
+
+
+def _as_utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
@@ -0,0 +1,432 @@
+"""
+Request and SQL instrumentation with a Prometheus ``/metrics`` endpoint.
+
+``/metrics`` only exists when ``METRICS_TOKEN`` is set, and answers only
+requests with ``Authorization: Bearer <METRICS_TOKEN>`` (Prometheus'
+``authorization`` scrape setting): endpoint names, traffic and query
+volumes are not for the public.
+
+Flask's ``request_started`` / ``request_finished`` signals time every
+request. SQLAlchemy ``before_cursor_execute`` / ``after_cursor_execute``
+events count and time every statement. Connection-pool checkouts are
+timed by wrapping ``Engine.raw_connection``, the one place every
+checkout goes through, so a pool that is too small shows up as checkout
+wait. Everything is labelled by Flask endpoint (``unmatched`` for 404s,
+``none`` outside requests), which keeps label cardinality fixed.
+
+Each response gets a ``Server-Timing`` header::
+
+    Server-Timing: app;dur=41.2, db;dur=6.8;desc="5 queries", pool;dur=0.1
+
+Statements slower than ``SLOW_QUERY_MS`` are logged to ``app.sql.slow``,
+normalized (literals and parameters become ``?``, ``IN`` lists collapse)
+so that the same query groups together and no values leak into logs.
+
+Under gunicorn every worker keeps its own numbers. With ``METRICS_DIR``
+set to a directory shared by the workers, each worker writes a snapshot
+there every ``METRICS_FLUSH_INTERVAL`` seconds while it has new numbers,
+and ``/metrics`` sums the snapshots of all workers, whichever one answers
+the scrape.
+Counters of workers that have exited are folded into an archive file so
+totals never go backwards; gauges only count live workers. Empty the
+directory when the server (not a worker) starts.
+"""
+
+import atexit
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import g, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; dead workers' files are then left as they are
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CHECKOUT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+ARCHIVE = 'archive.json'
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'db_statements_total': ('counter', 'SQL statements executed, by endpoint'),
+    'db_statement_seconds_total': ('counter', 'Time spent in SQL statements, by endpoint'),
+    'db_slow_statements_total': ('counter', 'Statements slower than SLOW_QUERY_MS, by endpoint'),
+    'db_pool_checkout_seconds': ('histogram', 'Time to get a connection from the pool, by endpoint'),
+    'db_pool_checked_out': ('gauge', 'Connections currently checked out of the pool'),
+    'db_replica_fallbacks_total': ('counter', 'Catalog requests sent to the primary because the replica was '
+                                              'lagging or unavailable'),
+}
+
+slow_log = logging.getLogger('app.sql.slow')
+
+# Hooks are process-wide, so they are registered once here rather than per create_app()
+_registries = weakref.WeakSet()
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])')
+_PARAMETER = re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+')
+_IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+
+
+def normalize_statement(statement, limit=1000):
+    """SQL with literals and parameters replaced by ``?``, for grouping and logging"""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _STRING.sub('?', statement)
+    statement = _PARAMETER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('IN (...)', statement)
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+def _endpoint():
+    if not has_request_context():
+        return 'none'
+    return request.endpoint or 'unmatched'
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """Process-wide metric registry; see the module docstring"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._reset()
+        self._engines = []
+        self._directory = None
+        self._flush_interval = 1.0
+        self._flusher = None
+        self._dirty = False
+        self.slow_query_seconds = 0.2
+        self.server_timing = True
+        self.token = None
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        self._counters = {}
+        self._histograms = {}
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', True)
+        self._flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+        self._directory = app.config.get('METRICS_DIR')
+        self.token = app.config.get('METRICS_TOKEN')
+        if self._directory:
+            os.makedirs(self._directory, exist_ok=True)
+        _registries.add(self)
+
+        from app import db
+        with app.app_context():
+            for engine in db.engines.values():
+                self.instrument_engine(engine)
+
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        if self.token:
+            app.add_url_rule('/metrics', 'metrics', self.view)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self._flusher = None
+        self._dirty = False
+
+    # Recording
+
+    def inc(self, name, labels, amount=1.0):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0.0) + amount
+            self._dirty = True
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = [[0] * (len(buckets) + 1), 0.0, buckets]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            self._dirty = True
+
+    def instrument_engine(self, engine):
+        if engine in self._engines:
+            return
+        self._engines.append(engine)
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._execute_failed)
+        raw_connection = engine.raw_connection
+
+        def timed_raw_connection():
+            start = time.perf_counter()
+            try:
+                return raw_connection()
+            finally:
+                self._checked_out(time.perf_counter() - start)
+
+        # Connection() calls engine.raw_connection() for every checkout; this survives engine.dispose()
+        engine.raw_connection = timed_raw_connection
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        endpoint = _endpoint()
+        labels = _labels(endpoint=endpoint)
+        self.inc('db_statements_total', labels)
+        self.inc('db_statement_seconds_total', labels, elapsed)
+        if has_request_context():
+            g.metrics_sql_count = g.get('metrics_sql_count', 0) + 1
+            g.metrics_sql_time = g.get('metrics_sql_time', 0.0) + elapsed
+        if elapsed >= self.slow_query_seconds:
+            self.inc('db_slow_statements_total', labels)
+            slow_log.warning(f'{elapsed * 1000:.1f}ms [{endpoint}] {normalize_statement(statement)}')
+
+    def _execute_failed(self, context):
+        started = context.connection.info.get('metrics_started') if context.connection is not None else None
+        if started:
+            started.pop()
+
+    def _checked_out(self, elapsed):
+        self.observe('db_pool_checkout_seconds', _labels(endpoint=_endpoint()), elapsed, CHECKOUT_BUCKETS)
+        if has_request_context():
+            g.metrics_pool_time = g.get('metrics_pool_time', 0.0) + elapsed
+
+    def _request_started(self, sender, **extra):
+        g.metrics_started = time.perf_counter()
+
+    def _request_finished(self, sender, response, **extra):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = _endpoint()
+        self.inc('http_requests_total',
+                 _labels(endpoint=endpoint, method=request.method, status=str(response.status_code)))
+        self.observe('http_request_duration_seconds', _labels(endpoint=endpoint), elapsed, LATENCY_BUCKETS)
+
+        if self.server_timing:
+            sql_count = g.get('metrics_sql_count', 0)
+            timing = [f'app;dur={elapsed * 1000:.1f}',
+                      f'db;dur={g.get("metrics_sql_time", 0.0) * 1000:.1f};desc="{sql_count} queries"']
+            if 'metrics_pool_time' in g:
+                timing.append(f'pool;dur={g.metrics_pool_time * 1000:.1f}')
+            response.headers.add('Server-Timing', ', '.join(timing))
+
+        if self._directory and self._flusher is None:
+            self._start_flusher()
+
+    # Snapshots shared between worker processes
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(buckets), list(counts), total]
+                          for (name, labels), (counts, total, buckets) in self._histograms.items()]
+        gauges = []
+        for engine in self._engines:
+            checkedout = getattr(engine.pool, 'checkedout', None)
+            if checkedout is not None:
+                gauges.append(['db_pool_checked_out', [('database', engine.url.database or '')], checkedout()])
+        return {'pid': os.getpid(), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def _start_flusher(self):
+        # Started by the first request of each worker process, so it never runs in a pre-fork master
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._flush_interval)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError:
+                    logging.getLogger('app.metrics').exception('Writing the metrics snapshot failed')
+
+    def flush(self):
+        """Write this process's snapshot to ``METRICS_DIR`` (atomically)"""
+        if not self._directory:
+            return
+        self._dirty = False
+        path = os.path.join(self._directory, f'worker-{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Snapshots of every worker: this process's live one, the others' last flushed ones"""
+        if not self._directory:
+            return [self.snapshot()]
+        self.flush()
+        self._archive_dead_workers()
+        snapshots = []
+        for name in os.listdir(self._directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self._directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # removed or replaced while listing
+        return snapshots
+
+    def _archive_dead_workers(self):
+        """Fold exited workers' counters and histograms into the archive file, once"""
+        if fcntl is None:
+            return
+        with open(os.path.join(self._directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for name in os.listdir(self._directory):
+                if name.startswith('worker-') and name.endswith('.json'):
+                    pid = int(name[len('worker-'):-len('.json')])
+                    if not _alive(pid):
+                        dead.append(os.path.join(self._directory, name))
+            if not dead:
+                return
+            archive_path = os.path.join(self._directory, ARCHIVE)
+            snapshots = [_load(path) for path in [archive_path] + dead if os.path.exists(path)]
+            archive = _merge([snapshot for snapshot in snapshots if snapshot])
+            with open(f'{archive_path}.tmp', 'w') as f:
+                json.dump(_as_snapshot(archive), f)
+            os.replace(f'{archive_path}.tmp', archive_path)
+            for path in dead:
+                os.remove(path)
+
+    def render(self):
+        """All workers' metrics in the Prometheus text exposition format"""
+        merged = _merge(self.collect())
+        lines = []
+        for name, (kind, description) in HELP.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for labels, (buckets, counts, total) in sorted(merged['histograms'].get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+            else:
+                source = merged['gauges'] if kind == 'gauge' else merged['counters']
+                for labels, value in sorted(source.get(name, {}).items()):
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        from flask import current_app
+
+        expected = f'Bearer {self.token}'.encode('utf-8')
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'), expected):
+            response = current_app.response_class('Unauthorized\n', status=401, mimetype='text/plain')
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response
+        response = current_app.response_class(self.render(), mimetype='text/plain')
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+
+def _after_fork_in_child():
+    # A forked worker starts from zero, not from whatever the parent recorded
+    for registry in list(_registries):
+        registry._after_fork()
+
+
+def _flush_at_exit():
+    for registry in list(_registries):
+        registry.flush()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(_flush_at_exit)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(snapshots):
+    """Sum snapshots into ``{'counters'|'gauges': {name: {labels: value}}, 'histograms': {...}}``"""
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            series = counters.setdefault(name, {})
+            key = tuple(tuple(pair) for pair in labels)
+            series[key] = series.get(key, 0.0) + value
+        for name, labels, value in snapshot.get('gauges', []):
+            # Only live processes hold connections; an exited worker's last gauge reading is meaningless
+            if snapshot.get('pid') is not None and (snapshot['pid'] == os.getpid() or _alive(snapshot['pid'])):
+                series = gauges.setdefault(name, {})
+                key = tuple(tuple(pair) for pair in labels)
+                series[key] = series.get(key, 0) + value
+        for name, labels, buckets, counts, total in snapshot['histograms']:
+            series = histograms.setdefault(name, {})
+            key = tuple(tuple(pair) for pair in labels)
+            if key in series:
+                _, existing, existing_total = series[key]
+                series[key] = (buckets, [a + b for a, b in zip(existing, counts)], existing_total + total)
+            else:
+                series[key] = (buckets, list(counts), total)
+    return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+
+def _as_snapshot(merged):
+    """Turn a ``_merge`` result back into the snapshot file format"""
+    return {
+        'pid': None,
+        'counters': [[name, [list(pair) for pair in labels], value]
+                     for name, series in merged['counters'].items() for labels, value in series.items()],
+        'histograms': [[name, [list(pair) for pair in labels], list(buckets), counts, total]
+                       for name, series in merged['histograms'].items()
+                       for labels, (buckets, counts, total) in series.items()],
+        'gauges': [],
+    }
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return '{' + escaped + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
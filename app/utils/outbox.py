@@ -0,0 +1,271 @@
+"""
+Persistent email outbox.
+
+Request handlers only insert an ``OutboxMessage`` row; delivery happens in
+``OutboxWorker`` threads, started with ``flask outbox run`` or, when
+``OUTBOX_WORKERS`` is set, in every serving process on its first request.
+Each worker claims a batch of due messages with a lease, sends them over
+one SMTP connection that it keeps open between batches, and records the
+outcome in a set-based UPDATE. Failed messages are retried with
+exponential backoff. After ``OUTBOX_MAX_ATTEMPTS`` they move to the
+``dead`` state.
+"""
+
+import os
+import random
+import signal
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask_mail import Message
+from sqlalchemy import func, or_, select, update
+
+from app import db, mail
+from app.models import OutboxMessage
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+DEAD = 'dead'
+
+
+def queue_email(subject, recipients, html=None, body=None, sender=None, commit=True):
+    """Add a message to the outbox; delivery happens in the background"""
+    message = OutboxMessage(
+        subject=subject,
+        recipients=','.join(recipients),
+        sender=sender,
+        html=html,
+        body=body,
+        status=PENDING,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(message)
+    if commit:
+        db.session.commit()
+    return message
+
+
+def claim_batch(limit, lease_seconds):
+    """Lease up to ``limit`` due messages to the caller.
+
+    The UPDATE re-checks each row's state, so concurrent workers (or
+    processes) never claim the same message; a worker that dies leaves its
+    lease to expire and the messages become claimable again.
+    """
+    now = datetime.utcnow()
+    token = str(uuid.uuid4())
+    table = OutboxMessage.__table__
+    due = or_(
+        (table.c.status == PENDING) & (table.c.next_attempt_at <= now),
+        (table.c.status == SENDING) & (table.c.locked_until < now),
+    )
+    candidates = select(table.c.id).where(due).order_by(table.c.id).limit(limit)
+    if db.engine.dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    db.session.execute(
+        update(table)
+        .where(table.c.id.in_(candidates.scalar_subquery()), due)
+        .values(status=SENDING, claim_token=token,
+                locked_until=now + timedelta(seconds=lease_seconds))
+    )
+    db.session.commit()
+    return OutboxMessage.query.filter_by(claim_token=token).order_by(OutboxMessage.id).all()
+
+
+def backoff_delay(attempts, base, cap):
+    """Seconds to wait before retry number ``attempts``, with jitter"""
+    return min(base * 2 ** (attempts - 1), cap) * random.uniform(0.8, 1.2)
+
+
+class OutboxWorker(threading.Thread):
+    """Drains the outbox over one persistent SMTP connection"""
+
+    def __init__(self, app, stop_event, name=None):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.stop_event = stop_event
+        self.connection = None
+        self.idle_since = None
+        self.sent = 0
+        self.failed = 0
+
+    def run(self):
+        with self.app.app_context():
+            config = current_app.config
+            while not self.stop_event.is_set():
+                try:
+                    batch = claim_batch(config['OUTBOX_BATCH_SIZE'], config['OUTBOX_LEASE_SECONDS'])
+                except Exception:
+                    current_app.logger.exception('Outbox claim failed')
+                    db.session.rollback()
+                    batch = []
+                finally:
+                    db.session.remove()
+
+                if batch:
+                    self.idle_since = None
+                    self.deliver(batch)
+                    continue
+
+                if self.idle_since is None:
+                    self.idle_since = time.monotonic()
+                elif time.monotonic() - self.idle_since > config['OUTBOX_IDLE_DISCONNECT']:
+                    self.disconnect()
+                self.stop_event.wait(config['OUTBOX_POLL_INTERVAL'])
+            self.disconnect()
+
+    def deliver(self, batch):
+        config = current_app.config
+        default_sender = config.get('MAIL_DEFAULT_SENDER') or config.get('MAIL_USERNAME')
+        sent_ids = []
+        for message in batch:
+            try:
+                self.send(Message(
+                    subject=message.subject,
+                    recipients=message.recipients.split(','),
+                    html=message.html,
+                    body=message.body,
+                    sender=message.sender or default_sender,
+                ))
+                sent_ids.append(message.id)
+            except Exception as e:
+                self.disconnect()
+                self.record_failure(message, e)
+
+        if sent_ids:
+            table = OutboxMessage.__table__
+            db.session.execute(
+                update(table)
+                .where(table.c.id.in_(sent_ids))
+                .values(status=SENT, sent_at=datetime.utcnow(), claim_token=None,
+                        locked_until=None, last_error=None, attempts=table.c.attempts + 1)
+            )
+            self.sent += len(sent_ids)
+        db.session.commit()
+        db.session.remove()
+
+    def send(self, message):
+        if self.connection is None:
+            connection = mail.connect()
+            connection.__enter__()
+            self.connection = connection
+        self.connection.send(message)
+
+    def disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.__exit__(None, None, None)
+            except Exception:
+                pass
+            self.connection = None
+
+    def record_failure(self, message, error):
+        config = current_app.config
+        self.failed += 1
+        attempts = message.attempts + 1
+        values = {'attempts': attempts, 'last_error': str(error)[:2000],
+                  'claim_token': None, 'locked_until': None}
+        if attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+            values['status'] = DEAD
+            current_app.logger.error(f'Outbox message {message.id} is dead after {attempts} attempts: {error}')
+        else:
+            delay = backoff_delay(attempts, config['OUTBOX_BACKOFF_BASE'], config['OUTBOX_BACKOFF_MAX'])
+            values['status'] = PENDING
+            values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+        table = OutboxMessage.__table__
+        db.session.execute(update(table).where(table.c.id == message.id).values(**values))
+
+
+class OutboxPool:
+    """A group of OutboxWorker threads sharing one stop signal"""
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.pid = os.getpid()
+        self.stop_event = threading.Event()
+        self.workers = [OutboxWorker(app, self.stop_event, name=f'outbox-{i}') for i in range(workers)]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join(timeout)
+
+    @property
+    def sent(self):
+        return sum(worker.sent for worker in self.workers)
+
+    @property
+    def failed(self):
+        return sum(worker.failed for worker in self.workers)
+
+
+def init_app(app):
+    workers = app.config.get('OUTBOX_WORKERS', 0)
+    if not workers:
+        return
+    lock = threading.Lock()
+
+    # Started by the first request of each process: threads do not survive a fork, so a
+    # preloaded app must not start them in the gunicorn master
+    @app.before_request
+    def start_outbox_pool():
+        pool = app.extensions.get('outbox_pool')
+        if pool is not None and pool.pid == os.getpid():
+            return
+        with lock:
+            pool = app.extensions.get('outbox_pool')
+            if pool is None or pool.pid != os.getpid():
+                app.extensions['outbox_pool'] = OutboxPool(app, workers).start()
+
+
+outbox_cli = AppGroup('outbox', help='Email outbox delivery')
+
+
+@outbox_cli.command('run')
+@click.option('--workers', default=4, show_default=True, help='Delivery threads')
+def run_workers(workers):
+    """Deliver queued email until interrupted"""
+    stopping = threading.Event()
+    # Process managers (Heroku, systemd) stop a worker with SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    pool = OutboxPool(current_app._get_current_object(), workers).start()
+    click.echo(f'📬 Outbox running with {workers} workers (Ctrl+C to stop)')
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    pool.stop()
+    click.echo(f'Stopped: {pool.sent} sent, {pool.failed} failed attempts')
+
+
+@outbox_cli.command('status')
+def status():
+    """Show message counts per state"""
+    rows = db.session.query(OutboxMessage.status, func.count()).group_by(OutboxMessage.status).all()
+    for state, count in sorted(rows):
+        click.echo(f'{state:<10} {count}')
+
+
+@outbox_cli.command('retry-dead')
+def retry_dead():
+    """Move dead messages back to pending"""
+    table = OutboxMessage.__table__
+    result = db.session.execute(
+        update(table).where(table.c.status == DEAD)
+        .values(status=PENDING, attempts=0, next_attempt_at=datetime.utcnow())
+    )
+    db.session.commit()
+    click.echo(f'Requeued {result.rowcount} messages')
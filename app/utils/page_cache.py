@@ -0,0 +1,187 @@
+"""
+Rendered-HTML cache for catalog pages.
+
+Product and category pages are rendered once per catalog version and
+shared by every visitor. Anything personal is punched out of the cached
+body: the navbar's account menu, flash messages, the wishlist button.
+Templates call ``personal('_fragment.html', **context)``. While a page is
+being rendered for the cache, that leaves a marker comment, and
+``fill_holes`` renders the small fragment for the current visitor on
+every request.
+
+When a product changes, the catalog version moves on and cached pages go
+stale. A stale page is still served while one background thread
+re-renders it (stale-while-revalidate). Once the catalog has been changed
+for longer than ``PAGE_CACHE_MAX_STALE`` seconds, stale pages are
+re-rendered in the request instead. A stale page leaves its version in
+``g.page_cache_version`` so its ETag is the stale version's, not the
+current one's.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode
+
+from flask import current_app, g, render_template, request
+from markupsafe import Markup
+
+HOLE_PATTERN = re.compile(r'<!--hole:([\w.-]+)(?:\?([^>]*?))?-->')
+
+
+def personal(template, **context):
+    """Render a per-visitor fragment, or leave a hole for it when rendering for the page cache"""
+    if g.get('page_cache_render'):
+        query = urlencode(context)
+        return Markup(f'<!--hole:{template}{"?" + query if query else ""}-->')
+    return Markup(render_template(template, **context))
+
+
+def fill_holes(body):
+    """Render the punched-out fragments of a cached page for the current visitor"""
+    rendered = {}
+
+    def fill(match):
+        if match.group(0) not in rendered:
+            context = dict(parse_qsl(match.group(2) or ''))
+            rendered[match.group(0)] = render_template(match.group(1), **context)
+        return rendered[match.group(0)]
+
+    return HOLE_PATTERN.sub(fill, body)
+
+
+class PageCache:
+    """Bounded cache of rendered pages keyed by name and catalog version"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+        self._executor = None
+        self._pid = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.enabled = True
+        self.max_entries = 2000
+        self.max_bytes = 64 * 1024 * 1024
+        self.max_stale = 300.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        self.max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', self.max_bytes)
+        self.max_stale = app.config.get('PAGE_CACHE_MAX_STALE', self.max_stale)
+        app.extensions['page_cache'] = self
+        app.jinja_env.globals.update(personal=personal)
+
+    def page(self, key, render):
+        """Return the page for ``key`` with its holes filled, or None if ``render`` returned None.
+
+        ``render`` renders the page without request-specific state and
+        returns the HTML, or None when the page does not exist.
+        """
+        from app import catalog_cache
+
+        version = catalog_cache.version if self.enabled else None
+        if version is None:
+            body = _render(render)
+            return fill_holes(body) if body is not None else None
+
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None:
+                self._pages.move_to_end(key)
+
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return fill_holes(entry[1])
+
+        if entry is not None and self._may_serve_stale(catalog_cache.last_modified):
+            self.stale_hits += 1
+            self._refresh_later(key, render, version)
+            # The ETag must name the version this body was rendered at (http_cache.page_conditional)
+            g.page_cache_version = entry[0]
+            return fill_holes(entry[1])
+
+        self.misses += 1
+        body = _render(render)
+        self._store(key, version, body)
+        return fill_holes(body) if body is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'entries': len(self._pages),
+                'bytes': self._bytes,
+                'refreshing': len(self._refreshing),
+            }
+
+    def _may_serve_stale(self, changed_at):
+        if changed_at is None:
+            return False
+        return (datetime.utcnow() - changed_at.replace(tzinfo=None)).total_seconds() < self.max_stale
+
+    def _refresh_later(self, key, render, version):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        app = current_app._get_current_object()
+        path = request.path
+        self._pool().submit(self._refresh, app, key, render, version, path)
+
+    def _refresh(self, app, key, render, version, path):
+        try:
+            with app.test_request_context(path):
+                self._store(key, version, _render(render))
+        except Exception:
+            app.logger.exception(f'Page cache refresh failed for {key}')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, version, body):
+        with self._lock:
+            previous = self._pages.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            if body is None or len(body) > self.max_bytes:
+                return
+            self._pages[key] = (version, body)
+            self._bytes += len(body)
+            while self._pages and (len(self._pages) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._pages.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def _pool(self):
+        # One refresh thread per process: threads do not survive a fork
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-cache')
+                    self._pid = os.getpid()
+        return self._executor
+
+
+def _render(render):
+    previous = g.get('page_cache_render')
+    g.page_cache_render = True
+    try:
+        return render()
+    finally:
+        g.page_cache_render = previous
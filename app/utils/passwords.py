@@ -0,0 +1,94 @@
+"""
+Password hashing policy.
+
+Hashing and verification use Werkzeug's formats with the method set in
+``PASSWORD_HASH_METHOD`` (e.g. ``scrypt:32768:8:1`` or
+``pbkdf2:sha256:600000``). They run on a small, bounded thread pool
+(``PASSWORD_HASH_WORKERS`` threads, at most ``PASSWORD_HASH_QUEUE``
+callers waiting). hashlib releases the GIL while hashing, so a login burst
+uses at most that many cores, and the rest of the request pool stays
+free for catalog traffic. When the queue is full, ``HashingBusy`` is
+raised immediately instead of tying up another request thread.
+
+``needs_rehash`` reports stored hashes made with older parameters. Sign-in
+upgrades them while it has the plain password.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(RuntimeError):
+    """Raised when too many password hashes are already queued"""
+
+
+class PasswordHasher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._canonical = {}
+
+    def hash(self, password):
+        config = current_app.config
+        return self._run(generate_password_hash, password,
+                         method=config['PASSWORD_HASH_METHOD'], salt_length=config['PASSWORD_SALT_LENGTH'])
+
+    def verify(self, stored_hash, password):
+        if not stored_hash or password is None:
+            return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if ``stored_hash`` was made with a method other than the current policy"""
+        return stored_hash.split('$', 1)[0] != self._canonical_method(current_app.config['PASSWORD_HASH_METHOD'])
+
+    def _canonical_method(self, method):
+        # Werkzeug stores methods with their defaults filled in ('scrypt' -> 'scrypt:32768:8:1')
+        if method not in self._canonical:
+            self._canonical[method] = generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+        return self._canonical[method]
+
+    def _run(self, func, *args, **kwargs):
+        executor, slots = self._pool()
+        if executor is None:
+            return func(*args, **kwargs)
+        if not slots.acquire(blocking=False):
+            raise HashingBusy('Too many sign-ins in progress')
+        try:
+            return executor.submit(func, *args, **kwargs).result()
+        finally:
+            slots.release()
+
+    def _pool(self):
+        workers = current_app.config['PASSWORD_HASH_WORKERS']
+        if workers <= 0:
+            return None, None
+        # One pool per process: threads do not survive a fork
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+                    self._slots = threading.BoundedSemaphore(workers + current_app.config['PASSWORD_HASH_QUEUE'])
+                    self._pid = os.getpid()
+        return self._executor, self._slots
+
+
+password_hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+
+def verify_password(stored_hash, password):
+    return password_hasher.verify(stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    return password_hasher.needs_rehash(stored_hash)
@@ -0,0 +1,56 @@
+"""
+Fork safety for servers that load the app once and fork workers from it
+(``gunicorn --preload``; see ``gunicorn.conf.py``).
+
+A forked worker inherits the master's memory, including any pooled
+database connections. Sharing a connection's socket between processes
+corrupts both, so every engine is disposed in the child right after the
+fork, with ``close=False``: the child drops its copies without sending a
+goodbye on a socket the parent may still own, and opens its own
+connections on first use. Background threads (metrics flusher, outbox
+workers, hashing and page-cache pools) do not survive a fork; each starts
+on first use in the process that needs it.
+
+``before_fork`` is the master's side: it loads every template, closes
+whatever connections the preload opened and moves everything loaded so
+far into the garbage collector's permanent generation (``gc.freeze()``).
+Collections in the workers then never touch those objects, so their
+memory pages are not written to and stay shared copy-on-write between
+all the workers.
+"""
+
+import gc
+import os
+import weakref
+
+_apps = weakref.WeakSet()
+
+
+def init_app(app):
+    _apps.add(app)
+
+
+def before_fork(app):
+    """Call in the master once the app is loaded, before workers fork"""
+    from app import template_cache
+
+    template_cache.warm(app)
+    dispose_engines(app, close=True)
+    gc.freeze()
+
+
+def dispose_engines(app, close=True):
+    from app import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
+def _after_fork_in_child():
+    for app in list(_apps):
+        dispose_engines(app, close=False)
+
+
+# Registered once per process, not per create_app()
+os.register_at_fork(after_in_child=_after_fork_in_child)
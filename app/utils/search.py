@@ -0,0 +1,170 @@
+"""
+Ranked full-text product search.
+
+PostgreSQL uses a weighted ``tsvector`` expression with a GIN index over it;
+SQLite uses an external-content FTS5 table kept in sync with ``products``
+by triggers. Field weights put ``name`` above ``tags`` above
+``short_description`` above ``description``. When neither index exists,
+search falls back to the original ILIKE scan.
+"""
+
+import re
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.utils.pagination import decode_cursor, encode_cursor
+
+PG_INDEX_NAME = 'ix_products_search'
+FTS_TABLE = 'products_fts'
+
+# bm25() column weights, in FTS5 column order
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+PG_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(short_description, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_RECHECK_SECONDS = 60
+
+_available = None
+_checked_at = 0.0
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query.lower())
+
+
+def ensure_search_index(engine):
+    """Create the full-text index for the engine's dialect (idempotent)"""
+    global _available
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == 'postgresql':
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} ON products USING GIN (({PG_VECTOR}))"
+            ))
+        elif dialect == 'sqlite':
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name, tags, short_description, description, "
+                "content='products', content_rowid='id', tokenize='porter unicode61')"
+            ))
+            columns = 'name, tags, short_description, description'
+            new_values = 'new.name, new.tags, new.short_description, new.description'
+            old_values = 'old.name, old.tags, old.short_description, old.description'
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+                f"VALUES ('delete', old.id, {old_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON products BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+                f"VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            ))
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        else:
+            return False
+    _available = True
+    return True
+
+
+def search_available(engine):
+    """Whether the full-text index exists, re-checked periodically while it does not"""
+    global _available, _checked_at
+    if _available or (_available is False and time.monotonic() - _checked_at < _RECHECK_SECONDS):
+        return _available
+
+    dialect = engine.dialect.name
+    try:
+        with engine.connect() as conn:
+            if dialect == 'postgresql':
+                found = conn.execute(
+                    text("SELECT 1 FROM pg_indexes WHERE indexname = :name"),
+                    {'name': PG_INDEX_NAME}
+                ).first()
+            elif dialect == 'sqlite':
+                found = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first()
+            else:
+                found = None
+    except SQLAlchemyError:
+        found = None
+
+    _available = found is not None
+    _checked_at = time.monotonic()
+    return _available
+
+
+def _pg_query(tokens):
+    # Every term must match; the last one is treated as a prefix for typing-as-you-go
+    terms = [f"{token}:*" if i == len(tokens) - 1 else token for i, token in enumerate(tokens)]
+    return ' & '.join(terms)
+
+
+def _fts_query(tokens):
+    terms = [f'"{token}"*' if i == len(tokens) - 1 else f'"{token}"' for i, token in enumerate(tokens)]
+    return ' '.join(terms)
+
+
+def ranked_ids(session, query, limit, cursor=None):
+    """Return ``(ids, next_cursor)`` for a query, best match first.
+
+    Paging is keyset-based on ``(rank, id)`` so later pages cost the same as
+    the first. Returns None when no full-text index is available.
+    """
+    engine = session.get_bind()
+    tokens = tokenize(query)
+    if not tokens:
+        return [], None
+    if not search_available(engine):
+        return None
+
+    params = {'limit': limit + 1}
+    after = ''
+    if cursor:
+        params['rank'], params['id'] = decode_cursor(cursor, 'relevance')
+
+    if engine.dialect.name == 'postgresql':
+        # ts_rank: higher is better
+        if cursor:
+            after = "WHERE rank < CAST(:rank AS real) OR (rank = CAST(:rank AS real) AND id > :id)"
+        sql = (
+            "SELECT id, rank FROM ("
+            f"SELECT id, ts_rank({PG_VECTOR}, to_tsquery('english', :q)) AS rank "
+            f"FROM products WHERE ({PG_VECTOR}) @@ to_tsquery('english', :q)"
+            f") AS matches {after} ORDER BY rank DESC, id ASC LIMIT :limit"
+        )
+        params['q'] = _pg_query(tokens)
+    else:
+        # bm25: lower is better
+        if cursor:
+            after = "WHERE rank > :rank OR (rank = :rank AND id > :id)"
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        sql = (
+            "SELECT id, rank FROM ("
+            f"SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q"
+            f") AS matches {after} ORDER BY rank ASC, id ASC LIMIT :limit"
+        )
+        params['q'] = _fts_query(tokens)
+
+    rows = session.execute(text(sql), params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].id, 'relevance')
+    return [row.id for row in rows], next_cursor
@@ -0,0 +1,140 @@
+"""
+Row serializers that skip ORM object hydration.
+
+Read-only list endpoints do not need ``Product``/``CartItem`` instances:
+they select the columns they serialize and turn each result row into the
+same dict the model's ``to_dict()`` returns. ``RowSerializer`` compiles
+that conversion once per model from its column list into a single dict
+literal over row positions, so serializing a row is one function call
+with no attribute lookups, no identity map and no lazy loads.
+
+``CART_ITEM`` and ``WISHLIST`` nest the product the way ``to_dict()``
+does, from an outer join selected in the same statement.
+
+When orjson is installed (and ``JSON_ORJSON_ENABLED`` is on),
+``OrjsonProvider`` replaces the app's JSON provider, so ``jsonify`` and
+the catalog cache encode with orjson. Output is the same JSON: keys stay
+sorted, and ``datetime`` values still go through Flask's default
+handler.
+"""
+
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Date, DateTime
+
+from app import db
+from app.models import CartItem, Lead, Newsletter, Product, Wishlist
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+MAX_COMPILED_SUBSETS = 256
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+class RowSerializer:
+    """``to_dict()`` for result rows, compiled from a model's columns.
+
+    ``fields`` lists the columns to serialize (all of them by default),
+    and ``nested`` maps a key to ``(relationship, RowSerializer)`` for
+    related rows selected through an outer join.
+    """
+
+    def __init__(self, model, fields=None, nested=None):
+        self.model = model
+        self.fields = list(fields or [column.name for column in model.__table__.columns])
+        self.nested = dict(nested or {})
+        self.columns = [getattr(model, name) for name in self.fields]
+        for _, serializer in self.nested.values():
+            self.columns.extend(serializer.columns)
+        self._only = {}
+        self._serialize = self._compile()
+
+    def __call__(self, row):
+        return self._serialize(row)
+
+    def query(self, query=None):
+        """Select this serializer's columns (and outer-join its nested rows) from ``query``"""
+        if query is None:
+            query = db.session.query(self.model)
+        query = query.with_entities(*self.columns)
+        for relationship, _ in self.nested.values():
+            query = query.outerjoin(relationship)
+        return query
+
+    def all(self, query=None):
+        return [self._serialize(row) for row in self.query(query)]
+
+    def only(self, fields):
+        """Serializer for a subset of the columns, compiled once per field set"""
+        key = tuple(sorted(set(fields)))
+        serializer = self._only.get(key)
+        if serializer is None:
+            serializer = RowSerializer(self.model, key)
+            # Field sets come from clients; only a bounded number are kept compiled
+            if len(self._only) < MAX_COMPILED_SUBSETS:
+                self._only[key] = serializer
+        return serializer
+
+    def _source(self, offset):
+        table = self.model.__table__
+        items = []
+        for position, name in enumerate(self.fields, offset):
+            if isinstance(table.c[name].type, (DateTime, Date)):
+                items.append(f'{name!r}: _iso(row[{position}])')
+            else:
+                items.append(f'{name!r}: row[{position}]')
+        offset += len(self.fields)
+        for key, (_, serializer) in self.nested.items():
+            # Outer join: a missing related row comes back as NULL in every column
+            present = offset + serializer.fields.index('id')
+            items.append(f'{key!r}: None if row[{present}] is None else {serializer._source(offset)}')
+            offset += len(serializer.columns)
+        return '{' + ', '.join(items) + '}'
+
+    def _compile(self):
+        source = f'def serialize(row):\n    return {self._source(0)}\n'
+        namespace = {'_iso': _iso}
+        exec(compile(source, f'<serializer {self.model.__name__}>', 'exec'), namespace)
+        return namespace['serialize']
+
+
+PRODUCT = RowSerializer(Product)
+CART_ITEM = RowSerializer(
+    CartItem, ['id', 'quantity', 'size', 'created_at'], nested={'product': (CartItem.product, PRODUCT)}
+)
+WISHLIST = RowSerializer(Wishlist, ['id', 'created_at'], nested={'product': (Wishlist.product, PRODUCT)})
+LEAD = RowSerializer(Lead)
+NEWSLETTER = RowSerializer(Newsletter)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, falling back to the stdlib for what orjson cannot encode"""
+
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+
+    def dumps(self, obj, **kwargs):
+        # indent (debug responses) and other stdlib-only arguments keep the default encoder
+        if kwargs.keys() - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.option).decode('utf-8')
+        except TypeError:
+            # Integers beyond 64 bits, non-string keys
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def init_app(app):
+    if orjson is not None and app.config.get('JSON_ORJSON_ENABLED', True):
+        app.json = OrjsonProvider(app)
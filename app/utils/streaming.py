@@ -0,0 +1,49 @@
+"""
+Streaming JSON array responses.
+
+``json_array_response`` writes a JSON array from an iterable of rows while
+the client reads it, instead of building the whole list and one big string
+first. Paired with a ``yield_per`` query (a server-side cursor on
+PostgreSQL, incremental ``fetchmany`` elsewhere), the memory used by a
+request stays bounded by ``batch_size`` rows, however large the table.
+
+The body is the same JSON array ``jsonify`` would produce, so clients
+cannot tell the two modes apart. Rows are joined into one chunk per batch
+to keep the number of writes low.
+"""
+
+from flask import current_app, request, stream_with_context
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def wants_stream():
+    """Whether an unpaged listing should stream: ``?stream=`` wins over ``CATALOG_STREAM_LISTINGS``"""
+    value = request.args.get('stream')
+    if value is None:
+        return current_app.config.get('CATALOG_STREAM_LISTINGS', False)
+    return value.lower() in TRUE_VALUES
+
+
+def json_array_response(rows, serialize, batch_size=None):
+    """Stream ``[serialize(row), ...]`` as ``application/json``"""
+    if batch_size is None:
+        batch_size = current_app.config.get('CATALOG_STREAM_BATCH', 500)
+    dumps = current_app.json.dumps
+
+    def generate():
+        # The first chunk goes out as soon as the query returns its first batch
+        separator = '['
+        batch = []
+        for row in rows:
+            batch.append(dumps(serialize(row), separators=(',', ':')))
+            if len(batch) >= batch_size:
+                yield separator + ','.join(batch)
+                separator = ','
+                batch = []
+        if batch:
+            yield separator + ','.join(batch)
+            separator = ','
+        yield ']\n' if separator == ',' else '[]\n'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
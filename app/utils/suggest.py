@@ -0,0 +1,212 @@
+"""
+In-memory typeahead index over product names and tags.
+
+Each worker indexes the distinct words of product names and tags by
+trigram. Every query word is matched against that vocabulary with a bounded
+edit distance, so "moistriser" or "cloudbery" still find their products,
+and the phrases containing a match for every query word are ranked.
+The index follows the catalog version from ``catalog_cache``: when it
+changes, only ``id``, ``name`` and ``tags`` are re-read and just the
+products whose phrases differ are re-indexed.
+"""
+
+import heapq
+import re
+import threading
+from collections import Counter
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def trigrams(word, prefix=False):
+    """Character trigrams of a word; prefix words are left open at the end"""
+    padded = f'  {word}' if prefix else f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def allowed_typos(word):
+    if len(word) <= 3:
+        return 0
+    if len(word) <= 7:
+        return 1
+    return 2
+
+
+def edit_distance(query, word, prefix=False, limit=2):
+    """Levenshtein distance, or distance to the closest prefix of ``word`` when ``prefix`` is set"""
+    previous = list(range(len(word) + 1))
+    for i, q_char in enumerate(query, 1):
+        current = [i]
+        for j, w_char in enumerate(word, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (q_char != w_char),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous) if prefix else previous[-1]
+
+
+class SuggestIndex:
+    """Trigram index over the words of suggestion phrases built from products"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phrases = {}       # key -> {'text', 'type', 'product_ids', 'words'}
+        self._word_phrases = {}  # word -> set of phrase keys
+        self._grams = {}         # trigram -> set of words
+        self._products = {}      # product id -> (name, tags) as last indexed
+        self._product_keys = {}  # product id -> phrase keys contributed
+        self.version = None
+
+    def sync(self, rows, version=None):
+        """Bring the index in line with ``(id, name, tags)`` rows, touching only changed products"""
+        with self._lock:
+            seen = set()
+            for product_id, name, tags in rows:
+                seen.add(product_id)
+                if self._products.get(product_id) != (name, tags):
+                    self._remove_product(product_id)
+                    self._add_product(product_id, name, tags)
+            for product_id in list(self._products):
+                if product_id not in seen:
+                    self._remove_product(product_id)
+            self.version = version
+
+    def suggest(self, query, limit=8):
+        words = normalize(query).split()
+        if not words:
+            return []
+
+        with self._lock:
+            # phrase key -> typos so far. Complete words go first because they are
+            # more selective than the prefix being typed; later words only
+            # re-check the phrases that are still in the running.
+            last = len(words) - 1
+            matches = None
+            for i in sorted(range(len(words)), key=lambda i: i == last):
+                similar = dict(self._similar_words(words[i], prefix=i == last))
+                found = {}
+                postings = sum(len(self._word_phrases[word]) for word in similar)
+                if matches is None or postings <= len(matches):
+                    for vocab_word, typos in similar.items():
+                        for key in self._word_phrases[vocab_word]:
+                            if matches is not None and key not in matches:
+                                continue
+                            if typos < found.get(key, typos + 1):
+                                found[key] = typos
+                    if matches is not None:
+                        found = {key: typos + matches[key] for key, typos in found.items()}
+                else:
+                    for key, so_far in matches.items():
+                        typos = min((similar[w] for w in self._phrases[key]['words'] if w in similar),
+                                    default=None)
+                        if typos is not None:
+                            found[key] = so_far + typos
+                matches = found
+                if not matches:
+                    return []
+
+            first = words[0]
+            best = heapq.nsmallest(limit, matches.items(), key=lambda item: (
+                item[1], not item[0][1].startswith(first), len(item[0][1]), item[0][1]
+            ))
+            results = []
+            for key, _ in best:
+                phrase = self._phrases[key]
+                results.append({
+                    'text': phrase['text'],
+                    'type': phrase['type'],
+                    'product_id': min(phrase['product_ids']) if phrase['type'] == 'product' else None,
+                })
+        return results
+
+    def __len__(self):
+        return len(self._phrases)
+
+    def _similar_words(self, word, prefix=False):
+        """Indexed words within the typo budget of ``word``, as ``(word, typos)``"""
+        limit = allowed_typos(word)
+        counts = Counter()
+        for gram in trigrams(word, prefix=prefix):
+            counts.update(self._grams.get(gram, ()))
+
+        # Every typo can destroy at most three trigrams
+        needed = max(1, len(trigrams(word, prefix=prefix)) - 3 * limit)
+        similar = []
+        for vocab_word, shared in counts.items():
+            if shared < needed and not (prefix and vocab_word.startswith(word)):
+                continue
+            if vocab_word == word or (prefix and vocab_word.startswith(word)):
+                similar.append((vocab_word, 0))
+                continue
+            if len(vocab_word) < len(word) - limit or (not prefix and len(vocab_word) > len(word) + limit):
+                continue
+            typos = edit_distance(word, vocab_word, prefix=prefix, limit=limit)
+            if typos <= limit:
+                similar.append((vocab_word, typos))
+        return similar
+
+    def _phrases_for(self, name, tags):
+        phrases = []
+        if name:
+            phrases.append((name.strip(), 'product'))
+        for tag in (tags or '').split(','):
+            if tag.strip():
+                phrases.append((tag.strip(), 'tag'))
+        return phrases
+
+    def _add_product(self, product_id, name, tags):
+        keys = []
+        for text, kind in self._phrases_for(name, tags):
+            key = (kind, normalize(text))
+            if not key[1]:
+                continue
+            phrase = self._phrases.get(key)
+            if phrase is None:
+                phrase = {'text': text, 'type': kind, 'product_ids': set(), 'words': set(key[1].split())}
+                self._phrases[key] = phrase
+                for word in phrase['words']:
+                    if word not in self._word_phrases:
+                        self._word_phrases[word] = set()
+                        for gram in trigrams(word):
+                            self._grams.setdefault(gram, set()).add(word)
+                    self._word_phrases[word].add(key)
+            phrase['product_ids'].add(product_id)
+            keys.append(key)
+        self._products[product_id] = (name, tags)
+        self._product_keys[product_id] = keys
+
+    def _remove_product(self, product_id):
+        self._products.pop(product_id, None)
+        for key in self._product_keys.pop(product_id, ()):
+            phrase = self._phrases.get(key)
+            if phrase is None:
+                continue
+            phrase['product_ids'].discard(product_id)
+            if phrase['product_ids']:
+                continue
+            del self._phrases[key]
+            for word in phrase['words']:
+                phrases = self._word_phrases.get(word)
+                if phrases is None:
+                    continue
+                phrases.discard(key)
+                if phrases:
+                    continue
+                del self._word_phrases[word]
+                for gram in trigrams(word):
+                    words = self._grams.get(gram)
+                    if words is not None:
+                        words.discard(word)
+                        if not words:
+                            del self._grams[gram]
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,191 @@
+"""
+Jinja bytecode cache and precompiled templates.
+
+Compiling a template (parse, generate Python source, ``compile()`` it) is
+most of the cost of its first render in a process, and every new worker
+pays it again. With ``TEMPLATE_CACHE_ENABLED``, compiled templates are kept
+on disk in ``TEMPLATE_CACHE_DIR`` (``instance/jinja_cache`` by default)
+through Jinja's ``FileSystemBytecodeCache``. An entry is checked against a
+checksum of the template source, so an edited template is recompiled, never
+served stale.
+
+``flask templates compile`` fills the cache for every template at build
+time, fails on template syntax errors, and records the checksum of each
+source in ``manifest.json``. At startup each process compares the manifest
+with the templates on disk and logs a warning naming the templates that
+changed or appeared since, or all of them when Jinja or Python changed:
+those still render correctly, but the first render recompiles them.
+
+A preloading server (gunicorn.conf.py) also loads every template in the
+master before forking (``warm()``), so workers start with all of them in
+Jinja's in-memory cache.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+
+import click
+import jinja2
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from jinja2 import FileSystemBytecodeCache, TemplateError
+
+MANIFEST_NAME = 'manifest.json'
+CACHE_PATTERN = '__jinja2_%s.cache'
+RUNTIME = {
+    'jinja': jinja2.__version__,
+    'python': f'{platform.python_implementation()} {sys.version_info[0]}.{sys.version_info[1]}',
+}
+
+templates_cli = AppGroup('templates', help='Precompile Jinja templates.')
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """``FileSystemBytecodeCache`` keyed by template name only, that never fails a render"""
+
+    def get_cache_key(self, name, filename=None):
+        # Jinja also hashes the absolute filename, which would miss every entry
+        # when the app is compiled in one directory and deployed to another
+        return super().get_cache_key(name)
+
+    def dump_bytecode(self, bucket):
+        # A read-only or full cache directory only costs the next process a compile
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+class TemplateCache:
+    """Bytecode cache setup, staleness check and preload warm-up"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.directory = None
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('TEMPLATE_CACHE_ENABLED', True)
+        self.directory = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+        app.extensions['template_cache'] = self
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            app.logger.warning(f'Template bytecode cache disabled: {e}')
+            self.enabled = False
+            return
+        self.cache = BytecodeCache(self.directory, CACHE_PATTERN)
+        app.jinja_env.bytecode_cache = self.cache
+        self.check(app)
+
+    def check(self, app):
+        """Warn about templates that changed since the last ``flask templates compile``"""
+        stale = self.stale(app.jinja_env)
+        if stale is None:
+            if app.config.get('SERVER_MODE'):
+                app.logger.warning('Templates are not precompiled; run `flask templates compile` when building')
+        elif stale:
+            shown = ', '.join(stale[:5]) + (f' and {len(stale) - 5} more' if len(stale) > 5 else '')
+            noun = 'template' if len(stale) == 1 else 'templates'
+            app.logger.warning(f'{len(stale)} {noun} changed since `flask templates compile` ({shown}); '
+                               f'each is recompiled on its first render')
+        return stale
+
+    def stale(self, env):
+        """Names of templates the compiled manifest does not match, or None without a manifest"""
+        manifest = self.read_manifest()
+        if manifest is None:
+            return None
+        names = sorted(env.list_templates())
+        if {key: manifest.get(key) for key in RUNTIME} != RUNTIME:
+            return names
+        compiled = manifest.get('templates', {})
+        return [name for name in names if compiled.get(name) != _checksum(env, name)]
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST_NAME), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def warm(self, app):
+        """Load every template into Jinja's in-memory cache, e.g. in a preloading master"""
+        env = app.jinja_env
+        for name in env.list_templates():
+            try:
+                env.get_template(name)
+            except TemplateError as e:
+                app.logger.warning(f'Template {name} failed to load: {e}')
+
+
+def _checksum(env, name):
+    source, _, _ = env.loader.get_source(env, name)
+    return source_checksum(source)
+
+
+def source_checksum(source):
+    # The checksum Jinja stores in each cache entry
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def compile_templates(env, cache, directory, clean=False, progress=None):
+    """Compile every template into ``cache`` and write the manifest; returns ``{name: error}`` for failures"""
+    if clean:
+        cache.clear()
+    checksums, errors = {}, {}
+    for name in sorted(env.list_templates()):
+        start = time.perf_counter()
+        source, filename, _ = env.loader.get_source(env, name)
+        try:
+            code = env.compile(source, name, filename)
+        except TemplateError as e:
+            errors[name] = e
+            continue
+        bucket = cache.get_bucket(env, name, filename, source)
+        bucket.code = code
+        cache.set_bucket(bucket)
+        checksums[name] = source_checksum(source)
+        if progress:
+            progress(name, len(source), time.perf_counter() - start)
+
+    manifest = dict(RUNTIME, templates=checksums)
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+    return errors
+
+
+@templates_cli.command('compile')
+@click.option('--clean', is_flag=True, help='Remove cached templates from earlier builds first.')
+@with_appcontext
+def compile_command(clean):
+    """Compile every template into the bytecode cache."""
+    from app import template_cache
+
+    if not template_cache.enabled:
+        raise click.ClickException('TEMPLATE_CACHE_ENABLED is off')
+    totals = {'templates': 0, 'bytes': 0, 'seconds': 0.0}
+
+    def progress(name, size, elapsed):
+        totals['templates'] += 1
+        totals['bytes'] += size
+        totals['seconds'] += elapsed
+
+    errors = compile_templates(current_app.jinja_env, template_cache.cache, template_cache.directory,
+                               clean=clean, progress=progress)
+    for name, error in errors.items():
+        click.echo(f'❌ {name}: {error}', err=True)
+    click.echo(f"✅ {totals['templates']} templates ({totals['bytes'] / 1024:.0f} KB) compiled in "
+               f"{totals['seconds'] * 1000:.0f}ms -> {template_cache.directory}")
+    if errors:
+        raise click.ClickException(f'{len(errors)} templates failed to compile')
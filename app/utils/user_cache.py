@@ -0,0 +1,152 @@
+"""
+Per-worker identity cache for the Flask-Login user loader.
+
+Only the user's column values are cached, keyed by user id. Each request
+gets its own ``User`` instance built from them and attached to that
+request's session without a query, so no ORM object is ever shared
+between threads or sessions. An entry lives at most ``USER_CACHE_TTL``
+seconds; that TTL also bounds how stale another worker's copy can be.
+
+Any committed ORM change to a ``User`` row drops its entry in this
+worker: profile updates, email confirmation, password resets, rehashes,
+newsletter (un)subscription. A per-user generation counter stops a
+request that read the row before such a commit from caching the old values
+afterwards.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+_DIRTY_KEY = 'user_cache_dirty'
+_listening = False
+
+
+class UserCache:
+    """Bounded, TTL-limited cache of user rows for ``login_manager.user_loader``"""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        self.ttl = 5.0
+        self.max_entries = 10000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('USER_CACHE_ENABLED', True)
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', self.max_entries)
+        app.extensions['user_cache'] = self
+        _listen(self)
+
+    def load(self, user_id):
+        """Return the ``User`` with ``user_id`` attached to the current session, or None"""
+        from app import db
+        from app.models import User
+
+        if not self.enabled:
+            return db.session.get(User, user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                values = entry[1]
+            else:
+                values = None
+                self.misses += 1
+            generation = (self._epoch, self._generations.get(user_id, 0))
+
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            state = inspect(user)
+            keys = [attr.key for attr in state.mapper.column_attrs]
+            values = {key: state.dict[key] for key in keys if key in state.dict}
+            with self._lock:
+                # Only complete, unmodified rows are cached
+                if len(values) == len(keys) and not state.modified \
+                        and generation == (self._epoch, self._generations.get(user_id, 0)):
+                    self._entries[user_id] = (now + self.ttl, values)
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if len(self._generations) > self.max_entries:
+                # Generations only matter for loads in flight; start a new epoch instead of growing
+                self._generations.clear()
+                self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+def _changed_user_ids(session):
+    from app.models import User
+
+    return {obj.id for obj in list(session.dirty) + list(session.deleted)
+            if isinstance(obj, User) and obj.id is not None}
+
+
+def _listen(cache):
+    global _listening
+    if _listening:
+        return
+    _listening = True
+
+    @event.listens_for(Session, 'after_flush')
+    def _after_flush(session, flush_context):
+        user_ids = _changed_user_ids(session)
+        if user_ids:
+            session.info.setdefault(_DIRTY_KEY, set()).update(user_ids)
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _do_orm_execute(state):
+        from app.models import User
+
+        if (state.is_update or state.is_delete) and state.bind_mapper is not None \
+                and state.bind_mapper.class_ is User:
+            session = state.session
+            session.info[_DIRTY_KEY] = session.info.get(_DIRTY_KEY, set()) | {None}
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        user_ids = session.info.pop(_DIRTY_KEY, None)
+        if not user_ids:
+            return
+        if None in user_ids:
+            cache.clear()
+            return
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+
+    @event.listens_for(Session, 'after_soft_rollback')
+    def _after_soft_rollback(session, previous_transaction):
+        session.info.pop(_DIRTY_KEY, None)
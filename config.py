@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -8,7 +9,111 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MAIL_SERVER = os.getenv('MAIL_SERVER')
-    MAIL_PORT = int(os.getenv('MAIL_PORT'))
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
     MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'true').lower() in ['true', '1', 'yes']
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+
+    # Connection pool, per worker and per database. Keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # under the server's connection limit.
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ['true', '1', 'yes']
+
+    # Read replica for catalog GETs, per endpoint name or '<blueprint>.*' (comma-separated in
+    # DB_REPLICA_ENDPOINTS). A replica behind the primary's catalog version is not used.
+    DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+    DB_REPLICA_ENDPOINTS = [
+        endpoint.strip() for endpoint in os.getenv(
+            'DB_REPLICA_ENDPOINTS', 'products.*,static.product_detail,static.category_products'
+        ).split(',') if endpoint.strip()
+    ]
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 2.0))
+    DB_REPLICA_RETRY_AFTER = float(os.getenv('DB_REPLICA_RETRY_AFTER', 30))
+
+    # Per-worker product catalog cache
+    CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 256))
+    CATALOG_CACHE_MAX_BYTES = int(os.getenv('CATALOG_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    CATALOG_CACHE_CHECK_INTERVAL = float(os.getenv('CATALOG_CACHE_CHECK_INTERVAL', 2.0))
+
+    # Rendered product and category pages, served stale for up to PAGE_CACHE_MAX_STALE seconds while refreshing
+    PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', 2000))
+    PAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    PAGE_CACHE_MAX_STALE = float(os.getenv('PAGE_CACHE_MAX_STALE', 300))
+
+    # Per-worker cache for the Flask-Login user loader
+    USER_CACHE_ENABLED = os.getenv('USER_CACHE_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 5.0))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+
+    # Rows per transaction for `flask catalog import`
+    CATALOG_IMPORT_CHUNK_SIZE = int(os.getenv('CATALOG_IMPORT_CHUNK_SIZE', 1000))
+
+    # Stream unpaged product listings from a yield_per query (?stream=1|0 overrides per request)
+    CATALOG_STREAM_LISTINGS = os.getenv('CATALOG_STREAM_LISTINGS', 'false').lower() in ['true', '1', 'yes']
+    CATALOG_STREAM_BATCH = int(os.getenv('CATALOG_STREAM_BATCH', 500))
+
+    # Encode JSON responses with orjson when it is installed
+    JSON_ORJSON_ENABLED = os.getenv('JSON_ORJSON_ENABLED', 'true').lower() in ['true', '1', 'yes']
+
+    # Serve /api/products/filter from the in-memory facet index
+    FACET_ENGINE_ENABLED = os.getenv('FACET_ENGINE_ENABLED', 'true').lower() in ['true', '1', 'yes']
+
+    # Email outbox delivery: run `flask outbox run` (Procfile `worker`), or set
+    # OUTBOX_WORKERS to deliver from threads in every web process instead
+    OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 0))
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 6))
+    OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', 30))
+    OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', 3600))
+    OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 300))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 2.0))
+    OUTBOX_IDLE_DISCONNECT = float(os.getenv('OUTBOX_IDLE_DISCONNECT', 30))
+
+    # Newsletter campaigns (see `flask campaign send`)
+    NEWSLETTER_CHUNK_SIZE = int(os.getenv('NEWSLETTER_CHUNK_SIZE', 500))
+    NEWSLETTER_CONNECTIONS = int(os.getenv('NEWSLETTER_CONNECTIONS', 4))
+    NEWSLETTER_RATE_LIMIT = float(os.getenv('NEWSLETTER_RATE_LIMIT', 0))
+    NEWSLETTER_BASE_URL = os.getenv('NEWSLETTER_BASE_URL', 'http://localhost:5000')
+
+    # Password hashing policy (Werkzeug method string) and its thread pool
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 16))
+
+    # Fingerprinted static files from `flask assets build`
+    ASSETS_FINGERPRINT_ENABLED = os.getenv('ASSETS_FINGERPRINT_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    ASSETS_MAX_AGE = int(os.getenv('ASSETS_MAX_AGE', 31536000))
+
+    # Compiled Jinja templates on disk (see `flask templates compile`); defaults to instance/jinja_cache
+    TEMPLATE_CACHE_ENABLED = os.getenv('TEMPLATE_CACHE_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR')
+
+    # Request/SQL metrics at /metrics and Server-Timing headers. METRICS_DIR is a directory shared by
+    # the gunicorn workers so /metrics covers all of them; empty it when the server starts.
+    # /metrics is only served with METRICS_TOKEN set, to scrapes sending "Authorization: Bearer <token>".
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ['true', '1', 'yes']
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'true').lower() in ['true', '1', 'yes']
+    METRICS_DIR = os.getenv('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1.0))
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+
+    # Set by gunicorn.conf.py: the process only serves requests, so CLI-only extensions
+    # (Flask-Migrate and through it Alembic) are not loaded
+    SERVER_MODE = os.getenv('SERVER_MODE', 'false').lower() in ['true', '1', 'yes']
+
+    # Cache-Control per endpoint name or '<blueprint>.*' (JSON in HTTP_CACHE_POLICIES overrides).
+    # Cart, user, auth and form endpoints are always 'private, no-store'.
+    HTTP_CACHE_POLICIES = {
+        'products.*': 'public, max-age=60, stale-while-revalidate=300',
+        'products.suggest_products': 'public, max-age=300, stale-while-revalidate=600',
+        'static.*': 'public, no-cache',
+        **json.loads(os.getenv('HTTP_CACHE_POLICIES', '{}')),
+    }
@@ -0,0 +1,64 @@
+"""
+gunicorn settings; gunicorn reads this file from the working directory.
+
+    gunicorn                              # from the repo root
+    GUNICORN_PRELOAD=false gunicorn       # each worker imports the app itself
+
+The app is preloaded by default: the master imports it once and forks the
+workers from it, so they start in milliseconds and share the master's
+memory copy-on-write. To keep those pages shared, the master runs with the
+garbage collector disabled and freezes everything before each fork (see
+app/utils/prefork.py); workers re-enable collection for their own objects.
+"""
+
+import gc
+import glob
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+wsgi_app = 'run:app'
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then; the jitter keeps them from all restarting at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ['true', '1', 'yes']
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+raw_env = ['SERVER_MODE=true']
+
+if preload_app:
+    # No collections while the app loads, so its objects are not scattered across half-freed pages
+    gc.disable()
+
+
+def on_starting(server):
+    # Snapshots of the previous server's workers would otherwise be summed into /metrics
+    directory = os.getenv('METRICS_DIR')
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from app.utils import prefork
+
+        prefork.before_fork(server.app.wsgi())
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        # Also covers workers forked later, to replace ones that exited
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
@@ -0,0 +1,51 @@
+"""index hot lookups
+
+Indexes for the columns the routes filter and sort on, and for the
+case-insensitive email lookups on ``users`` and ``newsletter``. Cart
+lookups by ``session_id`` / ``user_id`` are already served by the
+partial unique indexes from 9d47e5c2b813.
+
+On PostgreSQL the indexes are built ``CONCURRENTLY`` so the tables stay
+writable while they build.
+
+Revision ID: 18e43b107d30
+Revises: 9d47e5c2b813
+Create Date: 2026-10-18 11:35:10.871458
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '18e43b107d30'
+down_revision = '9d47e5c2b813'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_products_category', 'products', ['category']),
+    ('ix_products_is_bestseller', 'products', ['is_bestseller']),
+    ('ix_products_is_new', 'products', ['is_new']),
+    ('ix_products_price_id', 'products', ['price', 'id']),
+    ('ix_products_created_at_id', 'products', ['created_at', 'id']),
+    ('ix_products_rating_id', 'products', ['rating', 'id']),
+    ('ix_products_name_id', 'products', ['name', 'id']),
+    ('ix_wishlists_product_id', 'wishlists', ['product_id']),
+    ('ix_users_email_lower', 'users', [sa.text('lower(email)')]),
+    ('ix_newsletter_email_lower', 'newsletter', [sa.text('lower(email)')]),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""product sku
+
+``products.sku``, the key catalog imports upsert on, with its unique
+index. Existing products keep a NULL sku until an import adopts them.
+
+Revision ID: 6a0e2b7d91f4
+Revises: c3f1a9d84e20
+Create Date: 2026-10-18 16:03:12.204977
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a0e2b7d91f4'
+down_revision = 'c3f1a9d84e20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('products')}
+    if 'sku' not in columns:
+        op.add_column('products', sa.Column('sku', sa.String(length=64), nullable=True))
+    op.create_index('ix_products_sku', 'products', ['sku'], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_products_sku', table_name='products')
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_column('sku')
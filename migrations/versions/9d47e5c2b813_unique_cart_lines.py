@@ -0,0 +1,52 @@
+"""unique cart lines
+
+One cart line per (owner, product, size), a missing size counting as
+``''``, enforced by partial unique indexes for signed-in and guest carts.
+Duplicate lines left by the old read-then-insert cart code are merged
+first: the oldest line of each group keeps the summed quantity and the
+others are deleted.
+
+Revision ID: 9d47e5c2b813
+Revises: 6a0e2b7d91f4
+Create Date: 2026-10-18 16:03:55.730126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d47e5c2b813'
+down_revision = '6a0e2b7d91f4'
+branch_labels = None
+depends_on = None
+
+OWNERS = [('uq_cart_items_user_line', 'user_id'), ('uq_cart_items_session_line', 'session_id')]
+
+
+def merge_duplicates(owner):
+    keep = (f"SELECT min(id) FROM cart_items WHERE {owner} IS NOT NULL "
+            f"GROUP BY {owner}, product_id, coalesce(size, '')")
+    op.execute(
+        f"UPDATE cart_items SET quantity = ("
+        f"SELECT sum(coalesce(line.quantity, 1)) FROM cart_items line "
+        f"WHERE line.{owner} = cart_items.{owner} AND line.product_id = cart_items.product_id "
+        f"AND coalesce(line.size, '') = coalesce(cart_items.size, '')) "
+        f"WHERE id IN ({keep} HAVING count(*) > 1)"
+    )
+    op.execute(f"DELETE FROM cart_items WHERE {owner} IS NOT NULL AND id NOT IN ({keep})")
+
+
+def upgrade():
+    for name, owner in OWNERS:
+        merge_duplicates(owner)
+        op.create_index(
+            name, 'cart_items', [owner, 'product_id', sa.text("coalesce(size, '')")], unique=True,
+            if_not_exists=True, sqlite_where=sa.text(f'{owner} IS NOT NULL'),
+            postgresql_where=sa.text(f'{owner} IS NOT NULL')
+        )
+
+
+def downgrade():
+    for name, _ in reversed(OWNERS):
+        op.drop_index(name, table_name='cart_items')
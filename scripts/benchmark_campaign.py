@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Measure sustained newsletter campaign throughput (messages/sec) against a
+local SMTP sink, including an interrupted-and-resumed run
+
+Seeds --subscribers Newsletter rows (every tenth inactive) in a temporary
+SQLite database, starts an aiosmtpd sink in a child process, interrupts
+the campaign with SIGINT halfway through chunk --interrupt-after + 1 (as
+Ctrl+C would), resumes it, and checks that every active subscriber
+received exactly one message. Also compares the
+per-message build cost of the pre-rendered campaign template with a
+Flask-Mail Message.
+
+Requires aiosmtpd (pip install aiosmtpd).
+
+Usage:
+    python scripts/benchmark_campaign.py [--subscribers 20000] [--connections 4] [--rate 0]
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.recipients = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.recipients.extend(envelope.rcpt_tos)
+        return '250 OK'
+
+
+def run_sink(port, ready, stop, results):
+    """Serve the SMTP sink in its own process and report the recipients it saw"""
+    from aiosmtpd.controller import Controller
+
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    ready.set()
+    stop.wait()
+    controller.stop()
+    results.put(handler.recipients)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=20000)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=0, help='messages/sec limit, 0 for none')
+    parser.add_argument('--interrupt-after', type=int, default=3, help='chunks before the one that is interrupted')
+    args = parser.parse_args()
+
+    try:
+        import aiosmtpd  # noqa: F401
+    except ImportError:
+        print("❌ aiosmtpd is required: pip install aiosmtpd")
+        sys.exit(1)
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    ready, stop, results = multiprocessing.Event(), multiprocessing.Event(), multiprocessing.Queue()
+    sink = multiprocessing.Process(target=run_sink, args=(port, ready, stop, results), daemon=True)
+    sink.start()
+    ready.wait(10)
+
+    path = os.path.join(tempfile.gettempdir(), 'aevi_campaign_bench.db')
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ.update({'DATABASE_URL': f'sqlite:///{path}', 'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': str(port),
+                       'MAIL_USE_TLS': 'false', 'MAIL_DEFAULT_SENDER': 'AEVI <news@aevi.local>',
+                       'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark')})
+
+    from flask_mail import Message
+    from app import create_app, db
+    from app.models import Newsletter, NewsletterCampaign
+    from app.utils.campaign import CampaignTemplate, send_campaign
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Newsletter.__table__.insert(), [
+            {'email': f'subscriber{i}@example.com', 'is_active': i % 10 != 0} for i in range(args.subscribers)
+        ])
+        db.session.commit()
+        active = Newsletter.query.filter_by(is_active=True).count()
+
+        template = CampaignTemplate('Spring at AEVI', 'newsletter_email.html',
+                                    sender='AEVI <news@aevi.local>', base_url='http://localhost:5000')
+        samples = 2000
+        start = time.perf_counter()
+        for i in range(samples):
+            template.message_bytes(*template.render(f'subscriber{i}@example.com'))
+        campaign_build = (time.perf_counter() - start) / samples
+        values, html, _ = template.render('subscriber0@example.com')
+        start = time.perf_counter()
+        for i in range(samples // 4):
+            Message('Spring at AEVI', recipients=[f'subscriber{i}@example.com'], html=html,
+                    sender='AEVI <news@aevi.local>').as_bytes()
+        flask_mail_build = (time.perf_counter() - start) / (samples // 4)
+        print(f"🧱 Build per message: {campaign_build * 1e6:.0f}µs pre-rendered vs "
+              f"{flask_mail_build * 1e6:.0f}µs Flask-Mail Message")
+
+        campaign = NewsletterCampaign(name='bench', subject='Spring at AEVI', template='newsletter_email.html')
+        db.session.add(campaign)
+        db.session.commit()
+
+        chunks = 0
+
+        def interrupt(campaign):
+            # Ctrl+C halfway through the next chunk
+            nonlocal chunks
+            chunks += 1
+            if chunks == args.interrupt_after:
+                chunk_seconds = (time.perf_counter() - start) / chunks
+                threading.Timer(chunk_seconds / 2, os.kill, (os.getpid(), signal.SIGINT)).start()
+
+        print(f"📨 Sending to {active} active subscribers over {args.connections} connections")
+        start = time.perf_counter()
+        try:
+            send_campaign(campaign, chunk_size=args.chunk_size, connections=args.connections, rate=args.rate,
+                          base_url='http://localhost:5000', progress=interrupt)
+        except KeyboardInterrupt:
+            campaign = NewsletterCampaign.query.filter_by(name='bench').one()
+            print(f"⏸️  Interrupted mid-chunk: {campaign.status} after subscriber {campaign.last_subscriber_id} "
+                  f"({campaign.sent_count} sent)")
+
+        send_campaign(campaign, chunk_size=args.chunk_size, connections=args.connections, rate=args.rate,
+                      base_url='http://localhost:5000')
+        elapsed = time.perf_counter() - start
+        print(f"▶️  Resumed and {campaign.status}: {campaign.sent_count} sent, "
+              f"{campaign.failed_count} handed to the outbox")
+
+    stop.set()
+    received = Counter(results.get(timeout=30))
+    sink.join(5)
+
+    duplicates = sum(1 for count in received.values() if count > 1)
+    print(f"\n{campaign.sent_count} messages in {elapsed:.2f}s: {campaign.sent_count / elapsed:.0f} msgs/sec sustained")
+    ok = len(received) == active and duplicates == 0
+    print(f"{'✅' if ok else '❌'} sink received {len(received)} distinct recipients "
+          f"(expected {active}), {duplicates} duplicated")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
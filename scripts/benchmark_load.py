@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark for the storefront's hot paths
+
+Serves the app in its own process (threaded Werkzeug server) against a
+seeded temporary SQLite database, or against --database-url (e.g. a local
+PostgreSQL), and drives it with closed-loop virtual shoppers. Each
+shopper keeps its own cookies and picks a scenario per iteration from a
+weighted mix:
+
+    browse      GET /api/products/filter (category, sort, facets), then maybe the next page
+    search      GET /api/products/search
+    detail      GET /product/<id>
+    cart        POST /api/cart/add, GET /api/cart/, PUT /api/cart/update/<id>
+    signin      POST /signin (JSON)
+    newsletter  POST /subscribe-newsletter (JSON, a new address each time)
+
+It reports throughput, p50/p95/p99 latency and SQL queries per request for
+each request type. The server counts the queries of every request and
+returns them in an ``X-Query-Count`` header.
+
+Results are compared with a stored baseline (scripts/benchmark_baseline.json
+by default) recorded with the same settings; the run exits non-zero when a
+request type got slower than --latency-tolerance at p50 or p95, when it
+issues more queries per request, or when total throughput dropped more
+than --throughput-tolerance. Record a new baseline with --save-baseline.
+Latency numbers only compare on the same machine: keep the baseline next
+to the CI runner that checks it.
+
+Usage:
+    python scripts/benchmark_load.py [--users 8] [--duration 15] [--products 2000]
+    python scripts/benchmark_load.py --save-baseline
+    python scripts/benchmark_load.py --database-url postgresql://localhost/aevi_bench
+"""
+
+import argparse
+import http.cookiejar
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+PASSWORD = 'correct horse battery'
+# Scrypt at the production cost would make sign-in dominate the run; the pool is measured by benchmark_login.py
+PASSWORD_HASH_METHOD = 'scrypt:1024:8:1'
+MIX = {'browse': 40, 'search': 20, 'detail': 20, 'cart': 12, 'signin': 3, 'newsletter': 5}
+CATEGORIES = ['all', 'serums-oils', 'cleansers-masks', 'moisturisers', 'body', 'bestsellers', 'new-in']
+SORTS = ['name', 'price-low', 'price-high', 'rating', 'newest']
+WORDS = ['nordic', 'cloudberry', 'birch', 'pine', 'oil', 'serum', 'balm', 'cream', 'cleanser',
+         'mask', 'toner', 'hydrating', 'nourishing', 'gentle', 'radiance', 'repair', 'night']
+# Below this, a p50/p95 change is timer noise rather than a regression
+LATENCY_FLOOR_MS = 2.0
+# Request types with fewer samples are too noisy for percentile comparisons
+MIN_SAMPLES = 100
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed(env, users, products):
+    """Runs in its own interpreter: Config reads DATABASE_URL once, at import"""
+    os.environ.update(env)
+    from app import create_app, db
+    from app.models import Product, User
+    from app.utils.passwords import hash_password
+    from app.utils.search import ensure_search_index
+
+    rng = random.Random(products)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ensure_search_index(db.engine)
+        if db.session.query(Product.id).first() is not None:
+            return  # an existing --database-url keeps its catalog
+        password_hash = hash_password(PASSWORD)
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'shopper{i}@example.com', 'password_hash': password_hash, 'first_name': 'Load',
+             'last_name': f'Shopper {i}'} for i in range(users)
+        ])
+        for start in range(0, products, 5000):
+            db.session.execute(Product.__table__.insert(), [{
+                'name': sentence(rng, 3).title(),
+                'price': round(rng.uniform(10, 150), 2),
+                'category': rng.choice(['Serums & Oils', 'Cleansers & Masks', 'Moisturisers', 'Body']),
+                'short_description': sentence(rng, 12),
+                'description': sentence(rng, 60),
+                'ingredients': sentence(rng, 20),
+                'tags': ','.join(rng.sample(WORDS, 4)),
+                'rating': round(rng.uniform(3, 5), 1),
+                'review_count': rng.randint(0, 400),
+                'is_bestseller': rng.random() < 0.2,
+                'is_new': rng.random() < 0.1,
+                'in_stock': rng.random() < 0.9,
+            } for _ in range(start, min(products, start + 5000))])
+        db.session.commit()
+
+
+def serve(env, port, ready):
+    """Run the app in a fresh interpreter, counting SQL statements per request"""
+    os.environ.update(env)
+    from flask import g, has_request_context
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+
+    @app.after_request
+    def query_count_header(response):
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    ready.set()
+    server.serve_forever()
+
+
+class Shopper:
+    """One virtual user with its own cookie jar"""
+
+    def __init__(self, base_url, index, users, products, record):
+        self.base_url = base_url
+        self.index = index
+        self.users = users
+        self.products = products
+        self.record = record
+        self.rng = random.Random(index)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.signups = 0
+
+    def request(self, name, path, payload=None, method=None):
+        data = None
+        headers = {}
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request) as response:
+                body = response.read()
+                queries = int(response.headers.get('X-Query-Count', 0))
+        except urllib.error.HTTPError as e:
+            e.read()
+            self.record(name, time.perf_counter() - start, None, error=True)
+            return None
+        except OSError:
+            self.record(name, time.perf_counter() - start, None, error=True)
+            return None
+        self.record(name, time.perf_counter() - start, queries)
+        return body
+
+    def browse(self):
+        category = self.rng.choice(CATEGORIES)
+        query = f'category={category}&sort={self.rng.choice(SORTS)}&limit=24'
+        if self.rng.random() < 0.5:
+            query += '&facets=' + ','.join(CATEGORIES[1:5])
+        body = self.request('browse', f'/api/products/filter?{query}')
+        if body and self.rng.random() < 0.4:
+            cursor = json.loads(body).get('next_cursor')
+            if cursor:
+                self.request('browse', f'/api/products/filter?{query}&cursor={urllib.parse.quote(cursor)}')
+
+    def search(self):
+        terms = ' '.join(self.rng.sample(WORDS, self.rng.choice([1, 1, 2])))
+        self.request('search', f'/api/products/search?q={urllib.parse.quote(terms)}&limit=24')
+
+    def detail(self):
+        self.request('detail', f'/product/{self.rng.randint(1, self.products)}')
+
+    def cart(self):
+        product_id = self.rng.randint(1, self.products)
+        self.request('cart_add', '/api/cart/add', {'product_id': product_id, 'quantity': 1})
+        body = self.request('cart_view', '/api/cart/')
+        if body:
+            items = json.loads(body)
+            if items:
+                item = self.rng.choice(items)
+                self.request('cart_update', f"/api/cart/update/{item['id']}",
+                             {'quantity': self.rng.randint(1, 4)}, method='PUT')
+
+    def signin(self):
+        email = f'shopper{self.rng.randrange(self.users)}@example.com'
+        self.request('signin', '/signin', {'email': email, 'password': PASSWORD})
+
+    def newsletter(self):
+        self.signups += 1
+        email = f'reader-{os.getpid()}-{self.index}-{self.signups}-{time.time_ns()}@example.com'
+        self.request('newsletter', '/subscribe-newsletter', {'email': email})
+
+    def run(self, stop):
+        scenarios = list(MIX)
+        weights = [MIX[name] for name in scenarios]
+        while not stop.is_set():
+            getattr(self, self.rng.choices(scenarios, weights)[0])()
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_load(base_url, shoppers, duration, users, products):
+    """Drive the server for ``duration`` seconds; returns {request type: (latencies, queries, errors)}"""
+    samples = {}
+    lock = threading.Lock()
+
+    def record(name, elapsed, queries, error=False):
+        with lock:
+            latencies, query_counts, errors = samples.setdefault(name, ([], [], [0]))
+            if error:
+                errors[0] += 1
+            else:
+                latencies.append(elapsed)
+                query_counts.append(queries)
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=Shopper(base_url, i, users, products, record).run, args=(stop,))
+               for i in range(shoppers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def summarize(samples, duration):
+    results = {}
+    for name, (latencies, queries, errors) in sorted(samples.items()):
+        results[name] = {
+            'requests': len(latencies),
+            'errors': errors[0],
+            'rps': round(len(latencies) / duration, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        }
+    everything = [value for latencies, _, _ in samples.values() for value in latencies]
+    results['total'] = {
+        'requests': len(everything),
+        'errors': sum(errors[0] for _, _, errors in samples.values()),
+        'rps': round(len(everything) / duration, 2),
+        'p50_ms': round(percentile(everything, 50) * 1000, 2),
+        'p95_ms': round(percentile(everything, 95) * 1000, 2),
+        'p99_ms': round(percentile(everything, 99) * 1000, 2),
+        'queries': round(sum(sum(queries) for _, queries, _ in samples.values()) / len(everything), 2)
+        if everything else 0.0,
+    }
+    return results
+
+
+def compare(results, baseline, latency_tolerance, throughput_tolerance):
+    """Return a list of regression messages against ``baseline['results']``"""
+    regressions = []
+    for name, before in baseline['results'].items():
+        after = results.get(name)
+        if after is None or not after['requests']:
+            regressions.append(f'{name}: no successful requests (baseline had {before["requests"]})')
+            continue
+        if name == 'total':
+            if after['rps'] < before['rps'] * (1 - throughput_tolerance):
+                regressions.append(f"total throughput {after['rps']:.1f}/s < baseline {before['rps']:.1f}/s "
+                                   f"- {throughput_tolerance:.0%}")
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if min(before['requests'], after['requests']) < MIN_SAMPLES:
+                break
+            limit = max(before[key] * (1 + latency_tolerance), before[key] + LATENCY_FLOOR_MS)
+            if after[key] > limit:
+                regressions.append(f'{name} {key[:3]} {after[key]:.1f}ms > {limit:.1f}ms '
+                                   f'(baseline {before[key]:.1f}ms)')
+        # Query counts are deterministic per request type, up to the random mix of pages and carts
+        if after['queries'] > before['queries'] + 0.5:
+            regressions.append(f"{name} queries/request {after['queries']:.2f} > baseline {before['queries']:.2f}")
+    return regressions
+
+
+def machine():
+    return {'python': platform.python_version(), 'platform': platform.platform(terse=True),
+            'cpus': os.cpu_count(), 'processor': platform.processor() or platform.machine()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual shoppers')
+    parser.add_argument('--duration', type=float, default=15, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds first')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--accounts', type=int, default=50, help='Seeded accounts for sign-in')
+    parser.add_argument('--database-url', help='Use this database instead of a temporary SQLite file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Record this run as the new baseline')
+    parser.add_argument('--latency-tolerance', type=float, default=0.25, help='Allowed p50/p95 slowdown')
+    parser.add_argument('--throughput-tolerance', type=float, default=0.15, help='Allowed total throughput drop')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'aevi_load_bench.db')
+        if os.path.exists(path):
+            os.remove(path)
+        database_url = f'sqlite:///{path}'
+    env = {'DATABASE_URL': database_url, 'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark'),
+           'MAIL_PORT': os.environ.get('MAIL_PORT', '25'), 'PASSWORD_HASH_METHOD': PASSWORD_HASH_METHOD}
+
+    context = multiprocessing.get_context('spawn')
+    seeder = context.Process(target=seed, args=(env, args.accounts, args.products))
+    seeder.start()
+    seeder.join()
+    if seeder.exitcode != 0:
+        sys.exit('❌ Seeding the database failed')
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    ready = context.Event()
+    server = context.Process(target=serve, args=(env, port, ready), daemon=True)
+    server.start()
+    if not ready.wait(30):
+        server.terminate()
+        sys.exit('❌ The server did not start')
+    base_url = f'http://127.0.0.1:{port}'
+
+    print(f"🛒 {args.users} shoppers, {args.products} products, {args.duration:.0f}s after {args.warmup:.0f}s "
+          f"warm-up, {os.cpu_count()} CPUs, {database_url.split(':', 1)[0]}")
+    try:
+        run_load(base_url, args.users, args.warmup, args.accounts, args.products)
+        samples = run_load(base_url, args.users, args.duration, args.accounts, args.products)
+    finally:
+        server.terminate()
+        server.join()
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    results = summarize(samples, args.duration)
+    print(f"\n{'request':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+              f"{result['p99_ms']:>8.1f} {result['queries']:>8.2f} {result['errors']:>7}")
+
+    settings = {'users': args.users, 'duration': args.duration, 'products': args.products,
+                'accounts': args.accounts, 'mix': MIX, 'database': database_url.split(':', 1)[0]}
+    failed = results['total']['errors'] > 0
+    if failed:
+        print(f"\n❌ {results['total']['errors']} requests failed")
+
+    if args.save_baseline:
+        if failed:
+            sys.exit('❌ Not saving a baseline from a run with errors')
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'machine': machine(), 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\n💾 Baseline saved to {os.path.relpath(args.baseline)}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️  No baseline at {os.path.relpath(args.baseline)}; record one with --save-baseline")
+        sys.exit(1 if failed else 0)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['settings'] != settings:
+        print("\n⚠️  The baseline was recorded with different settings; not comparing")
+        sys.exit(1 if failed else 0)
+    if baseline['machine'] != machine():
+        print(f"\n⚠️  The baseline comes from another machine ({baseline['machine']}); latencies may not compare")
+
+    regressions = compare(results, baseline, args.latency_tolerance, args.throughput_tolerance)
+    for message in regressions:
+        print(f"❌ {message}")
+    if regressions or failed:
+        sys.exit(1)
+    print("\n✅ No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
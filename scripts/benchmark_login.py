@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Measure sign-in throughput and catalog latency under a mixed load
+
+Serves the app on a local threaded server and runs catalog readers (GET
+/api/products/search) alongside a burst of sign-ins (POST /signin), once
+with password hashing inline in the request threads and once on the
+bounded hashing pool (PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE). It
+reports logins/sec, shed logins (503) and catalog p50/p95/p99 for each
+mode against a catalog-only baseline. Uses a temporary SQLite database.
+
+Usage:
+    python scripts/benchmark_login.py [--duration 10] [--login-threads 8] [--catalog-threads 4] [--workers 1]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+PASSWORD = 'correct horse battery'
+
+
+def serve(env, port, ready):
+    """Run the app in a fresh interpreter so the hashing config is read from ``env``"""
+    os.environ.update(env)
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, create_app(), threaded=True)
+    ready.set()
+    server.serve_forever()
+
+
+def seed(users, products):
+    from app import create_app, db
+    from app.models import Product, User
+    from app.utils.passwords import hash_password
+    from app.utils.search import ensure_search_index
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ensure_search_index(db.engine)
+        password_hash = hash_password(PASSWORD)
+        db.session.execute(User.__table__.insert(), [
+            {'email': f'user{i}@example.com', 'password_hash': password_hash} for i in range(users)
+        ])
+        words = ['serum', 'oil', 'balm', 'cleanser', 'mask', 'cream', 'nordic', 'birch', 'cloudberry']
+        db.session.execute(Product.__table__.insert(), [
+            {'name': f'{words[i % len(words)].title()} {words[(i * 7) % len(words)]} {i}', 'price': 10 + i % 90,
+             'description': ' '.join(words[(i + j) % len(words)] for j in range(12)), 'category': 'Serums & Oils'}
+            for i in range(products)
+        ])
+        db.session.commit()
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_load(base_url, duration, login_threads, catalog_threads, users):
+    stop = threading.Event()
+    latencies, logins, shed, errors = [], [0], [0], [0]
+    lock = threading.Lock()
+
+    def catalog():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f'{base_url}/api/products/search?q=serum&limit=24') as response:
+                    response.read()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    def login(index):
+        i = index
+        while not stop.is_set():
+            body = json.dumps({'email': f'user{i % users}@example.com', 'password': PASSWORD}).encode()
+            request = urllib.request.Request(f'{base_url}/signin', data=body, method='POST',
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                with lock:
+                    logins[0] += 1
+            except urllib.error.HTTPError as e:
+                with lock:
+                    if e.code == 503:
+                        shed[0] += 1
+                    else:
+                        errors[0] += 1
+                if e.code == 503:
+                    time.sleep(float(e.headers.get('Retry-After', 1)))
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            i += login_threads
+
+    threads = [threading.Thread(target=catalog) for _ in range(catalog_threads)]
+    threads += [threading.Thread(target=login, args=(i,)) for i in range(login_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, logins[0], shed[0], errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--catalog-threads', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=1, help='PASSWORD_HASH_WORKERS for the pooled run')
+    parser.add_argument('--queue', type=int, default=2, help='PASSWORD_HASH_QUEUE for the pooled run')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--products', type=int, default=2000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), 'aevi_login_bench.db')
+    if os.path.exists(path):
+        os.remove(path)
+    env = {'DATABASE_URL': f'sqlite:///{path}', 'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark'),
+           'MAIL_PORT': os.environ.get('MAIL_PORT', '25')}
+    os.environ.update(env)
+    seed(args.users, args.products)
+
+    print(f"🔐 {args.login_threads} login threads, {args.catalog_threads} catalog threads, "
+          f"{args.duration:.0f}s per run, {os.cpu_count()} CPUs")
+    runs = [
+        ('catalog only', {'PASSWORD_HASH_WORKERS': '0'}, 0),
+        ('inline hashing', {'PASSWORD_HASH_WORKERS': '0'}, args.login_threads),
+        (f'pool ({args.workers}+{args.queue})', {'PASSWORD_HASH_WORKERS': str(args.workers),
+                                                 'PASSWORD_HASH_QUEUE': str(args.queue)}, args.login_threads),
+    ]
+    context = multiprocessing.get_context('spawn')
+    print(f"\n{'mode':<18} {'logins/s':>9} {'shed':>6} {'catalog/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, overrides, login_threads in runs:
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        ready = context.Event()
+        server = context.Process(target=serve, args=(dict(env, **overrides), port, ready), daemon=True)
+        server.start()
+        ready.wait(30)
+        base_url = f'http://127.0.0.1:{port}'
+        run_load(base_url, 1, 0, 1, args.users)  # warm up
+        latencies, logins, shed, errors = run_load(base_url, args.duration, login_threads,
+                                                   args.catalog_threads, args.users)
+        server.terminate()
+        server.join()
+        print(f"{label:<18} {logins / args.duration:>9.1f} {shed:>6} {len(latencies) / args.duration:>10.1f} "
+              f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f} "
+              f"{percentile(latencies, 99) * 1000:>8.1f}" + (f"  ({errors} errors)" if errors else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Measure email outbox throughput (messages/sec) against a local SMTP sink
+
+Starts an aiosmtpd server on localhost in a child process, queues --messages emails in the
+outbox and drains them with --workers outbox threads, each holding one
+SMTP connection open. For comparison it also sends the same number of
+messages with one connection per message, the way the request handlers
+used to. Uses a temporary SQLite database unless --database-url is given.
+
+Requires aiosmtpd (pip install aiosmtpd).
+
+Usage:
+    python scripts/benchmark_outbox.py [--messages 2000] [--workers 4] [--fail-every 0]
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+
+class SinkHandler:
+    """Counts delivered messages and optionally rejects every Nth one"""
+
+    def __init__(self, fail_every=0):
+        self.fail_every = fail_every
+        self.seen = 0
+        self.delivered = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.seen += 1
+        if self.fail_every and self.seen % self.fail_every == 0:
+            return '451 Try again later'
+        self.delivered += 1
+        return '250 OK'
+
+
+def run_sink(port, fail_every, ready, stop):
+    """Serve the SMTP sink in its own process so it does not share the GIL with the workers"""
+    from aiosmtpd.controller import Controller
+
+    controller = Controller(SinkHandler(fail_every), hostname='127.0.0.1', port=port)
+    controller.start()
+    ready.set()
+    stop.wait()
+    controller.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help='reject every Nth message with a 451 to exercise retries')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    try:
+        import aiosmtpd  # noqa: F401
+    except ImportError:
+        print("❌ aiosmtpd is required: pip install aiosmtpd")
+        sys.exit(1)
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    ready, stop = multiprocessing.Event(), multiprocessing.Event()
+    sink = multiprocessing.Process(target=run_sink, args=(port, args.fail_every, ready, stop), daemon=True)
+    sink.start()
+    ready.wait(10)
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'aevi_outbox_bench.db')
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.update({'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': str(port), 'MAIL_USE_TLS': 'false',
+                       'MAIL_DEFAULT_SENDER': 'bench@aevi.local', 'OUTBOX_WORKERS': '0'})
+
+    from flask_mail import Message
+    from app import create_app, db, mail
+    from app.models import OutboxMessage
+    from app.utils.outbox import SENT, OutboxPool, queue_email
+
+    app = create_app()
+    app.config.update(OUTBOX_POLL_INTERVAL=0.05, OUTBOX_BACKOFF_BASE=0.05, OUTBOX_BACKOFF_MAX=0.2)
+
+    with app.app_context():
+        db.create_all()
+        OutboxMessage.query.delete()
+        db.session.commit()
+
+        # Baseline: a new SMTP connection per message
+        baseline_count = min(args.messages, 500)
+        start = time.perf_counter()
+        for i in range(baseline_count):
+            try:
+                mail.send(Message(f'Baseline {i}', recipients=[f'user{i}@example.com'],
+                                  html=f'<p>Hello {i}</p>', sender='bench@aevi.local'))
+            except Exception:
+                pass
+        baseline_rate = baseline_count / (time.perf_counter() - start)
+        print(f"📨 Connection per message: {baseline_rate:.0f} msgs/sec ({baseline_count} messages)")
+
+        start = time.perf_counter()
+        for i in range(args.messages):
+            queue_email(f'Outbox {i}', [f'user{i}@example.com'], html=f'<p>Hello {i}</p>', commit=False)
+        db.session.commit()
+        queued = time.perf_counter() - start
+        print(f"🗃️  Queued {args.messages} messages in {queued * 1000:.0f}ms "
+              f"({queued / args.messages * 1e6:.0f}µs each on the request path)")
+
+    start = time.perf_counter()
+    pool = OutboxPool(app, args.workers).start()
+    with app.app_context():
+        while True:
+            sent = OutboxMessage.query.filter_by(status=SENT).count()
+            db.session.remove()
+            if sent >= args.messages or time.perf_counter() - start > 300:
+                break
+            time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    pool.stop()
+    stop.set()
+    sink.join(5)
+
+    rate = sent / elapsed
+    print(f"📬 Outbox, {args.workers} workers: {rate:.0f} msgs/sec "
+          f"({sent} sent in {elapsed:.2f}s, {pool.failed} failed attempts retried)")
+    print(f"   {rate / baseline_rate:.1f}x the connection-per-message rate")
+    sys.exit(0 if sent == args.messages else 1)
+
+
+if __name__ == '__main__':
+    main()
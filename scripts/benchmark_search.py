@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark full-text product search against the original ILIKE scan
+on a synthetic catalog (100k products by default)
+
+Usage:
+    python scripts/benchmark_search.py [--products 100000] [--repeat 20]
+        [--database-url sqlite:////tmp/aevi_search_bench.db]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+WORDS = [
+    'nordic', 'berry', 'cloudberry', 'lingonberry', 'birch', 'pine', 'oil', 'serum', 'balm',
+    'cream', 'cleanser', 'foam', 'mask', 'toner', 'mist', 'hydrating', 'nourishing', 'gentle',
+    'radiance', 'repair', 'night', 'day', 'eye', 'hand', 'body', 'lotion', 'wash', 'elixir',
+    'vitamin', 'antioxidant', 'organic', 'natural', 'soothing', 'firming', 'glow', 'calm',
+]
+QUERIES = ['oil', 'birch oil', 'nourishing cream', 'cloudberry', 'hand body lotion', 'radia']
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ra', 'su', 'ti', 'vo', 'an', 'el', 'is', 'or']
+
+
+def filler_words(rng, count=3000):
+    """Pseudo-words so that catalog terms are as selective as in real copy"""
+    return [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(count)]
+
+
+def sentence(rng, length, filler=None, ratio=0.1):
+    words = []
+    for _ in range(length):
+        if filler and rng.random() > ratio:
+            words.append(rng.choice(filler))
+        else:
+            words.append(rng.choice(WORDS))
+    return ' '.join(words)
+
+
+def seed_catalog(db, count, rng):
+    """Insert ``count`` synthetic products in batches"""
+    from app.models import Product
+
+    table = Product.__table__
+    filler = filler_words(rng)
+    batch = []
+    for i in range(count):
+        batch.append({
+            'name': sentence(rng, 2, filler, 0.5).title(),
+            'price': round(rng.uniform(10, 150), 2),
+            'category': rng.choice(['Serums & Oils', 'Cleansers & Masks', 'Moisturisers', 'Body']),
+            'short_description': sentence(rng, 8, filler, 0.2),
+            'description': sentence(rng, 40, filler, 0.02),
+            'tags': ', '.join(rng.sample(WORDS, 2)),
+            'rating': round(rng.uniform(3, 5), 1),
+        })
+        if len(batch) == 5000:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+    db.session.commit()
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'aevi_search_bench.db')
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import create_app, db
+    from app.models import Product
+    from app.routes.product_routes import _ilike_search
+    from app.utils import search
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"🌱 Seeding {args.products} products...")
+        seed_catalog(db, args.products, random.Random(42))
+        search.ensure_search_index(db.engine)
+
+        def full_text(query):
+            ids, _ = search.ranked_ids(db.session, query, 20)
+            Product.query.filter(Product.id.in_(ids)).all()
+
+        print(f"\n{'query':<20} {'ILIKE p50':>10} {'ILIKE max':>10} {'FTS p50':>10} {'FTS max':>10}")
+        for query in QUERIES:
+            ilike_p50, ilike_max = time_calls(lambda: _ilike_search(query).limit(20).all(), args.repeat)
+            fts_p50, fts_max = time_calls(lambda: full_text(query), args.repeat)
+            print(f"{query:<20} {ilike_p50:>8.2f}ms {ilike_max:>8.2f}ms {fts_p50:>8.2f}ms {fts_max:>8.2f}ms")
+
+        # Deep paging: offset-free cursors keep late pages as cheap as the first
+        start = time.perf_counter()
+        cursor, pages = None, 0
+        while pages < 50:
+            ids, cursor = search.ranked_ids(db.session, 'oil', 20, cursor)
+            pages += 1
+            if not cursor:
+                break
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"\n📄 {pages} pages of 'oil' via cursor: {elapsed / pages:.2f}ms per page")
+
+
+if __name__ == '__main__':
+    main()
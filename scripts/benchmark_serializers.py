@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks: ORM + to_dict() versus column rows + compiled serializers
+
+For Product, CartItem, Wishlist, Lead and Newsletter, times loading every
+row of a synthetic table and turning it into dicts: full ORM instances
+with ``to_dict()`` (cart and wishlist lines eager-load their product, as
+the cart API does) against ``app.utils.serializers``. Also times JSON
+encoding of the result with the stdlib provider and with orjson. Both
+paths are checked to produce identical dicts. Uses a temporary SQLite
+database.
+
+Usage:
+    python scripts/benchmark_serializers.py [--rows 5000] [--repeat 7]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+WORDS = ['nordic', 'cloudberry', 'birch', 'pine', 'oil', 'serum', 'balm', 'cream', 'cleanser',
+         'mask', 'toner', 'hydrating', 'nourishing', 'gentle', 'radiance', 'repair', 'night']
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed(db, rows, rng):
+    from app.models import CartItem, Lead, Newsletter, Product, Wishlist
+
+    start = datetime(2024, 1, 1)
+    db.session.execute(Product.__table__.insert(), [{
+        'name': sentence(rng, 3).title(), 'price': round(rng.uniform(10, 150), 2),
+        'category': rng.choice(['Serums & Oils', 'Moisturisers', 'Body']),
+        'short_description': sentence(rng, 12), 'description': sentence(rng, 60),
+        'ingredients': sentence(rng, 20), 'tags': ','.join(rng.sample(WORDS, 4)),
+        'rating': round(rng.uniform(3, 5), 1), 'review_count': rng.randint(0, 400),
+        'is_bestseller': rng.random() < 0.2, 'is_new': rng.random() < 0.1, 'in_stock': True,
+        'created_at': start + timedelta(minutes=i),
+    } for i in range(rows)])
+    db.session.execute(CartItem.__table__.insert(), [{
+        'session_id': f'session-{i // 4}', 'product_id': i % rows + 1, 'quantity': rng.randint(1, 3),
+        'size': rng.choice([None, '30ml', '50ml']), 'created_at': start + timedelta(seconds=i),
+    } for i in range(rows)])
+    db.session.execute(Wishlist.__table__.insert(), [{
+        'user_id': i // 8 + 1, 'product_id': i % rows + 1, 'created_at': start + timedelta(seconds=i),
+    } for i in range(rows)])
+    db.session.execute(Lead.__table__.insert(), [{
+        'name': sentence(rng, 2).title(), 'email': f'lead{i}@example.com', 'message': sentence(rng, 40),
+        'phone': f'+46 70 {i:07d}', 'subject': sentence(rng, 4), 'created_at': start + timedelta(seconds=i),
+    } for i in range(rows)])
+    db.session.execute(Newsletter.__table__.insert(), [{
+        'email': f'reader{i}@example.com', 'subscribed_at': start + timedelta(seconds=i), 'is_active': i % 9 != 0,
+    } for i in range(rows)])
+    db.session.commit()
+
+
+def best_of(repeat, fn):
+    from app import db
+
+    timings = []
+    result = None
+    for _ in range(repeat):
+        db.session.remove()  # a fresh session, as each request gets
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='Rows per table')
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), 'aevi_serializer_bench.db')
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('MAIL_PORT', '25')
+
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy.orm import joinedload
+
+    from app import create_app, db
+    from app.models import CartItem, Lead, Newsletter, Product, Wishlist
+    from app.utils import serializers
+
+    app = create_app()
+    cases = [
+        ('Product', lambda: Product.query, serializers.PRODUCT),
+        ('CartItem', lambda: CartItem.query.options(joinedload(CartItem.product)), serializers.CART_ITEM),
+        ('Wishlist', lambda: Wishlist.query.options(joinedload(Wishlist.product)), serializers.WISHLIST),
+        ('Lead', lambda: Lead.query, serializers.LEAD),
+        ('Newsletter', lambda: Newsletter.query, serializers.NEWSLETTER),
+    ]
+
+    with app.app_context():
+        db.create_all()
+        seed(db, args.rows, random.Random(42))
+
+        stdlib = DefaultJSONProvider(app)
+        fast = serializers.OrjsonProvider(app) if serializers.orjson is not None else None
+        print(f"⏱️  {args.rows} rows per model, best of {args.repeat}"
+              + ('' if fast else ' (orjson not installed: no orjson column)'))
+        print(f"\n{'model':<11} {'ORM+to_dict':>12} {'rows':>9} {'speedup':>8} {'json':>9} {'orjson':>9}")
+        for name, base_query, serializer in cases:
+            orm_time, expected = best_of(args.repeat, lambda: [obj.to_dict() for obj in base_query().all()])
+            rows_time, actual = best_of(args.repeat, lambda: serializer.all(base_query()))
+            by_id = {item['id']: item for item in expected}
+            if len(actual) != len(expected) or any(by_id.get(item['id']) != item for item in actual):
+                sys.exit(f'❌ {name}: serializer output differs from to_dict()')
+
+            json_time, _ = best_of(args.repeat, lambda: stdlib.dumps(actual))
+            line = (f"{name:<11} {orm_time * 1000:>10.1f}ms {rows_time * 1000:>7.1f}ms "
+                    f"{orm_time / rows_time:>7.1f}x {json_time * 1000:>7.1f}ms")
+            if fast is not None:
+                orjson_time, _ = best_of(args.repeat, lambda: fast.dumps(actual))
+                line += f" {orjson_time * 1000:>7.1f}ms"
+            print(line)
+        print("\n✅ Serializer output matches to_dict() for every model")
+
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import time, time to first request and per-worker memory
+
+1. Imports the app and calls create_app() in fresh interpreters, as the
+   ``flask`` CLI does and as a gunicorn worker does (SERVER_MODE, which
+   skips Flask-Migrate, Alembic and the CLI command modules), and reports
+   the median of --runs.
+2. Starts gunicorn with gunicorn.conf.py twice, with and without
+   ``--preload``, and measures the time from launching it to the first
+   successful response and until every worker has booted.
+3. Sends --requests requests per worker, then reads each process's
+   /proc/<pid>/smaps_rollup: RSS, USS (memory only that process uses) and
+   PSS (shared pages split between the processes sharing them). The total
+   PSS is what the server really costs; preloading with gc.freeze() should
+   lower worker USS and the total.
+
+Linux only (/proc). Runs against a seeded temporary SQLite database unless
+--database-url is given.
+
+Usage:
+    python scripts/benchmark_startup.py [--workers 4] [--runs 5] [--requests 200]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmark_load import seed  # noqa: E402
+
+IMPORT_PROBE = """
+import resource, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(imported - start, created - imported, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+PATHS = ['/', '/shop', '/api/products/', '/api/products/filter?category=body&sort=price-low',
+         '/api/products/search?q=birch', '/api/products/bestsellers']
+
+
+def measure_imports(env, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], env=env, cwd=project_root,
+                                capture_output=True, text=True, check=True).stdout.split()
+        samples.append([float(value) for value in output[-3:]])
+    import_s, create_s, max_rss_kb = (statistics.median(column) for column in zip(*samples))
+    return import_s * 1000, create_s * 1000, max_rss_kb / 1024
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory(pid):
+    """RSS, USS and PSS of a process in MB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    uss = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return fields.get('Rss', 0) / 1024, uss / 1024, fields.get('Pss', 0) / 1024
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        response.read()
+        return response.status
+
+
+def drive(base_url, total, products):
+    rng = random.Random(total)
+    paths = [rng.choice(PATHS + [f'/product/{rng.randint(1, products)}']) for _ in range(total)]
+    errors = []
+
+    def worker(chunk):
+        for path in chunk:
+            try:
+                fetch(base_url + path)
+            except (urllib.error.URLError, OSError) as e:
+                errors.append(f'{path}: {e}')
+
+    threads = [threading.Thread(target=worker, args=(paths[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def measure_server(env, preload, workers, requests, products):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(env, GUNICORN_BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers),
+               GUNICORN_PRELOAD='true' if preload else 'false')
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], env=env,
+                              cwd=project_root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first_response = booted = None
+        while time.perf_counter() - start < 60 and (first_response is None or booted is None):
+            if server.poll() is not None:
+                sys.exit(f'❌ gunicorn exited with {server.returncode}')
+            if booted is None and len(children(server.pid)) == workers:
+                booted = time.perf_counter() - start
+            if first_response is None:
+                try:
+                    if fetch(base_url + '/api/products/') == 200:
+                        first_response = time.perf_counter() - start
+                except (urllib.error.URLError, OSError):
+                    pass
+            time.sleep(0.005)
+        if first_response is None:
+            sys.exit('❌ gunicorn did not answer within 60s')
+
+        errors = drive(base_url, requests * workers, products)
+        time.sleep(0.5)
+        master = memory(server.pid)
+        worker_memory = [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.terminate()
+        server.wait(30)
+    return {
+        'first_response_ms': first_response * 1000,
+        'booted_ms': (booted or 0) * 1000,
+        'master_rss': master[0],
+        'worker_rss': statistics.mean(m[0] for m in worker_memory),
+        'worker_uss': statistics.mean(m[1] for m in worker_memory),
+        'total_pss': master[2] + sum(m[2] for m in worker_memory),
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per import measurement')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per worker before reading memory')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--database-url', help='Use this database instead of a temporary SQLite file')
+    args = parser.parse_args()
+
+    path = None
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'aevi_startup_bench.db')
+        if os.path.exists(path):
+            os.remove(path)
+        database_url = f'sqlite:///{path}'
+    env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark'),
+               MAIL_PORT=os.environ.get('MAIL_PORT', '25'), METRICS_DIR='', PYTHONPATH=project_root)
+    env.pop('SERVER_MODE', None)
+
+    context = multiprocessing.get_context('spawn')
+    seeder = context.Process(target=seed, args=(env, 10, args.products))
+    seeder.start()
+    seeder.join()
+    if seeder.exitcode != 0:
+        sys.exit('❌ Seeding the database failed')
+
+    try:
+        print(f"🚀 {args.runs} runs each, {os.cpu_count()} CPUs, Python {sys.version.split()[0]}\n")
+        print(f"{'create_app()':<24} {'import ms':>10} {'create ms':>10} {'max RSS MB':>11}")
+        for label, mode in (('CLI', 'false'), ('server (SERVER_MODE)', 'true')):
+            import_ms, create_ms, max_rss = measure_imports(dict(env, SERVER_MODE=mode), args.runs)
+            print(f"{label:<24} {import_ms:>10.0f} {create_ms:>10.0f} {max_rss:>11.1f}")
+
+        print(f"\n🦄 gunicorn, {args.workers} workers, {args.requests} requests per worker")
+        print(f"{'':<10} {'first resp ms':>13} {'booted ms':>10} {'master RSS':>11} {'worker RSS':>11} "
+              f"{'worker USS':>11} {'total PSS':>10} {'errors':>7}")
+        for label, preload in (('no preload', False), ('preload', True)):
+            result = measure_server(env, preload, args.workers, args.requests, args.products)
+            print(f"{label:<10} {result['first_response_ms']:>13.0f} {result['booted_ms']:>10.0f} "
+                  f"{result['master_rss']:>11.1f} {result['worker_rss']:>11.1f} {result['worker_uss']:>11.1f} "
+                  f"{result['total_pss']:>10.1f} {result['errors']:>7}")
+        print("\nMemory in MB. USS: pages only that worker uses; PSS: shared pages split between processes.")
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
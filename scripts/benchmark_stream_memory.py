@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Measure peak RSS of unpaged product listings, buffered versus streamed
+
+For each catalog size, seeds a temporary SQLite database and requests
+GET /api/products/ and GET /api/products/filter?sort=price-low in both
+modes (``stream=0`` / ``stream=1``). Every request runs in a fresh
+interpreter; peak RSS is the high-water mark of that process during the
+request, minus its resident size right before it. The response body is
+consumed chunk by chunk and never kept, as a WSGI server would.
+
+Usage:
+    python scripts/benchmark_stream_memory.py [--sizes 10,10000,100000] [--batch 500]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+WORDS = ['nordic', 'cloudberry', 'birch', 'pine', 'oil', 'serum', 'balm', 'cream', 'cleanser',
+         'mask', 'toner', 'hydrating', 'nourishing', 'gentle', 'radiance', 'repair', 'night']
+ENDPOINTS = [
+    ('products', '/api/products/'),
+    ('filter', '/api/products/filter?sort=price-low'),
+]
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed(env, count):
+    """Runs in its own interpreter: Config reads DATABASE_URL once, at import"""
+    os.environ.update(env)
+    from app import create_app, db
+    from app.models import Product
+
+    rng = random.Random(count)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        table = Product.__table__
+        for start in range(0, count, 5000):
+            db.session.execute(table.insert(), [{
+                'name': sentence(rng, 3).title(),
+                'price': round(rng.uniform(10, 150), 2),
+                'category': rng.choice(['Serums & Oils', 'Cleansers & Masks', 'Moisturisers', 'Body']),
+                'short_description': sentence(rng, 12),
+                'description': sentence(rng, 60),
+                'ingredients': sentence(rng, 20),
+                'how_to_use': sentence(rng, 15),
+                'tags': ','.join(rng.sample(WORDS, 4)),
+                'rating': round(rng.uniform(3, 5), 1),
+                'review_count': rng.randint(0, 400),
+            } for _ in range(start, min(count, start + 5000))])
+        db.session.commit()
+
+
+def rss_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak():
+    """Reset VmHWM to the current RSS (Linux 4.0+); returns False where that is unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def measure(env, url, results):
+    os.environ.update(env)
+    from app import create_app
+
+    app = create_app()
+    client = app.test_client()
+    client.get('/api/products/?fields=id&limit=1')  # import and connect before measuring
+
+    reset_peak()
+    before = rss_kb('VmRSS')
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - start
+    results.put((rss_kb('VmHWM') - before, size, first_byte or elapsed, elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,10000,100000', help='Comma-separated catalog sizes')
+    parser.add_argument('--batch', type=int, default=500, help='CATALOG_STREAM_BATCH')
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/status'):
+        sys.exit('❌ This benchmark reads peak RSS from /proc and needs Linux')
+
+    context = multiprocessing.get_context('spawn')
+    print(f"📊 Peak RSS per request (stream batch {args.batch})")
+    print(f"\n{'products':>9} {'endpoint':<9} {'mode':<9} {'peak RSS':>10} {'body':>10} {'first byte':>11} {'total':>9}")
+    for count in [int(size) for size in args.sizes.split(',')]:
+        path = os.path.join(tempfile.gettempdir(), f'aevi_stream_bench_{count}.db')
+        if os.path.exists(path):
+            os.remove(path)
+        env = {'DATABASE_URL': f'sqlite:///{path}', 'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark'),
+               'MAIL_PORT': os.environ.get('MAIL_PORT', '25'), 'CATALOG_STREAM_BATCH': str(args.batch)}
+        seeder = context.Process(target=seed, args=(env, count))
+        seeder.start()
+        seeder.join()
+
+        for label, url in ENDPOINTS:
+            for mode in ('buffered', 'streamed'):
+                results = context.Queue()
+                separator = '&' if '?' in url else '?'
+                worker = context.Process(target=measure, args=(
+                    env, f"{url}{separator}stream={int(mode == 'streamed')}", results))
+                worker.start()
+                worker.join()
+                if worker.exitcode != 0:
+                    sys.exit(f'❌ {url} failed in mode {mode}')
+                peak, size, first_byte, elapsed = results.get()
+                print(f"{count:>9} {label:<9} {mode:<9} {peak / 1024:>8.1f}MB {size / 1048576:>8.1f}MB "
+                      f"{first_byte * 1000:>9.0f}ms {elapsed * 1000:>7.0f}ms")
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
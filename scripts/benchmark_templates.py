@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+First-render benchmark for the Jinja bytecode cache
+
+Every measurement runs in a fresh interpreter, like a new worker after a
+deploy or a recycle, in three setups:
+
+    no cache      TEMPLATE_CACHE_ENABLED=false: every template is compiled
+    precompiled   after `flask templates compile`: loaded from the bytecode cache
+    preloaded     precompiled, and every template loaded before the first
+                  request, as a preloading gunicorn master does before forking
+
+It reports the time to load each of the heaviest templates on its own,
+then the latency of the first request to each page and of a repeat request
+(already compiled in memory), as the median of --runs processes. Runs
+against a seeded temporary SQLite database.
+
+Usage:
+    python scripts/benchmark_templates.py [--runs 7]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmark_load import seed  # noqa: E402
+
+TEMPLATES = ['index.html', 'shop.html', 'product-detail.html', 'base.html', 'navbar.html', 'footer.html']
+PAGES = ['/', '/shop', '/product/1', '/about']
+SETUPS = ['no cache', 'precompiled', 'preloaded']
+
+
+def environment(env, setup):
+    return dict(env, TEMPLATE_CACHE_ENABLED='false' if setup == 'no cache' else 'true')
+
+
+def compile_all(env, results):
+    """Runs in its own interpreter: Config reads the environment once, at import"""
+    os.environ.update(env)
+    from app import create_app, template_cache
+    from app.utils.template_cache import compile_templates
+
+    app = create_app()
+    errors = compile_templates(app.jinja_env, template_cache.cache, template_cache.directory, clean=True)
+    results.put(sorted(errors))
+
+
+def load_templates(env, results):
+    os.environ.update(env)
+    from app import create_app
+
+    env = create_app().jinja_env
+    timings = {}
+    for name in TEMPLATES:
+        start = time.perf_counter()
+        env.get_template(name)
+        timings[name] = (time.perf_counter() - start) * 1000
+    results.put(timings)
+
+
+def first_requests(env, preload, results):
+    os.environ.update(env)
+    from app import create_app, template_cache
+
+    app = create_app()
+    if preload:
+        template_cache.warm(app)
+    client = app.test_client()
+    timings = {}
+    for path in PAGES + ['/']:
+        start = time.perf_counter()
+        response = client.get(path)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise SystemExit(f'{path}: {response.status_code}')
+        timings['repeat /' if path in timings else path] = elapsed
+    results.put(timings)
+
+
+def run(context, target, *args):
+    results = context.Queue()
+    worker = context.Process(target=target, args=args + (results,))
+    worker.start()
+    result = results.get(timeout=120)
+    worker.join()
+    if worker.exitcode != 0:
+        sys.exit(f'❌ {target.__name__} failed')
+    return result
+
+
+def median(samples):
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7, help='Fresh processes per measurement')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='aevi_templates_')
+    env = {
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'benchmark'), 'MAIL_PORT': os.environ.get('MAIL_PORT', '25'),
+        'TEMPLATE_CACHE_DIR': os.path.join(directory, 'jinja_cache'),
+        # Render every request instead of serving it from the page cache
+        'PAGE_CACHE_ENABLED': 'false', 'METRICS_ENABLED': 'false',
+    }
+    context = multiprocessing.get_context('spawn')
+    try:
+        seeder = context.Process(target=seed, args=(env, 1, 50))
+        seeder.start()
+        seeder.join()
+        if seeder.exitcode != 0:
+            sys.exit('❌ Seeding the database failed')
+        errors = run(context, compile_all, environment(env, 'precompiled'))
+        if errors:
+            sys.exit(f"❌ Templates failed to compile: {', '.join(errors)}")
+
+        loads = {setup: median([run(context, load_templates, environment(env, setup)) for _ in range(args.runs)])
+                 for setup in SETUPS[:2]}
+        pages = {setup: median([run(context, first_requests, environment(env, setup), setup == 'preloaded')
+                                for _ in range(args.runs)])
+                 for setup in SETUPS}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    templates_dir = os.path.join(project_root, 'app', 'templates')
+    print(f"📄 Loading one template in a fresh process, median of {args.runs} (ms)\n")
+    print(f"{'template':<22} {'KB':>6} {'compile':>9} {'bytecode':>9}")
+    for name in TEMPLATES:
+        size = os.path.getsize(os.path.join(templates_dir, name)) / 1024
+        print(f"{name:<22} {size:>6.1f} {loads['no cache'][name]:>9.2f} {loads['precompiled'][name]:>9.2f}")
+
+    print(f"\n🌐 First requests in a fresh process, median of {args.runs} (ms)\n")
+    print(f"{'request':<14}" + ''.join(f'{setup:>13}' for setup in SETUPS))
+    for path in PAGES + ['repeat /']:
+        print(f"{path:<14}" + ''.join(f'{pages[setup][path]:>13.1f}' for setup in SETUPS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Check that the cart endpoints run a fixed number of SQL statements,
+however many lines the cart has
+
+Fills carts with 1, 5 and 50 lines, for a signed-in user and for a guest
+session, and counts the statements GET /api/cart/ and the /cart page run.
+Exits non-zero if a count grows with the number of lines (an N+1 query).
+
+Runs against a temporary SQLite database unless --database-url is given.
+
+Usage:
+    python scripts/check_cart_queries.py [--database-url URL]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+LINE_COUNTS = [1, 5, 50]
+PATHS = ['/api/cart/', '/cart']
+SIZES = [None, '30ml', '50ml']
+
+
+def seed(db, products):
+    from app.models import Product, User
+    from app.utils.passwords import hash_password
+
+    db.session.execute(Product.__table__.insert(), [
+        {'name': f'Cart Product {i}', 'price': 10.0 + i, 'category': 'Body', 'in_stock': True}
+        for i in range(products)
+    ])
+    db.session.execute(User.__table__.insert(), [
+        {'email': f'cart{count}@example.com', 'password_hash': hash_password('password123')}
+        for count in LINE_COUNTS
+    ])
+    db.session.commit()
+
+
+def fill_cart(db, lines, user_id=None, session_id=None):
+    from sqlalchemy import select
+    from app.models import CartItem, Product
+
+    product_ids = db.session.scalars(select(Product.id).order_by(Product.id).limit(lines)).all()
+    db.session.execute(CartItem.__table__.insert(), [
+        {'user_id': user_id, 'session_id': session_id, 'product_id': product_id,
+         'size': SIZES[i % len(SIZES)], 'quantity': i % 3 + 1}
+        for i, product_id in enumerate(product_ids)
+    ])
+    db.session.commit()
+
+
+class Counter:
+    """Counts the statements every engine runs"""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def measure(counter, client, path):
+    # The first request warms per-process caches (catalog version, templates)
+    client.get(path)
+    counter.count = 0
+    response = client.get(path)
+    if response.status_code != 200:
+        sys.exit(f"❌ {path}: {response.status_code}")
+    return counter.count, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'aevi_cart_queries.db')
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'check')
+    os.environ.setdefault('MAIL_PORT', '25')
+    # Keep the catalog version check from landing in a measured request
+    os.environ['CATALOG_CACHE_CHECK_INTERVAL'] = '3600'
+    os.environ['METRICS_ENABLED'] = 'false'
+
+    from app import create_app, db
+    from app.models import CartItem, User
+
+    app = create_app()
+    with app.app_context():
+        if not args.database_url:
+            db.create_all()
+        emails = [f'cart{count}@example.com' for count in LINE_COUNTS]
+        if db.session.query(User.id).filter(User.email.in_(emails)).count() != len(emails):
+            seed(db, max(LINE_COUNTS))
+        CartItem.query.filter(
+            CartItem.user_id.in_(db.session.query(User.id).filter(User.email.in_(emails)))
+            | CartItem.session_id.like('cart-check-%')
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        owners = {}
+        for count in LINE_COUNTS:
+            user_id = db.session.query(User.id).filter_by(email=f'cart{count}@example.com').scalar()
+            fill_cart(db, count, user_id=user_id)
+            fill_cart(db, count, session_id=f'cart-check-{count}')
+            owners[count] = (user_id, f'cart-check-{count}')
+        counter = Counter(db.engines.values())
+
+    counts = {}
+    for count in LINE_COUNTS:
+        user_id, session_id = owners[count]
+        for owner in ('user', 'guest'):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                if owner == 'user':
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+                else:
+                    session['cart_session_id'] = session_id
+            for path in PATHS:
+                counts[owner, path, count], response = measure(counter, client, path)
+                if response.is_json and len(response.get_json()) != count:
+                    sys.exit(f"❌ {owner} {path}: expected {count} lines, got {len(response.get_json())}")
+
+    failed = False
+    print(f"{'owner':<7} {'path':<12}" + ''.join(f'{f"{count} lines":>10}' for count in LINE_COUNTS))
+    for owner in ('user', 'guest'):
+        for path in PATHS:
+            row = [counts[owner, path, count] for count in LINE_COUNTS]
+            grows = max(row) > row[0]
+            failed = failed or grows
+            print(f"{owner:<7} {path:<12}" + ''.join(f'{value:>10}' for value in row) + ('  ❌' if grows else '  ✅'))
+
+    if failed:
+        sys.exit("\n❌ The statement count grows with the number of cart lines")
+    print("\n✅ The cart runs the same number of statements for 1 and 50 lines")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Check that a catalog re-import only writes the columns its file has
+
+Imports products with every flag and counter set away from the model
+defaults, then re-imports the same SKUs from a file with only sku, name
+and price (plus one new SKU). Exits non-zero unless the name and price
+changed, every omitted column kept its value and the new product got the
+model defaults.
+
+Runs against a temporary SQLite database (the executemany upsert) unless
+--database-url is given; a PostgreSQL URL exercises the COPY merge.
+
+Usage:
+    python scripts/check_catalog_import.py [--database-url URL]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import uuid
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+FULL_COLUMNS = ['sku', 'name', 'price', 'category', 'is_bestseller', 'is_new', 'rating', 'review_count',
+                'in_stock']
+PARTIAL_COLUMNS = ['sku', 'name', 'price']
+OMITTED = [name for name in FULL_COLUMNS if name not in PARTIAL_COLUMNS]
+
+
+def write_file(directory, name, columns, rows):
+    path = os.path.join(directory, name)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='aevi_import_')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(directory, 'import.db')}"
+    os.environ.setdefault('SECRET_KEY', 'check')
+    os.environ.setdefault('MAIL_PORT', '25')
+    os.environ['METRICS_ENABLED'] = 'false'
+
+    from app import create_app, db
+    from app.models import Product
+    from app.utils.catalog_import import import_catalog
+
+    # Unique SKUs, so an existing --database-url catalog is left alone
+    prefix = f'check-{uuid.uuid4().hex[:8]}'
+    full = [{'sku': f'{prefix}-{i}', 'name': f'Full {i}', 'price': 10 + i, 'category': 'Body',
+             'is_bestseller': 'true', 'is_new': 'true', 'rating': 4.5, 'review_count': 40 + i, 'in_stock': 'false'}
+            for i in range(5)]
+    partial = [{'sku': row['sku'], 'name': f"Renamed {row['name']}", 'price': row['price'] + 1} for row in full]
+    partial.append({'sku': f'{prefix}-new', 'name': 'New', 'price': 99})
+
+    app = create_app()
+    failures = []
+    with app.app_context():
+        if not args.database_url:
+            db.create_all()
+        try:
+            import_catalog(write_file(directory, 'full.csv', FULL_COLUMNS, full))
+            before = {p.sku: p for p in Product.query.filter(Product.sku.like(f'{prefix}-%'))}
+            before = {sku: {name: getattr(p, name) for name in FULL_COLUMNS} for sku, p in before.items()}
+            db.session.expire_all()
+
+            importer = import_catalog(write_file(directory, 'partial.csv', PARTIAL_COLUMNS, partial))
+            after = {p.sku: p for p in Product.query.filter(Product.sku.like(f'{prefix}-%'))}
+
+            if (importer.inserted, importer.updated) != (1, len(full)):
+                failures.append(f're-import counted {importer.inserted} inserted, {importer.updated} updated')
+            for row in partial[:-1]:
+                product = after[row['sku']]
+                if (product.name, product.price) != (row['name'], float(row['price'])):
+                    failures.append(f"{row['sku']}: name/price not updated")
+                for name in OMITTED:
+                    if getattr(product, name) != before[row['sku']][name]:
+                        failures.append(f"{row['sku']}: {name} changed from {before[row['sku']][name]!r} "
+                                        f"to {getattr(product, name)!r}")
+            new = after.get(f'{prefix}-new')
+            if new is None:
+                failures.append('the new SKU was not inserted')
+            else:
+                for name in ('is_bestseller', 'is_new', 'rating', 'review_count', 'in_stock'):
+                    default = Product.__table__.c[name].default.arg
+                    if getattr(new, name) != default:
+                        failures.append(f'new product: {name} is {getattr(new, name)!r}, not the default {default!r}')
+        finally:
+            Product.query.filter(Product.sku.like(f'{prefix}-%')).delete(synchronize_session=False)
+            db.session.commit()
+
+    dialect = 'PostgreSQL COPY merge' if os.environ['DATABASE_URL'].startswith('postgresql') else 'SQLite upsert'
+    if failures:
+        for failure in failures:
+            print(f'❌ {failure}')
+        sys.exit(1)
+    print(f'✅ {dialect}: a partial re-import left {len(OMITTED)} omitted columns unchanged')
+
+
+if __name__ == '__main__':
+    main()
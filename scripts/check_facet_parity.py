@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Check that the in-memory facet index answers /api/products/filter exactly
+like the SQL path, for every combination of the filter parameters
+
+Runs against a synthetic catalog (with NULLs, duplicate prices and names,
+boundary prices, and names and categories in mixed case and with accents,
+which a database collation orders differently from Python) in a temporary
+SQLite database unless --database-url is given. Also pages through the
+name sort while the cursor's product is renamed. Exits non-zero on the
+first mismatch.
+
+Usage:
+    python scripts/check_facet_parity.py [--products 500] [--database-url URL]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+CATEGORIES = ['Serums & Oils', 'Cleansers & Masks', 'Balms', 'Treatments', 'Body', 'Hand & Body', 'BODY',
+              'Crème & Bálms', 'CRÈME & BÁLMS', None]
+CATEGORY_PARAMS = [None, 'all', 'bestsellers', 'new-in', 'serums-oils', 'cleansers-masks', 'balms',
+                   'treatments', 'body', 'hand-body', 'missing', 'b_lms', '%', 'crème-bálms', 'b\\dy']
+SORTS = [None, 'price-low', 'price-high', 'rating', 'newest', 'name', 'unknown']
+PRICES = [(None, None), (25, None), (None, 50), (25, 50), (50, 50), (200, 10)]
+STOCK = [None, '1', '']
+NAMES = ['Oil', 'Balm', 'Serum', 'Mask', 'Wash', 'balm', 'élixir', 'Éclat', 'Öl', 'oil-free', 'Oil Free']
+
+
+def seed_catalog(db, count, rng):
+    from app.models import Product
+
+    now = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        rows.append({
+            'name': rng.choice(NAMES) + ' ' + str(rng.randint(1, count // 3 + 1)),
+            'price': rng.choice([10.0, 24.99, 25.0, 39.5, 50.0, 75.0, 100.0, 120.0]),
+            'category': rng.choice(CATEGORIES),
+            'is_bestseller': rng.choice([True, False, None]),
+            'is_new': rng.choice([True, False]),
+            'in_stock': rng.choice([True, True, False, None]),
+            'rating': rng.choice([None, 0.0, 4.5, 4.8, 5.0]),
+            'created_at': now + timedelta(hours=rng.randint(0, count // 2)),
+        })
+    db.session.execute(Product.__table__.insert(), rows)
+    db.session.commit()
+
+
+def fetch(client, app, engine_enabled, params):
+    app.config['FACET_ENGINE_ENABLED'] = engine_enabled
+    query = {key: value for key, value in params.items() if value is not None}
+    response = client.get('/api/products/filter', query_string=query)
+    return response.status_code, response.get_json()
+
+
+def walk_pages(client, app, engine_enabled, params):
+    items, cursor = [], None
+    while True:
+        page_params = dict(params, limit=7, cursor=cursor)
+        status, body = fetch(client, app, engine_enabled, page_params)
+        if status != 200:
+            return status, body
+        items.extend(body['items'])
+        cursor = body['next_cursor']
+        if not cursor:
+            return status, items
+
+
+def check_renamed_cursor(client, app):
+    """A name cursor whose product was renamed since is answered from the database"""
+    from app import catalog_cache, db
+    from app.models import Product
+
+    params = {'sort': 'name', 'limit': 7}
+    status, body = fetch(client, app, True, params)
+    last_id = body['items'][-1]['id']
+    with app.app_context():
+        product = db.session.get(Product, last_id)
+        original = product.name
+        product.name = 'Renamed ' + original
+        db.session.commit()
+    catalog_cache.invalidate()
+    try:
+        cursor_params = dict(params, cursor=body['next_cursor'])
+        expected = fetch(client, app, False, cursor_params)
+        actual = fetch(client, app, True, cursor_params)
+    finally:
+        with app.app_context():
+            db.session.get(Product, last_id).name = original
+            db.session.commit()
+        catalog_cache.invalidate()
+    if expected != actual:
+        print(f"❌ Mismatch after renaming the cursor's product {last_id}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'aevi_facet_parity.db')
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        if not args.database_url:
+            db.create_all()
+            seed_catalog(db, args.products, random.Random(7))
+
+    client = app.test_client()
+    checked = 0
+    for category, sort, (min_price, max_price), in_stock in itertools.product(CATEGORY_PARAMS, SORTS, PRICES, STOCK):
+        params = {'category': category, 'sort': sort, 'min_price': min_price,
+                  'max_price': max_price, 'in_stock': in_stock}
+        for mode in ('list', 'fields', 'pages'):
+            if mode == 'pages':
+                expected = walk_pages(client, app, False, params)
+                actual = walk_pages(client, app, True, params)
+            else:
+                mode_params = dict(params, fields='name,price,rating' if mode == 'fields' else None)
+                expected = fetch(client, app, False, mode_params)
+                actual = fetch(client, app, True, mode_params)
+            checked += 1
+            if expected != actual:
+                print(f"❌ Mismatch ({mode}) for {params}")
+                print(f"   SQL:   {expected[0]} {[item['id'] for item in expected[1]][:20]}")
+                print(f"   Index: {actual[0]} {[item['id'] for item in actual[1]][:20]}")
+                sys.exit(1)
+
+    check_renamed_cursor(client, app)
+    print(f"✅ {checked} filter combinations and a renamed name cursor match the SQL path")
+
+
+if __name__ == '__main__':
+    main()
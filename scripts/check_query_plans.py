@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Check that every hot lookup is answered from an index
+
+Builds a database through the migrations (``flask db upgrade``), then runs
+EXPLAIN on the queries behind the catalog listings, product pages, cart,
+wishlist, sign-in and newsletter routes. Fails if any of them reads a
+table with a sequential scan (SQLite ``SCAN <table>`` without an index,
+PostgreSQL ``Seq Scan``), or if a paged listing sorts its rows instead of
+walking an index in ORDER BY order.
+
+SQLite always runs, in a temporary database. Pass --postgres with the URL
+of an empty, disposable PostgreSQL database to check it too; there the
+planner runs with ``enable_seqscan = off``, so a sequential scan in the
+plan means no usable index exists, not that the table is small.
+
+Usage:
+    python scripts/check_query_plans.py [--postgres postgresql://localhost/aevi_plans]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def hot_queries():
+    """``(name, statement, paged)`` for the queries the routes run on every request"""
+    from app import db
+    from app.models import CartItem, Newsletter, Product, User, Wishlist
+    from app.models.user import email_equals
+    from app.utils.pagination import encode_cursor, keyset_filter, keyset_order
+    from app.utils.serializers import CART_ITEM, PRODUCT, WISHLIST
+
+    line_total = Product.price * CartItem.quantity
+    nulls_low = db.engine.dialect.name != 'postgresql'
+
+    def cart(owner):
+        return (CART_ITEM.query()
+                .add_columns(line_total.label('line_total'), db.func.sum(line_total).over().label('cart_total'))
+                .filter(owner).order_by(CartItem.id))
+
+    def page(column, descending, cursor=None):
+        query = Product.query
+        if cursor is not None:
+            query = query.filter(keyset_filter(column, Product.id, encode_cursor(*cursor), descending,
+                                               nulls_low=nulls_low))
+        return PRODUCT.query(query.order_by(*keyset_order(column, Product.id, descending))).limit(25)
+
+    queries = [
+        ('product detail', Product.query.filter(Product.id == 1)),
+        ('product by sku', Product.query.filter_by(sku='AEVI-TONING-MIST')),
+        ('category listing', PRODUCT.query(Product.query.filter_by(category='Body'))),
+        ('bestsellers', PRODUCT.query(Product.query.filter_by(is_bestseller=True))),
+        ('new products', PRODUCT.query(Product.query.filter_by(is_new=True))),
+        ('page by name', page(Product.name, False)),
+        ('page by price', page(Product.price, False)),
+        ('page by price, descending', page(Product.price, True)),
+        ('next page by price', page(Product.price, False, (39.5, 10))),
+        ('page by rating', page(Product.rating, True)),
+        ('page by newest', page(Product.created_at, True)),
+        ('next page by newest', page(Product.created_at, True, (datetime(2024, 1, 1).isoformat(), 10))),
+        ('guest cart', cart(CartItem.session_id == 'session-1')),
+        ('user cart', cart(CartItem.user_id == 1)),
+        ('wishlist', WISHLIST.query(Wishlist.query.filter_by(user_id=1))),
+        ('wishlists of a product', Wishlist.query.filter_by(product_id=1)),
+        ('sign-in user lookup', User.query.filter(email_equals(User.email, 'Jane@Example.com'))),
+        ('newsletter lookup', Newsletter.query.filter(email_equals(Newsletter.email, 'Jane@Example.com'))),
+    ]
+    return [(name, query.statement, name.startswith(('page', 'next page'))) for name, query in queries]
+
+
+@contextmanager
+def explained(engine, prefix):
+    """Run statements as ``<prefix> <statement>`` with their real parameters"""
+    from sqlalchemy import event
+
+    def rewrite(conn, cursor, statement, parameters, context, executemany):
+        return f'{prefix} {statement}', parameters
+
+    event.listen(engine, 'before_cursor_execute', rewrite, retval=True)
+    try:
+        yield
+    finally:
+        event.remove(engine, 'before_cursor_execute', rewrite)
+
+
+def sqlite_problems(conn, statement, paged):
+    rows = conn.execute(statement).cursor.fetchall()
+    details = [row[-1] for row in rows]
+    problems = [detail for detail in details if SQLITE_FULL_SCAN.match(detail)
+                or (paged and detail.startswith('USE TEMP B-TREE FOR ORDER BY'))]
+    return problems, details
+
+
+def postgres_problems(conn, statement, paged):
+    plan = conn.execute(statement).cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    problems, details = [], []
+
+    def walk(node):
+        relation = node.get('Relation Name', '')
+        details.append(f"{node['Node Type']} {relation}".strip())
+        if node['Node Type'] == 'Seq Scan':
+            problems.append(f'Seq Scan on {relation}')
+        if paged and node['Node Type'] in ('Sort', 'Incremental Sort'):
+            problems.append(node['Node Type'])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return problems, details
+
+
+def seed(db):
+    from app.models import CartItem, Newsletter, Product, User, Wishlist
+
+    db.session.execute(Product.__table__.insert(), [{
+        'sku': f'SKU-{i}', 'name': f'Product {i}', 'price': 10 + i % 90, 'category': ['Body', 'Balms'][i % 2],
+        'is_bestseller': i % 5 == 0, 'is_new': i % 7 == 0, 'rating': i % 5, 'created_at': datetime(2024, 1, 1),
+    } for i in range(200)])
+    db.session.execute(User.__table__.insert(), [
+        {'email': f'user{i}@example.com', 'password_hash': 'x'} for i in range(20)
+    ])
+    db.session.execute(Newsletter.__table__.insert(), [{'email': f'reader{i}@example.com'} for i in range(20)])
+    db.session.execute(CartItem.__table__.insert(), [
+        {'session_id': f'session-{i}', 'user_id': None, 'product_id': i + 1, 'quantity': 1} for i in range(20)
+    ] + [{'session_id': None, 'user_id': i % 20 + 1, 'product_id': i + 1, 'quantity': 1} for i in range(20)])
+    db.session.execute(Wishlist.__table__.insert(), [{'user_id': i % 20 + 1, 'product_id': i + 1} for i in range(20)])
+    db.session.commit()
+
+
+def check(env, results):
+    """Runs in its own interpreter: Config reads DATABASE_URL once, at import"""
+    os.environ.update(env)
+    from flask_migrate import upgrade
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+        seed(db)
+        engine = db.engine
+        postgres = engine.dialect.name == 'postgresql'
+        report = []
+        with engine.connect() as conn:
+            if postgres:
+                conn.exec_driver_sql('SET enable_seqscan = off')
+            with explained(engine, 'EXPLAIN (FORMAT JSON)' if postgres else 'EXPLAIN QUERY PLAN'):
+                for name, statement, paged in hot_queries():
+                    problems, details = (postgres_problems if postgres else sqlite_problems)(conn, statement, paged)
+                    report.append((name, problems, details))
+    results.put((engine.dialect.name, report))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--postgres', help='URL of an empty PostgreSQL database to migrate and check')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), 'aevi_query_plans.db')
+    if os.path.exists(path):
+        os.remove(path)
+    base = {'SECRET_KEY': os.environ.get('SECRET_KEY', 'check'), 'MAIL_PORT': os.environ.get('MAIL_PORT', '25'),
+            'METRICS_ENABLED': 'false'}
+    databases = [f'sqlite:///{path}'] + ([args.postgres] if args.postgres else [])
+
+    context = multiprocessing.get_context('spawn')
+    failed = False
+    for url in databases:
+        results = context.Queue()
+        worker = context.Process(target=check, args=(dict(base, DATABASE_URL=url), results))
+        worker.start()
+        worker.join()
+        if worker.exitcode != 0:
+            sys.exit(f'❌ Checking {url.split(":", 1)[0]} failed')
+        dialect, report = results.get()
+        print(f"\n🔎 {dialect}")
+        for name, problems, details in report:
+            failed = failed or bool(problems)
+            print(f"{'❌' if problems else '✅'} {name}" + (f": {'; '.join(problems)}" if problems else ''))
+            if args.verbose or problems:
+                for detail in details:
+                    print(f"      {detail}")
+    if os.path.exists(path):
+        os.remove(path)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
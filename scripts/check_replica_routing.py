@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Check read-replica routing with two SQLite files
+
+Builds a primary database through the migrations, copies it to stand in
+for the replica, and records which file every statement runs on while it
+drives the app through its test client:
+
+- catalog GETs read products from the replica;
+- other GETs, POSTs and everything after a write stay on the primary;
+- a replica behind the primary's catalog version is skipped until a new
+  copy ("replication") catches it up;
+- a broken replica is skipped, without being asked again, for
+  DB_REPLICA_RETRY_AFTER seconds.
+
+Usage:
+    python scripts/check_replica_routing.py
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Recorder:
+    """Collects ``(database, statement)`` for every statement either engine runs"""
+
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.statements = []
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', self._listener(name))
+
+    def _listener(self, name):
+        def record(conn, cursor, statement, parameters, context, executemany):
+            self.statements.append((name, ' '.join(statement.split())))
+        return record
+
+    def take(self):
+        statements, self.statements = self.statements, []
+        return statements
+
+
+def product_reads(statements):
+    return {name for name, statement in statements
+            if statement.startswith('SELECT') and 'FROM products' in statement}
+
+
+def check(env, results):
+    """Runs in its own interpreter: Config reads DATABASE_URL once, at import"""
+    os.environ.update(env)
+    from flask_migrate import upgrade
+    from app import create_app, db, db_router
+    from app.models import Product
+    from app.utils.catalog_import import import_catalog
+
+    primary_path = env['DATABASE_URL'][len('sqlite:///'):]
+    replica_path = env['DATABASE_REPLICA_URL'][len('sqlite:///'):]
+    app = create_app()
+    outcomes = []
+
+    def expect(name, ok, statements=()):
+        outcomes.append((name, bool(ok), [f'{database}: {sql[:100]}' for database, sql in statements]))
+
+    with app.app_context():
+        upgrade()
+        import_catalog(os.path.join(project_root, 'scripts', 'sample_products.jsonl'))
+        replica = db.engines['replica']
+
+        def replicate():
+            replica.dispose()
+            shutil.copyfile(primary_path, replica_path)
+            db_router.replica_version()
+
+        replicate()
+        product_id = db.session.scalar(db.select(Product.id).order_by(Product.id))
+        db.session.remove()
+        recorder = Recorder({'primary': db.engines[None], 'replica': replica})
+        client = app.test_client()
+
+    def get(path, **kwargs):
+        response = client.get(path, **kwargs)
+        return response, recorder.take()
+
+    for path in ('/api/products/', '/api/products/bestsellers', f'/product/{product_id}',
+                 '/category/Body', '/api/products/search?q=balm'):
+        response, statements = get(path)
+        expect(f'GET {path} reads products from the replica',
+               response.status_code == 200 and product_reads(statements) == {'replica'}, statements)
+
+    response, statements = get('/api/cart/')
+    expect('GET /api/cart/ stays on the primary', all(name == 'primary' for name, _ in statements), statements)
+
+    response = client.post('/api/cart/add', json={'product_id': product_id})
+    statements = recorder.take()
+    expect('POST /api/cart/add reads and writes on the primary',
+           response.status_code == 200 and statements and all(name == 'primary' for name, _ in statements),
+           statements)
+
+    with app.test_request_context('/api/products/'):
+        product = db.session.get(Product, product_id)
+        product.price += 1
+        db.session.flush()
+        db.session.expire_all()
+        db.session.get(Product, product_id)
+        db.session.scalars(db.select(Product).limit(5)).all()
+        statements = recorder.take()
+        db.session.rollback()
+        after_write = statements[[i for i, (_, sql) in enumerate(statements) if sql.startswith('UPDATE')][0]:]
+        expect('reads after a write in the same request use the primary',
+               product_reads(after_write) == {'primary'}, statements)
+        db.session.remove()
+    recorder.take()
+
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        product.price = 1234.5
+        db.session.commit()
+        db.session.remove()
+    recorder.take()
+    response, statements = get(f'/product/{product_id}')
+    expect('a replica behind the catalog version is skipped',
+           b'1234.5' in response.data and product_reads(statements) == {'primary'}, statements)
+
+    with app.app_context():
+        replicate()
+    response, statements = get(f'/product/{product_id}')
+    expect('the replica is used again once it catches up',
+           b'1234.5' in response.data and product_reads(statements) == {'replica'}, statements)
+
+    with app.app_context():
+        replica.dispose()
+        with open(replica_path, 'wb') as f:
+            f.write(b'not a database' * 100)
+        db_router.invalidate()
+    response, statements = get('/api/products/')
+    expect('a broken replica falls back to the primary',
+           response.status_code == 200 and product_reads(statements) == {'primary'}, statements)
+    response, statements = get('/api/products/new')
+    expect('a broken replica is not asked again during DB_REPLICA_RETRY_AFTER',
+           response.status_code == 200 and all(name == 'primary' for name, _ in statements), statements)
+
+    writes = [(name, sql) for name, sql in recorder.statements if sql.startswith(WRITES) and name == 'replica']
+    expect('nothing was written to the replica', not writes, writes)
+    results.put((outcomes, db_router.stats()))
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix='aevi_replica_')
+    env = {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'check'), 'MAIL_PORT': os.environ.get('MAIL_PORT', '25'),
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'primary.db')}",
+        'DATABASE_REPLICA_URL': f"sqlite:///{os.path.join(directory, 'replica.db')}",
+        # Re-read both catalog versions on every request, and serve nothing from the caches
+        'CATALOG_CACHE_CHECK_INTERVAL': '0', 'DB_REPLICA_CHECK_INTERVAL': '0', 'DB_REPLICA_RETRY_AFTER': '60',
+        'CATALOG_CACHE_ENABLED': 'false', 'PAGE_CACHE_ENABLED': 'false', 'METRICS_ENABLED': 'false',
+        'ASSETS_FINGERPRINT_ENABLED': 'false',
+    }
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    worker = context.Process(target=check, args=(env, results))
+    try:
+        worker.start()
+        worker.join()
+        if worker.exitcode != 0:
+            sys.exit('❌ Routing check crashed')
+        outcomes, stats = results.get()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    failed = False
+    for name, ok, statements in outcomes:
+        failed = failed or not ok
+        print(f"{'✅' if ok else '❌'} {name}")
+        if not ok:
+            for statement in statements:
+                print(f"      {statement}")
+    print(f"\n📊 Router: {stats}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
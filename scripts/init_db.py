@@ -4,18 +4,31 @@ Database initialization script for AEVI Flask application
 Creates tables and populates with sample data based on the live website
 """
 
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+
 from app import create_app, db
 from app.models import *
-from werkzeug.security import generate_password_hash
+from app.utils.search import ensure_search_index
+from app.utils.passwords import hash_password
 import sys
 
 app = create_app()
 
+# The schema db.create_all() built before migrations existed; the revisions
+# after it skip tables, columns and indexes a newer create_all() already made
+INITIAL_REVISION = 'bb58721dd22b'
+
 
 def create_tables():
-    """Create all database tables"""
+    """Create or upgrade all database tables through the migrations"""
     with app.app_context():
-        db.create_all()
+        inspector = inspect(db.engine)
+        if inspector.has_table('products') and not inspector.has_table('alembic_version'):
+            # Created by db.create_all(): adopt it at the initial revision, then migrate
+            stamp(revision=INITIAL_REVISION)
+        upgrade()
+        ensure_search_index(db.engine)
         print("✅ Database tables created successfully!")
 
 
@@ -32,21 +45,21 @@ def populate_sample_data():
         users = [
             User(
                 email='admin@aevi.com',
-                password_hash=generate_password_hash('admin123'),
+                password_hash=hash_password('admin123'),
                 first_name='Admin',
                 last_name='User',
                 is_subscribed=True
             ),
             User(
                 email='user@example.com',
-                password_hash=generate_password_hash('password123'),
+                password_hash=hash_password('password123'),
                 first_name='John',
                 last_name='Doe',
                 is_subscribed=True
             ),
             User(
                 email='jane@example.com',
-                password_hash=generate_password_hash('password123'),
+                password_hash=hash_password('password123'),
                 first_name='Jane',
                 last_name='Smith',
                 is_subscribed=False
@@ -4,7 +4,12 @@ Reset database script - Drops all tables and recreates them with new schema
 """
 
 import os
+
+from flask_migrate import upgrade
+from sqlalchemy import text
+
 from app import create_app, db
+from app.utils.search import ensure_search_index
 
 
 def reset_database():
@@ -13,9 +18,12 @@ def reset_database():
     with app.app_context():
         print("Dropping all tables...")
         db.drop_all()
+        with db.engine.begin() as conn:
+            conn.execute(text('DROP TABLE IF EXISTS alembic_version'))
 
         print("Creating new tables...")
-        db.create_all()
+        upgrade()
+        ensure_search_index(db.engine)
 
         print("Database reset complete!")
 
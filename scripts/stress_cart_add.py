@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Hammer /api/cart/add from many threads sharing one guest cart and check
+that the final quantities equal the number of successful adds exactly
+
+Starts the app on a local threaded server against a temporary SQLite
+database unless --database-url is given.
+
+Usage:
+    python scripts/stress_cart_add.py [--threads 16] [--adds 50]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Lines every thread adds to, as (product_id, size)
+LINES = [(1, None), (1, '30ml'), (2, None)]
+
+
+def post_json(base_url, path, payload, cookie):
+    request = urllib.request.Request(
+        base_url + path,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'Cookie': cookie},
+        method='POST'
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.status, response.headers.get('Set-Cookie')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--adds', type=int, default=50, help='adds per thread')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'aevi_cart_stress.db')
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from werkzeug.serving import make_server
+    from app import create_app, db
+    from app.models import CartItem, Product
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if not db.session.get(Product, 2):
+            db.session.add_all([Product(id=1, name='Stress Oil', price=10.0),
+                                Product(id=2, name='Stress Balm', price=20.0)])
+            db.session.commit()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    # Open the guest cart so every thread shares its session cookie
+    _, set_cookie = post_json(base_url, '/api/cart/add', {'product_id': 2, 'quantity': 0}, '')
+    cookie = set_cookie.split(';', 1)[0]
+
+    successes = {line: 0 for line in LINES}
+    failures = 0
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal failures
+        for i in range(args.adds):
+            product_id, size = LINES[i % len(LINES)]
+            try:
+                status, _ = post_json(base_url, '/api/cart/add',
+                                      {'product_id': product_id, 'quantity': 1, 'size': size}, cookie)
+                ok = status == 200
+            except Exception:
+                ok = False
+            with lock:
+                if ok:
+                    successes[(product_id, size)] += 1
+                else:
+                    failures += 1
+
+    print(f"🔨 {args.threads} threads x {args.adds} adds against {base_url}")
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    with app.app_context():
+        rows = CartItem.query.filter(CartItem.session_id.isnot(None)).all()
+        actual = {}
+        for row in rows:
+            actual.setdefault((row.product_id, row.size), []).append(row.quantity)
+
+    ok = True
+    for line, expected in successes.items():
+        quantities = actual.get(line, [])
+        matches = quantities == [expected]
+        ok = ok and matches
+        print(f"{'✅' if matches else '❌'} product {line[0]} size {line[1]}: "
+              f"expected {expected}, rows {quantities}")
+
+    total = sum(successes.values())
+    print(f"\n{total} adds in {elapsed:.2f}s ({total / elapsed:.0f}/s), {failures} failed requests")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()